@@ -0,0 +1,438 @@
+import numpy as np
+
+from profiling import profiled
+from results_table import ResultsTable
+
+
+def group_table(table, key_heads):
+	"""Returns (group of each row, index of first row of each group); groups are numbered in order of first appearance"""
+	codes = []
+	for head in key_heads:
+		column = table.columns[head]
+		if table.is_categorical(head) or np.issubdtype(column.dtype, np.integer):
+			codes.append(column.astype(np.int64))
+		else:
+			codes.append(np.unique(column, return_inverse=True)[1].ravel())
+	_, first_indices, inverse = np.unique(np.stack(codes, axis=1), axis=0, return_index=True, return_inverse=True)
+	appearance_order = np.argsort(first_indices, kind='stable')
+	rank = np.empty_like(appearance_order)
+	rank[appearance_order] = np.arange(len(appearance_order))
+	return rank[inverse.ravel()], first_indices[appearance_order]
+
+
+@profiled('refactoring', lambda result, *args: {'groups': len(result)})
+def refactored_list_of_results_dicts(key_heads, keys, params, refactored_heads, selected):
+	"""Returns list of dicts with refactored heads (and key heads that are not refactored) for selected groups"""
+	heads = list(refactored_heads) + [head for head in key_heads if head not in refactored_heads]
+	list_of_results_dicts = []
+	for i in np.flatnonzero(selected):
+		key_dict = dict(zip(key_heads, keys[i]))
+		row_dict = {}
+		for head in heads:
+			if head in key_dict:
+				row_dict[head] = key_dict[head]
+			else:
+				row_dict[head] = params[head][i].item()
+		list_of_results_dicts.append(row_dict)
+	return list_of_results_dicts
+
+
+def rank_in_group(group, groups):
+	"""Returns how many rows of the same group precede every row (0 for the first row of group)"""
+	order = np.argsort(group, kind='stable')
+	counts = np.bincount(group, minlength=groups)
+	starts = np.concatenate(([0], np.cumsum(counts)[:-1])) if groups else np.zeros(0, dtype=np.int64)
+	rank = np.empty(len(group), dtype=np.int64)
+	rank[order] = np.arange(len(group)) - starts[group[order]]
+	return rank
+
+
+def _sorted_groups(values, group, groups):
+	order = np.lexsort((values, group))
+	counts = np.bincount(group, minlength=groups)
+	starts = np.concatenate(([0], np.cumsum(counts)[:-1])) if groups else np.zeros(0, dtype=np.int64)
+	return values[order], starts, counts
+
+
+def _grouped_percentile(sorted_values, starts, counts, q):
+	"""Linear interpolation between closest ranks (as numpy.percentile), nan for empty groups"""
+	result = np.full(len(counts), np.nan)
+	valid = counts > 0
+	position = (counts[valid] - 1) * q / 100
+	lower = np.floor(position).astype(np.int64)
+	upper = np.ceil(position).astype(np.int64)
+	lower_values = sorted_values[starts[valid] + lower]
+	upper_values = sorted_values[starts[valid] + upper]
+	result[valid] = lower_values + (upper_values - lower_values) * (position - lower)
+	return result
+
+
+def grouped_percentile(values, group, groups, q):
+	"""Returns q-th percentile of values of every group (nan for empty groups)"""
+	sorted_values, starts, counts = _sorted_groups(values, group, groups)
+	return _grouped_percentile(sorted_values, starts, counts, q)
+
+
+def robust_z_scores(values, group, groups, keep=None):
+	"""Returns robust z-score 0.6745 * |x - median| / MAD of every value within its group.
+
+	Args:
+		keep (np.array): mask of values medians and MADs are computed from (None: all values).
+	"""
+	keep = np.ones(len(values), dtype=bool) if keep is None else keep
+	sorted_values, starts, counts = _sorted_groups(values[keep], group[keep], groups)
+	median = _grouped_percentile(sorted_values, starts, counts, 50)
+	deviation = np.abs(values - median[group])
+	sorted_deviation, starts, counts = _sorted_groups(deviation[keep], group[keep], groups)
+	mad = _grouped_percentile(sorted_deviation, starts, counts, 50)[group]
+	robust_z = np.zeros(len(values))
+	spread = mad > 0
+	robust_z[spread] = 0.6745 * deviation[spread] / mad[spread]
+	return robust_z
+
+
+def combined_uncertainty(stdev_fpga, stdev_pc):
+	"""Uncertainty of average speed: u(av) = sqrt((u(FPGA)/2)^2 + (u(PC)/2)^2)"""
+	return np.sqrt(np.square(stdev_fpga / 2) + np.square(stdev_pc / 2))
+
+
+def latest_samples(group, iteration):
+	"""Returns (first, last, rows) of every (group, statistical iteration) pair in order of its first appearance:
+	index of its first and of its last (latest) row and number of its rows"""
+	if not len(group):
+		empty = np.zeros(0, dtype=np.int64)
+		return empty, empty, empty
+	_, first, pair, rows = np.unique(np.stack((group, iteration), axis=1), axis=0, return_index=True,
+									 return_inverse=True, return_counts=True)
+	last = np.zeros(len(first), dtype=np.int64)
+	np.maximum.at(last, pair.ravel(), np.arange(len(group)))
+	order = np.argsort(first, kind='stable')
+	return first[order], last[order], rows[order]
+
+
+class StreamingAggregator(object):
+	"""Online aggregation of statistical iterations.
+
+	Rows are grouped by the full configuration tuple (key_heads), no matter
+	in which order they arrive. Every statistical iteration of configuration
+	is one sample: when it is measured again (e.g. resumed measurement), the
+	latest row replaces the earlier one. Only the first stat_iterations
+	statistical iterations (in order of appearance) are used, replaced rows
+	and rows over the limit are counted as extra. Only the samples are kept,
+	so memory use depends on number of configurations, not on number of rows.
+
+	Attributes:
+		key_heads (list): names of columns that identify configuration.
+		stat_iterations (int): how many statistical iterations are expected per configuration.
+		rows (int): how many rows were aggregated so far.
+	"""
+	def __init__(self, key_heads, stat_iterations, pc_head='SpeedPC [B/s]', fpga_head='SpeedFPGA [B/s]',
+				 iteration_head='StatisticalIter'):
+		"""Args:
+			key_heads (list): names of columns that identify configuration.
+			stat_iterations (int): how many statistical iterations are expected per configuration.
+			pc_head (string): name of column with speed measured on PC side.
+			fpga_head (string): name of column with speed measured on FPGA side.
+			iteration_head (string): name of column with number of statistical iteration.
+		"""
+		self.key_heads = list(key_heads)
+		self.stat_iterations = stat_iterations
+		self.rows = 0
+		self.__pc_head = pc_head
+		self.__fpga_head = fpga_head
+		self.__iteration_head = iteration_head
+		self.__group_ids = {}
+		self.__keys = []
+		width = max(stat_iterations, 0)
+		self.__count = np.zeros(0, dtype=np.int64)
+		self.__extra = np.zeros(0, dtype=np.int64)
+		self.__iterations = np.zeros((0, width), dtype=np.int64)
+		self.__samples = {head: np.zeros((0, width)) for head in (pc_head, fpga_head)}
+
+	@classmethod
+	def from_csv(cls, csv_file, delimiter, int_values, float_values, categorical_values, key_heads, stat_iterations,
+				 chunk_size=100000):
+		"""Aggregate csv file chunk by chunk without loading it as a whole"""
+		aggregator = cls(key_heads, stat_iterations)
+		for table in ResultsTable.iter_csv(csv_file, delimiter, int_values, float_values, categorical_values, chunk_size):
+			aggregator.add_table(table)
+		return aggregator
+
+	@classmethod
+	def from_state(cls, state, key_heads, stat_iterations):
+		"""Restore aggregator from arrays returned by state()"""
+		aggregator = cls(key_heads, stat_iterations)
+		key_columns = [state['key:' + head].tolist() for head in key_heads]
+		aggregator.__keys = list(zip(*key_columns)) if key_columns else []
+		aggregator.__group_ids = {key: i for i, key in enumerate(aggregator.__keys)}
+		aggregator.__count = np.array(state['count'], dtype=np.int64)
+		aggregator.__extra = np.array(state['extra'], dtype=np.int64)
+		aggregator.__iterations = np.array(state['iterations'], dtype=np.int64)
+		for head in aggregator.__samples:
+			aggregator.__samples[head] = np.array(state['samples:' + head], dtype=np.float64)
+		aggregator.rows = int(aggregator.__count.sum() + aggregator.__extra.sum())
+		return aggregator
+
+	def state(self):
+		"""Returns dict of plain arrays that fully describes collected samples"""
+		state = {'count': self.__count, 'extra': self.__extra, 'iterations': self.__iterations}
+		for i, head in enumerate(self.key_heads):
+			state['key:' + head] = np.array([key[i] for key in self.__keys])
+		for head in self.__samples:
+			state['samples:' + head] = self.__samples[head]
+		return state
+
+	def __len__(self):
+		return len(self.__keys)
+
+	def __global_ids(self, table, first_indices):
+		ids = np.empty(len(first_indices), dtype=np.int64)
+		for i, first_index in enumerate(first_indices.tolist()):
+			key = tuple(table.value(head, first_index) for head in self.key_heads)
+			if key not in self.__group_ids:
+				self.__group_ids[key] = len(self.__keys)
+				self.__keys.append(key)
+			ids[i] = self.__group_ids[key]
+		self.__grow(len(self.__keys), self.__iterations.shape[1])
+		return ids
+
+	def __grow(self, size, width):
+		missing = size - len(self.__count)
+		missing_width = width - self.__iterations.shape[1]
+		if missing > 0:
+			self.__count = np.concatenate((self.__count, np.zeros(missing, dtype=np.int64)))
+			self.__extra = np.concatenate((self.__extra, np.zeros(missing, dtype=np.int64)))
+			self.__iterations = np.pad(self.__iterations, ((0, missing), (0, 0)))
+			for head in self.__samples:
+				self.__samples[head] = np.pad(self.__samples[head], ((0, missing), (0, 0)))
+		if missing_width > 0:
+			self.__iterations = np.pad(self.__iterations, ((0, 0), (0, missing_width)))
+			for head in self.__samples:
+				self.__samples[head] = np.pad(self.__samples[head], ((0, 0), (0, missing_width)))
+
+	@profiled('aggregation', lambda result, self, table: {'rows': len(table)})
+	def add_table(self, table):
+		"""Merge all rows of table (or its chunk) into collected samples"""
+		if not len(table):
+			return
+		inverse, first_indices = group_table(table, self.key_heads)
+		group = self.__global_ids(table, first_indices)[inverse]
+		iteration = np.asarray(table.columns[self.__iteration_head], dtype=np.int64)
+		first, last, rows = latest_samples(group, iteration)
+		sample_group = group[first]
+		sample_iteration = iteration[first]
+		# Rows replaced by later row of the same statistical iteration within table
+		np.add.at(self.__extra, sample_group, rows - 1)
+
+		# Statistical iterations collected before are replaced by the latest row
+		filled = np.arange(self.__iterations.shape[1]) < self.__count[sample_group][:, None]
+		matches = filled & (self.__iterations[sample_group] == sample_iteration[:, None])
+		replaced = matches.any(axis=1)
+		slot = matches.argmax(axis=1) if matches.shape[1] else np.zeros(len(first), dtype=np.int64)
+		np.add.at(self.__extra, sample_group[replaced], 1)
+
+		# New statistical iterations take next free slots, the ones over stat_iterations are only counted
+		new = np.flatnonzero(~replaced)
+		groups, new_group = np.unique(sample_group[new], return_inverse=True)
+		slot[new] = self.__count[sample_group[new]] + rank_in_group(new_group.ravel(), len(groups))
+		stored = replaced.copy()
+		stored[new] = slot[new] < self.stat_iterations if self.stat_iterations > 0 else True
+		np.add.at(self.__extra, sample_group[~stored], 1)
+		if np.any(stored):
+			self.__grow(len(self.__keys), int(slot[stored].max()) + 1)
+		np.add.at(self.__count, sample_group[stored & ~replaced], 1)
+		self.__iterations[sample_group[stored], slot[stored]] = sample_iteration[stored]
+		for head in self.__samples:
+			values = np.asarray(table.columns[head], dtype=np.float64)
+			self.__samples[head][sample_group[stored], slot[stored]] = values[last[stored]]
+		self.rows += len(table)
+
+	def __mean_stdev(self, head):
+		filled = np.arange(self.__iterations.shape[1]) < self.__count[:, None]
+		samples = np.where(filled, self.__samples[head], 0.0)
+		with np.errstate(invalid='ignore', divide='ignore'):
+			mean = samples.sum(axis=1) / self.__count
+			squares = np.where(filled, np.square(samples - mean[:, None]), 0.0).sum(axis=1)
+			stdev = np.where(self.__count > 1, np.sqrt(squares / np.maximum(self.__count - 1, 1)), np.nan)
+		return mean, stdev
+
+	def refactored_params(self, in_megabytes=True):
+		"""Returns dict of arrays (one value per configuration) with refactored speed parameters"""
+		divider = 1000000 if in_megabytes else 1
+		speed_pc, stdev_pc = self.__mean_stdev(self.__pc_head)
+		speed_fpga, stdev_fpga = self.__mean_stdev(self.__fpga_head)
+		return {
+			'SpeedPC': speed_pc / divider,
+			'u(PC)': stdev_pc / divider,
+			'SpeedFPGA': speed_fpga / divider,
+			'u(FPGA)': stdev_fpga / divider,
+			'Average': (speed_fpga + speed_pc) / 2 / divider,
+			'u(av)': combined_uncertainty(stdev_fpga, stdev_pc) / divider
+		}
+
+	def counts(self):
+		"""Returns number of samples (statistical iterations) used per configuration"""
+		return self.__count.copy()
+
+	def keys(self):
+		"""Returns list of configuration tuples in order of first appearance"""
+		return list(self.__keys)
+
+	def incomplete_groups(self):
+		"""Returns list of (configuration dict, count) for groups with less samples than stat_iterations"""
+		return [(dict(zip(self.key_heads, self.__keys[i])), int(self.__count[i]))
+				for i in np.flatnonzero(self.__count < self.stat_iterations)]
+
+	def over_counted_groups(self):
+		"""Returns list of (configuration dict, count of all rows) for groups with replaced rows or rows over stat_iterations"""
+		return [(dict(zip(self.key_heads, self.__keys[i])), int(self.__count[i] + self.__extra[i]))
+				for i in np.flatnonzero(self.__extra)]
+
+	def list_of_results_dicts(self, refactored_heads, in_megabytes=True, include_incomplete=False):
+		"""Returns list of dicts with refactored heads, one dict per configuration"""
+		selected = np.ones(len(self), dtype=bool) if include_incomplete else self.__count >= self.stat_iterations
+		return refactored_list_of_results_dicts(self.key_heads, self.__keys, self.refactored_params(in_megabytes),
+												refactored_heads, selected)
+
+
+class GroupedStatistics(object):
+	"""Statistics of speeds per configuration, computed for all configurations in one numpy pass.
+
+	Rows are grouped by configuration and sorted once per speed column, so
+	besides mean and standard deviation also median, min / max and percentiles
+	are available. Chosen statistical iterations (e.g. the first, warm-up one)
+	can be dropped and outliers can be rejected with robust z-score based on
+	median absolute deviation. As in StreamingAggregator only the latest row
+	of each of the first stat_iterations statistical iterations is used.
+
+	Attributes:
+		key_heads (list): names of columns that identify configuration.
+		stat_iterations (int): how many statistical iterations are expected per configuration.
+		counts (np.array): number of rows per configuration (including replaced rows and rows over stat_iterations).
+		measured_counts (np.array): number of statistical iterations per configuration (at most stat_iterations).
+		used_counts (np.array): number of samples per configuration used in statistics.
+	"""
+	SPEED_HEADS = ('SpeedPC', 'SpeedFPGA', 'Average')
+
+	@profiled('aggregation', lambda result, self, table, *args, **kwargs: {'rows': len(table), 'groups': len(self)})
+	def __init__(self, table, key_heads, stat_iterations, dropped_stat_iterations=(), outlier_threshold=None,
+				 percentiles=(), pc_head='SpeedPC [B/s]', fpga_head='SpeedFPGA [B/s]'):
+		"""Args:
+			table (ResultsTable): results to compute statistics of.
+			key_heads (list): names of columns that identify configuration.
+			stat_iterations (int): how many statistical iterations are expected per configuration.
+			dropped_stat_iterations (iterable): statistical iterations left out of statistics (e.g. [1] for warm-up).
+			outlier_threshold (float): robust z-score above which sample is rejected (None: no rejection).
+			percentiles (iterable): percentiles (0-100) computed for every speed.
+			pc_head (string): name of column with speed measured on PC side.
+			fpga_head (string): name of column with speed measured on FPGA side.
+		"""
+		self.key_heads = list(key_heads)
+		self.stat_iterations = stat_iterations
+		self.dropped_stat_iterations = list(dropped_stat_iterations)
+		self.percentiles = list(percentiles)
+		group, first_indices = group_table(table, self.key_heads) if len(table) else (np.zeros(0, dtype=np.int64), [])
+		self.__keys = [tuple(table.value(head, i) for head in self.key_heads) for i in first_indices]
+		groups = len(self.__keys)
+
+		self.counts = np.bincount(group, minlength=groups)
+		iteration = np.asarray(table.columns['StatisticalIter'], dtype=np.int64)
+		first, last, _ = latest_samples(group, iteration)
+		stored = np.ones(len(first), dtype=bool)
+		if stat_iterations > 0:
+			stored = rank_in_group(group[first], groups) < stat_iterations
+		self.measured_counts = np.bincount(group[first[stored]], minlength=groups)
+		keep = np.zeros(len(group), dtype=bool)
+		keep[last[stored]] = True
+		keep &= ~np.isin(iteration, self.dropped_stat_iterations)
+		speed_pc = np.asarray(table.columns[pc_head], dtype=np.float64)
+		speed_fpga = np.asarray(table.columns[fpga_head], dtype=np.float64)
+		if outlier_threshold is not None:
+			keep &= ~self.__outliers(speed_pc, group, keep, groups, outlier_threshold)
+			keep &= ~self.__outliers(speed_fpga, group, keep, groups, outlier_threshold)
+		self.used_counts = np.bincount(group[keep], minlength=groups)
+
+		samples = {
+			'SpeedPC': speed_pc[keep],
+			'SpeedFPGA': speed_fpga[keep],
+			'Average': (speed_pc[keep] + speed_fpga[keep]) / 2
+		}
+		self.__statistics = {head: self.__describe(values, group[keep], groups) for head, values in samples.items()}
+
+	def __len__(self):
+		return len(self.__keys)
+
+	def __outliers(self, values, group, keep, groups, threshold):
+		return keep & (robust_z_scores(values, group, groups, keep) > threshold)
+
+	def __describe(self, values, group, groups):
+		count = np.bincount(group, minlength=groups)
+		with np.errstate(invalid='ignore', divide='ignore'):
+			mean = np.bincount(group, weights=values, minlength=groups) / count
+			squares = np.bincount(group, weights=np.square(values - mean[group]), minlength=groups)
+			stdev = np.where(count > 1, np.sqrt(squares / np.maximum(count - 1, 1)), np.nan)
+		sorted_values, starts, counts = _sorted_groups(values, group, groups)
+		description = {
+			'mean': mean,
+			'stdev': stdev,
+			'median': _grouped_percentile(sorted_values, starts, counts, 50),
+			'min': _grouped_percentile(sorted_values, starts, counts, 0),
+			'max': _grouped_percentile(sorted_values, starts, counts, 100)
+		}
+		for q in self.percentiles:
+			description['p{}'.format(q)] = _grouped_percentile(sorted_values, starts, counts, q)
+		return description
+
+	def keys(self):
+		"""Returns list of configuration tuples in order of first appearance"""
+		return list(self.__keys)
+
+	def statistics(self, head, in_megabytes=True):
+		"""Returns dict of arrays (mean, stdev, median, min, max, p<q>) of SpeedPC, SpeedFPGA or Average"""
+		divider = 1000000 if in_megabytes else 1
+		return {name: values / divider for name, values in self.__statistics[head].items()}
+
+	def refactored_params(self, in_megabytes=True):
+		"""Returns dict of arrays (one value per configuration) with refactored speed parameters"""
+		speed_pc = self.statistics('SpeedPC', in_megabytes)
+		speed_fpga = self.statistics('SpeedFPGA', in_megabytes)
+		average = self.statistics('Average', in_megabytes)
+		return {
+			'SpeedPC': speed_pc['mean'],
+			'u(PC)': speed_pc['stdev'],
+			'SpeedFPGA': speed_fpga['mean'],
+			'u(FPGA)': speed_fpga['stdev'],
+			'Average': average['mean'],
+			'u(av)': combined_uncertainty(speed_fpga['stdev'], speed_pc['stdev'])
+		}
+
+	def incomplete_groups(self):
+		"""Returns list of (configuration dict, count) for groups with less statistical iterations than stat_iterations"""
+		return [(dict(zip(self.key_heads, self.__keys[i])), int(self.measured_counts[i]))
+				for i in np.flatnonzero(self.measured_counts < self.stat_iterations)]
+
+	def over_counted_groups(self):
+		"""Returns list of (configuration dict, count of all rows) for groups with replaced rows or rows over stat_iterations"""
+		return [(dict(zip(self.key_heads, self.__keys[i])), int(self.counts[i]))
+				for i in np.flatnonzero(self.counts > self.measured_counts)]
+
+	def list_of_results_dicts(self, refactored_heads, in_megabytes=True, include_incomplete=False):
+		"""Returns list of dicts with refactored heads, one dict per configuration"""
+		selected = self.used_counts > 0
+		if not include_incomplete:
+			selected &= self.measured_counts >= self.stat_iterations
+		return refactored_list_of_results_dicts(self.key_heads, self.__keys, self.refactored_params(in_megabytes),
+												refactored_heads, selected)
+
+	def describe_list_of_dicts(self, in_megabytes=True):
+		"""Returns list of dicts (one per configuration) with key heads and every statistic of every speed"""
+		statistics = {head: self.statistics(head, in_megabytes) for head in self.SPEED_HEADS}
+		list_of_dicts = []
+		for i, key in enumerate(self.__keys):
+			row_dict = dict(zip(self.key_heads, key))
+			row_dict['Samples'] = int(self.used_counts[i])
+			for head in self.SPEED_HEADS:
+				for name, values in statistics[head].items():
+					row_dict['{} {}'.format(head, name)] = values[i].item()
+			list_of_dicts.append(row_dict)
+		return list_of_dicts
@@ -0,0 +1,210 @@
+import matplotlib
+matplotlib.use('Agg')
+
+from cfg import *
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from campaigns import resolve_csv_files
+from run_analysis import ResultsHandler, ResultsParser
+from synthetic_results import SyntheticResults
+
+
+"""Stages of analysis pipeline in order they are run"""
+STAGES = ['parse', 'refactor', 'scan', 'render']
+
+
+def measure(function, trace_memory=False):
+	"""Runs function once. Returns (its result, dict with wall and CPU seconds and peak of traced memory in bytes)"""
+	gc.collect()
+	if trace_memory:
+		tracemalloc.start()
+	wall_start = time.perf_counter()
+	cpu_start = time.process_time()
+	result = function()
+	measurement = {
+		'wall_seconds': time.perf_counter() - wall_start,
+		'cpu_seconds': time.process_time() - cpu_start
+	}
+	if trace_memory:
+		measurement['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+	return result, measurement
+
+
+def _current_commit():
+	try:
+		return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+							  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+	except OSError:
+		return None
+
+
+class PipelineBenchmark(object):
+	"""Times and memory-profiles every stage of the analysis on synthetic datasets of growing size.
+
+	Stages: parse (ResultsParser), refactor (get_refactored_list_of_results_dicts),
+	scan (list_of_results_with_parameters of all plotting options) and render
+	(handle_results of the first plotting option). Wall and CPU time are the
+	best of repeats; peak memory comes from a separate run under tracemalloc,
+	so tracing does not distort timings.
+
+	Attributes:
+		rows_list (list): numbers of rows of benchmarked datasets.
+		folder (string): where datasets are generated (and reused by later runs).
+		repeats (int): how many times every stage is timed.
+		trace_memory (bool): measure peak memory of every stage?
+		render (bool): benchmark rendering of figures?
+	"""
+	def __init__(self, rows_list, folder, repeats=3, trace_memory=True, render=True):
+		self.rows_list = rows_list
+		self.folder = folder
+		self.repeats = repeats
+		self.trace_memory = trace_memory
+		self.render = render
+
+	def __dataset(self, rows):
+		"""Returns (csv file or folder of campaigns, statistical iterations) of dataset with rows, generated if it does not exist yet"""
+		synthetic_results = SyntheticResults(rows)
+		name = os.path.join(self.folder, 'results_{}'.format(rows))
+		source = name + '.csv' if synthetic_results.campaigns == 1 else name
+		if not os.path.exists(source):
+			os.makedirs(self.folder, exist_ok=True)
+			if synthetic_results.campaigns == 1:
+				_, measurement = measure(lambda: synthetic_results.write(source + '.tmp', SEPARATOR))
+			else:
+				_, measurement = measure(lambda: synthetic_results.write_campaigns(source + '.tmp', SEPARATOR))
+			os.replace(source + '.tmp', source)
+			print("Generated {} rows of {} campaigns in {:.2f} s".format(rows, synthetic_results.campaigns,
+																		 measurement['wall_seconds']))
+		return source, synthetic_results.stat_iterations
+
+	def __run_pipeline(self, source, stat_iterations, trace_memory):
+		"""Runs all stages once. Returns dict of stage measurements with number of items each stage produced"""
+		stages = {}
+
+		def parse():
+			# Single csv file is read when its table is first used
+			parser = ResultsParser(source, SEPARATOR, INT_VALUES, FLOAT_VALUES, REFACTORED_HEADS, stat_iterations)
+			return parser, len(parser.table)
+
+		(parser, rows), stages['parse'] = measure(parse, trace_memory)
+		stages['parse']['items'] = rows
+		list_of_results_dicts, stages['refactor'] = measure(parser.get_refactored_list_of_results_dicts, trace_memory)
+		stages['refactor']['items'] = len(list_of_results_dicts)
+		handler = ResultsHandler(list_of_results_dicts, FIGURE_METADATA, TARGET_SPEED, BASIC_PROPERTIES)
+
+		def scan():
+			return [handler.list_of_results_with_parameters(option) for option in PLOTTING_OPTIONS.values()]
+
+		list_of_param_dicts, stages['scan'] = measure(scan, trace_memory)
+		stages['scan']['items'] = sum(len(param_dicts) for param_dicts in list_of_param_dicts)
+		if self.render and PLOTTING_OPTIONS:
+			plotting_option = next(iter(PLOTTING_OPTIONS.values()))
+			with tempfile.TemporaryDirectory() as fig_folder:
+				plotting_option = dict(plotting_option, savefig=os.path.join(fig_folder, plotting_option['savefig']))
+				fig_names, stages['render'] = measure(lambda: handler.handle_results(plotting_option, 0), trace_memory)
+			stages['render']['items'] = len(fig_names)
+		return stages
+
+	def __benchmark_dataset(self, rows):
+		source, stat_iterations = self.__dataset(rows)
+		best = {}
+		for _ in range(self.repeats):
+			for stage, measurement in self.__run_pipeline(source, stat_iterations, False).items():
+				if stage not in best or measurement['wall_seconds'] < best[stage]['wall_seconds']:
+					best[stage] = measurement
+		if self.trace_memory:
+			for stage, measurement in self.__run_pipeline(source, stat_iterations, True).items():
+				best[stage]['peak_bytes'] = measurement['peak_bytes']
+		return {
+			'rows': rows,
+			'stat_iterations': stat_iterations,
+			'file_bytes': sum(os.path.getsize(csv_file) for csv_file in resolve_csv_files(source)),
+			'stages': best
+		}
+
+	def run(self):
+		"""Benchmark all datasets. Returns report (dict that can be saved as JSON)"""
+		report = {
+			'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+			'commit': _current_commit(),
+			'python': platform.python_version(),
+			'numpy': np.__version__,
+			'matplotlib': matplotlib.__version__,
+			'machine': platform.machine(),
+			'cpu_count': os.cpu_count(),
+			'repeats': self.repeats,
+			'results': []
+		}
+		for rows in self.rows_list:
+			result = self.__benchmark_dataset(rows)
+			report['results'].append(result)
+			print_result(result)
+		return report
+
+
+def print_result(result):
+	print("{} rows ({:.1f} MB):".format(result['rows'], result['file_bytes'] / 1e6))
+	for stage in STAGES:
+		if stage not in result['stages']:
+			continue
+		measurement = result['stages'][stage]
+		peak = '{:.1f} MB'.format(measurement['peak_bytes'] / 1e6) if 'peak_bytes' in measurement else '-'
+		print("\t{:<10}{:>10.3f} s wall{:>10.3f} s CPU{:>12} peak{:>10} items".format(
+			stage, measurement['wall_seconds'], measurement['cpu_seconds'], peak, measurement['items']))
+
+
+def save_report(report, file_name):
+	with open(file_name, mode='w') as report_file:
+		json.dump(report, report_file, indent=1)
+
+
+def load_report(file_name):
+	with open(file_name, mode='r') as report_file:
+		return json.load(report_file)
+
+
+def compare_reports(baseline, report, tolerance=0.2, minimal_seconds=0.05):
+	"""Returns list of regressions (strings) of report against baseline.
+
+	Stage regresses when its wall time or peak memory grows by more than
+	tolerance; stages faster than minimal_seconds are too noisy to compare.
+	"""
+	regressions = []
+	baseline_results = {result['rows']: result['stages'] for result in baseline['results']}
+	for result in report['results']:
+		for stage, measurement in result['stages'].items():
+			reference = baseline_results.get(result['rows'], {}).get(stage)
+			if not reference:
+				continue
+			for quantity in ('wall_seconds', 'peak_bytes'):
+				if quantity not in measurement or quantity not in reference:
+					continue
+				if quantity == 'wall_seconds' and reference[quantity] < minimal_seconds:
+					continue
+				if measurement[quantity] > reference[quantity] * (1 + tolerance):
+					regressions.append("{} rows, {}: {} grew from {:.4g} to {:.4g} ({:+.0%})".format(
+						result['rows'], stage, quantity, reference[quantity], measurement[quantity],
+						measurement[quantity] / reference[quantity] - 1))
+	return regressions
+
+
+if __name__ == "__main__":
+	benchmark = PipelineBenchmark(BENCHMARK_ROWS, BENCHMARK_FOLDER, BENCHMARK_REPEATS, BENCHMARK_TRACE_MEMORY)
+	report = benchmark.run()
+	save_report(report, BENCHMARK_REPORT_FILE_NAME)
+	if len(sys.argv) > 1:
+		regressions = compare_reports(load_report(sys.argv[1]), report, BENCHMARK_TOLERANCE)
+		for regression in regressions:
+			print("Regression:", regression)
+		sys.exit(1 if regressions else 0)
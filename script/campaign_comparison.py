@@ -0,0 +1,180 @@
+import numpy as np
+
+
+"""Speed columns of refactored results mapped to their uncertainties and names used in comparison"""
+COMPARED_SPEEDS = {
+	'PC': ('SpeedPC', 'u(PC)'),
+	'FPGA': ('SpeedFPGA', 'u(FPGA)'),
+	'AV': ('Average', 'u(av)')
+}
+
+"""Statuses of configurations in order of comparison table"""
+STATUSES = ['regression', 'improvement', 'unchanged']
+
+
+def _columns(list_of_results_dicts, heads):
+	return {head: np.array([row[head] for row in list_of_results_dicts]) for head in heads}
+
+
+def _last_of_duplicates(ids):
+	"""Returns indices of unique ids, the last occurrence of every id is kept"""
+	_, reversed_indices = np.unique(ids[::-1], return_index=True)
+	return len(ids) - 1 - reversed_indices
+
+
+class CampaignComparison(object):
+	"""Per-configuration comparison of speeds of two campaigns (e.g. before and after new bitfile build).
+
+	Refactored results of both campaigns are joined on the full configuration
+	key. For every speed (PC, FPGA, average) the delta of candidate against
+	baseline and its z-score delta / sqrt(u_baseline^2 + u_candidate^2) are
+	computed at once for all configurations; configuration whose target
+	speed changed by more than sigma combined uncertainties and at least
+	min_relative_change is a regression or an improvement.
+
+	Attributes:
+		key_heads (list): columns configurations are joined on.
+		target_speed (string): speed deciding status: 'PC', 'FPGA' or 'AV'.
+		keys (dict): key head mapped to array of values of joined configurations.
+		baseline (dict): refactored column mapped to array of baseline values of joined configurations.
+		candidate (dict): refactored column mapped to array of candidate values of joined configurations.
+		only_in_baseline (int): configurations of baseline missing in candidate.
+		only_in_candidate (int): configurations of candidate missing in baseline.
+	"""
+	def __init__(self, baseline_results_dicts, candidate_results_dicts, key_heads, target_speed='AV', sigma=2.0,
+				 min_relative_change=0.01):
+		"""Args:
+			baseline_results_dicts (list): list of dicts of refactored data of baseline campaign.
+			candidate_results_dicts (list): list of dicts of refactored data of compared campaign.
+			key_heads (list): columns identifying configuration (missing in any campaign are skipped).
+			target_speed (string): speed deciding status: 'PC', 'FPGA' or 'AV'.
+			sigma (float): how many combined uncertainties the change must exceed to be significant.
+			min_relative_change (float): smaller relative changes are never flagged, however significant.
+		"""
+		if target_speed not in COMPARED_SPEEDS:
+			raise ValueError('Target speed should be defined as PC, FPGA or AV')
+		first_rows = [results[0] if results else {} for results in (baseline_results_dicts, candidate_results_dicts)]
+		self.key_heads = [head for head in key_heads if all(head in row for row in first_rows)]
+		self.target_speed = target_speed
+		self.sigma = sigma
+		self.min_relative_change = min_relative_change
+		speed_heads = [head for heads in COMPARED_SPEEDS.values() for head in heads]
+		baseline = _columns(baseline_results_dicts, self.key_heads + speed_heads)
+		candidate = _columns(candidate_results_dicts, self.key_heads + speed_heads)
+
+		# Both campaigns are encoded with common codes of every key column and joined on single integer id
+		codes = []
+		for head in self.key_heads:
+			values = np.concatenate([baseline[head], candidate[head]])
+			codes.append(np.unique(values, return_inverse=True)[1].ravel())
+		shape = tuple(int(code.max()) + 1 if len(code) else 1 for code in codes)
+		ids = np.ravel_multi_index(codes, shape) if codes else np.zeros(len(baseline_results_dicts) + len(candidate_results_dicts), dtype=np.int64)
+		baseline_ids, candidate_ids = ids[:len(baseline_results_dicts)], ids[len(baseline_results_dicts):]
+		duplicated = len(ids) - len(np.unique(baseline_ids)) - len(np.unique(candidate_ids))
+		if duplicated:
+			print("{} results share configuration with other results of the same campaign (keys {}), the last ones are kept".format(
+				duplicated, self.key_heads))
+		baseline_unique = _last_of_duplicates(baseline_ids)
+		candidate_unique = _last_of_duplicates(candidate_ids)
+		_, baseline_indices, candidate_indices = np.intersect1d(baseline_ids[baseline_unique], candidate_ids[candidate_unique],
+																assume_unique=True, return_indices=True)
+		baseline_indices = baseline_unique[baseline_indices]
+		candidate_indices = candidate_unique[candidate_indices]
+		self.only_in_baseline = len(baseline_unique) - len(baseline_indices)
+		self.only_in_candidate = len(candidate_unique) - len(candidate_indices)
+		self.keys = {head: baseline[head][baseline_indices] for head in self.key_heads}
+		self.baseline = {head: baseline[head][baseline_indices].astype(np.float64) for head in speed_heads}
+		self.candidate = {head: candidate[head][candidate_indices].astype(np.float64) for head in speed_heads}
+
+	def __len__(self):
+		return len(next(iter(self.baseline.values())))
+
+	def delta(self, speed=None):
+		"""Returns (delta, its uncertainty, relative delta, z-score) arrays of speed ('PC', 'FPGA' or 'AV'; default: target)"""
+		speed_head, uncertainty_head = COMPARED_SPEEDS[speed if speed else self.target_speed]
+		delta = self.candidate[speed_head] - self.baseline[speed_head]
+		uncertainty = np.sqrt(np.square(self.baseline[uncertainty_head]) + np.square(self.candidate[uncertainty_head]))
+		with np.errstate(divide='ignore', invalid='ignore'):
+			relative = delta / self.baseline[speed_head]
+			z_score = np.where(uncertainty > 0, delta / uncertainty, np.sign(delta) * np.inf)
+		return delta, uncertainty, relative, z_score
+
+	def statuses(self):
+		"""Returns array with index of status (in STATUSES) of every configuration"""
+		_, _, relative, z_score = self.delta()
+		with np.errstate(invalid='ignore'):
+			changed = (np.abs(z_score) > self.sigma) & (np.abs(relative) >= self.min_relative_change)
+		return np.where(changed, np.where(z_score < 0, 0, 1), 2)
+
+	def counts(self):
+		"""Returns dict of status mapped to number of configurations"""
+		return dict(zip(STATUSES, np.bincount(self.statuses(), minlength=len(STATUSES)).tolist()))
+
+	def list_of_dicts(self):
+		"""Returns comparison table: regressions, improvements and unchanged configurations, each by decreasing |z|"""
+		speed_head, uncertainty_head = COMPARED_SPEEDS[self.target_speed]
+		delta, uncertainty, relative, z_score = self.delta()
+		statuses = self.statuses()
+		order = np.lexsort((-np.nan_to_num(np.abs(z_score), nan=-1.0), statuses))
+		columns = dict(self.keys)
+		columns.update({
+			'Baseline': self.baseline[speed_head],
+			'u(baseline)': self.baseline[uncertainty_head],
+			'Candidate': self.candidate[speed_head],
+			'u(candidate)': self.candidate[uncertainty_head],
+			'Delta': delta,
+			'u(delta)': uncertainty,
+			'Delta [%]': 100 * relative
+		})
+		for speed in COMPARED_SPEEDS:
+			columns['z({})'.format(speed)] = self.delta(speed)[3]
+		columns['Status'] = np.array(STATUSES)[statuses]
+		lists = {head: column[order].tolist() for head, column in columns.items()}
+		return [dict(zip(lists, row)) for row in zip(*lists.values())]
+
+	def print_summary(self):
+		counts = self.counts()
+		print("{} configurations compared on {} speed: {} regressions, {} improvements, {} unchanged".format(
+			len(self), self.target_speed, counts['regression'], counts['improvement'], counts['unchanged']))
+		if self.only_in_baseline or self.only_in_candidate:
+			print("{} configurations only in baseline, {} only in candidate".format(self.only_in_baseline, self.only_in_candidate))
+
+	def figure_jobs(self, figure_heads, series_heads, symbols):
+		"""Returns figure jobs (as drawn by Figure.draw_job) of relative delta [%] against pattern size.
+
+		Args:
+			figure_heads (list): every combination of their values is a separate figure, e.g. Mode, Direction, DataPattern.
+			series_heads (list): every combination of their values is a series; heads constant within figure
+								 or equal to PatternSize (BlockSize outside duplex mode) are left out of labels.
+			symbols (list): matplotlib format strings used by series in turn.
+		"""
+		delta, uncertainty, _, _ = self.delta()
+		speed_head = COMPARED_SPEEDS[self.target_speed][0]
+		with np.errstate(divide='ignore', invalid='ignore'):
+			percent = 100 * delta / self.baseline[speed_head]
+			percent_uncertainty = 100 * uncertainty / self.baseline[speed_head]
+		figure_heads = [head for head in figure_heads if head in self.keys]
+		series_heads = [head for head in series_heads if head in self.keys]
+		figure_keys = list(zip(*(self.keys[head].tolist() for head in figure_heads))) if figure_heads else [()] * len(self)
+		jobs = []
+		for figure_key in sorted(set(figure_keys), key=str):
+			in_figure = np.array([key == figure_key for key in figure_keys], dtype=bool)
+			labelled = [head for head in series_heads
+						if len(np.unique(self.keys[head][in_figure])) > 1
+						and not np.array_equal(self.keys[head][in_figure], self.keys['PatternSize'][in_figure])]
+			series_keys = list(zip(*(self.keys[head][in_figure].tolist() for head in labelled))) if labelled \
+				else [()] * int(np.count_nonzero(in_figure))
+			indices = np.flatnonzero(in_figure)
+			series = []
+			for i, series_key in enumerate(sorted(set(series_keys), key=str)):
+				selected = indices[[key == series_key for key in series_keys]]
+				selected = selected[np.argsort(self.keys['PatternSize'][selected], kind='stable')]
+				label = ' '.join(str(value) for value in series_key) if series_key else speed_head
+				series.append((self.keys['PatternSize'][selected].tolist(), percent[selected].tolist(),
+							   percent_uncertainty[selected].tolist(), symbols[i % len(symbols)], label))
+			jobs.append({
+				'series': series,
+				'title_args': figure_key,
+				'name_args': figure_key
+			})
+		return jobs
@@ -0,0 +1,137 @@
+import glob
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from results_cache import ResultsCache
+from results_table import ResultsTable, read_csv_headers
+
+
+CAMPAIGN_HEAD = 'Campaign'
+
+"""Columns every csv file of results must have; other csv files (e.g. outputs of analysis) are skipped"""
+REQUIRED_HEADS = ['Mode', 'Direction', 'StatisticalIter', 'SpeedPC [B/s]', 'SpeedFPGA [B/s]']
+
+
+def read_headers_from_performance_cfg(cfg_file):
+	"""Returns list of headers from 'output' scope of performance.cfg file or None if it is not defined"""
+	with open(cfg_file, mode='r') as performance_cfg:
+		content = performance_cfg.read()
+	match = re.search(r'^\s*headers\s*=\s*\[((?:\s*"[^"]*"\s*,?)*)\s*\]', content, re.MULTILINE)
+	if not match:
+		return None
+	return re.findall(r'"([^"]*)"', match.group(1))
+
+
+def is_multi_campaign_source(source):
+	"""Is source a directory or glob pattern instead of single csv file?"""
+	return os.path.isdir(source) or glob.has_magic(source)
+
+
+def resolve_csv_files(source):
+	"""Returns sorted list of csv files pointed by file name, directory (searched recursively) or glob pattern"""
+	if os.path.isdir(source):
+		csv_files = glob.glob(os.path.join(source, '**', '*.csv'), recursive=True)
+	elif glob.has_magic(source):
+		csv_files = glob.glob(source, recursive=True)
+	else:
+		csv_files = [source]
+	return sorted(csv_file for csv_file in csv_files if os.path.isfile(csv_file))
+
+
+def results_csv_files(csv_files, delimiter):
+	"""Returns csv files with all REQUIRED_HEADS; empty files and files of other tables are reported and skipped"""
+	results_files = []
+	for csv_file in csv_files:
+		headers = read_csv_headers(csv_file, delimiter)
+		if headers is None:
+			print("Skipping empty file {}".format(csv_file))
+			continue
+		missing = [head for head in REQUIRED_HEADS if head not in headers]
+		if missing:
+			print("Skipping {}: not a results file (missing columns {})".format(csv_file, missing))
+			continue
+		results_files.append(csv_file)
+	return results_files
+
+
+def resolve_results_csv_files(source, delimiter):
+	"""Returns sorted list of csv files of results pointed by source (see resolve_csv_files and results_csv_files)"""
+	return results_csv_files(resolve_csv_files(source), delimiter)
+
+
+def campaign_names(csv_files):
+	"""Returns name of each campaign: path relative to common directory of all files, without extension"""
+	if not csv_files:
+		return []
+	common_path = os.path.commonpath([os.path.dirname(os.path.abspath(csv_file)) for csv_file in csv_files])
+	return [os.path.splitext(os.path.relpath(os.path.abspath(csv_file), common_path))[0].replace(os.sep, '/')
+			for csv_file in csv_files]
+
+
+def reconcile_headers(table, headers, int_values, float_values, categorical_values, csv_file):
+	"""Returns table with columns in order of headers; missing columns are filled, unknown ones dropped (csv_file is reported)"""
+	columns = {}
+	categories = {}
+	length = len(table)
+	filled = [head for head in headers if head not in table.columns]
+	if filled:
+		print("Columns {} are missing in {} and will be filled with default values (0, NaN or empty)".format(filled, csv_file))
+	for head in headers:
+		if head in table.columns:
+			columns[head] = table.columns[head]
+			if table.is_categorical(head):
+				categories[head] = table.categories[head]
+		elif head in int_values:
+			columns[head] = np.zeros(length, dtype=np.int64)
+		elif head in float_values:
+			columns[head] = np.full(length, np.nan)
+		elif head in categorical_values:
+			columns[head] = np.zeros(length, dtype=np.int16)
+			categories[head] = ['']
+		else:
+			columns[head] = np.full(length, '')
+	for head in table.headers:
+		if head not in headers:
+			print("Column '{}' of {} is not defined in headers list and will be skipped".format(head, csv_file))
+	return ResultsTable(headers, columns, categories, table.malformed_rows)
+
+
+def load_campaigns(source, delimiter, int_values, float_values, categorical_values, headers=None, chunk_size=100000,
+				   load_workers=4, cache_folder=None, refactored_heads=(), stat_iterations=0):
+	"""Read all csv files of results pointed by source in parallel and return them as one table with Campaign column.
+
+	Columns of the returned table are concatenated lazily, on their first use.
+
+	Args:
+		source (string): directory or glob pattern of csv files.
+		headers (list): expected headers (e.g. from performance.cfg); None: headers of the first file.
+		load_workers (int): number of threads reading files.
+		cache_folder (string): where each file is cached (None: no caching).
+	"""
+	csv_files = resolve_results_csv_files(source, delimiter)
+	if not csv_files:
+		raise ValueError('No csv files with results found for: {}'.format(source))
+
+	def load(csv_file):
+		if cache_folder:
+			cache = ResultsCache(cache_folder, csv_file, delimiter, int_values, float_values, categorical_values,
+								 refactored_heads, stat_iterations, chunk_size)
+			return cache.load()[0]
+		return ResultsTable.from_csv(csv_file, delimiter, int_values, float_values, categorical_values, chunk_size)
+
+	with ThreadPoolExecutor(max_workers=load_workers) as pool:
+		tables = list(pool.map(load, csv_files))
+
+	if headers is None:
+		headers = tables[0].headers
+	tables = [reconcile_headers(table, headers, int_values, float_values, categorical_values, csv_file)
+			  for table, csv_file in zip(tables, csv_files)]
+	names = campaign_names(csv_files)
+	for i, table in enumerate(tables):
+		table.headers.append(CAMPAIGN_HEAD)
+		table.columns[CAMPAIGN_HEAD] = np.full(len(table), i, dtype=np.int16)
+		table.categories[CAMPAIGN_HEAD] = names
+	return ResultsTable.concatenate(tables)
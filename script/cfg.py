@@ -1,29 +1,156 @@
-"""Specify path to csv file that contains transfer results"""
+"""Specify path to csv file that contains transfer results (or directory / glob pattern of csv files from many campaigns)"""
 CSV_FILE = './Arch/majowka/test_resultNONDUPLEX.csv'
 
+"""Config file of transfer program; its headers list is used to reconcile csv files from many campaigns"""
+PERFORMANCE_CFG_FILE = '../performance.cfg'
+
+"""Number of threads reading csv files from many campaigns"""
+LOAD_WORKERS = 4
+
 """Specify separator in csv file"""
 SEPARATOR = ';'
 
 """Specify number of statistical iterations based on config file"""
 STATISTICAL_ITERATIONS = 10
 
+"""Where parsed and aggregated results are cached between runs (None: no caching)"""
+RESULTS_CACHE_FOLDER = './.results_cache/'
+
+"""Statistical iterations left out of statistics, e.g. [1] to drop the first (warm-up) iteration"""
+DROPPED_STATISTICAL_ITERATIONS = []
+
+"""Reject samples with robust z-score (based on median absolute deviation) above this value (None: no rejection)"""
+OUTLIER_THRESHOLD = None
+
+"""Percentiles computed next to mean, stdev, median and min / max of every speed"""
+PERCENTILES = [5, 95]
+
 """Check if any error occured during transfer and return it on stdout"""
 CHECK_FOR_ERRORS = False
 
+"""Anomaly scanner (check command): SpeedFPGA / SpeedPC above which speeds disagree, accepted relative excess of SpeedPC over SpeedFPGA,"""
+"""relative tolerance of time consistency checks and robust z-score above which throughput is an outlier"""
+SCAN_MAX_SPEED_RATIO = 1000.0
+SCAN_SPEED_TOLERANCE = 0.05
+SCAN_TIME_TOLERANCE = 1e-4
+SCAN_OUTLIER_THRESHOLD = 3.5
+
 """Specify the target speed that will be collocated with pattern sizes on charts (also available: 'PC' and 'FPGA')"""
 TARGET_SPEED = 'AV'
 
 """Each combination of parameters on separated chart? (default: no)"""
 PARAMETERS_SEPARATED = False
 
+"""Set titles inside figures? (default: no, titles are used as captions in LaTeX chapter)"""
+SET_TITLES_IN_FIGS = False
+
+"""Number of processes rendering figures (1: serially in main process, 0: one per CPU core)"""
+RENDER_WORKERS = 1
+
+"""How figures are saved: 'pdf' (standalone PDF per figure), 'multipage' (one multi-page PDF per plotting option,"""
+"""rendered in one process) and / or 'png' (thumbnails for quick review); chapter references pdf, multipage or png"""
+FIGURE_OUTPUT_MODES = ['pdf']
+PNG_DPI = 72
+FIGURE_RC_PARAMS = {} # Matplotlib settings applied once per process, e.g. {'pdf.fonttype': 42}
+
+"""Render only figures whose data, symbols, titles or settings changed since last run (or whose files are missing)?"""
+"""Hashes of saved figures are kept in manifest next to them (default: yes)"""
+INCREMENTAL_RENDERING = True
+FIGURE_MANIFEST_FILE_NAME = 'figure_manifest.json'
+
+"""Fit t = t0 + size / bandwidth model to every configuration, save its parameters and draw it on figures? (default: no)"""
+FIT_TRANSFER_MODEL = False
+TRANSFER_MODEL_FILE_NAME = 'transfer_model.csv'
+FRACTION_OF_PEAK = 0.9 # Transfer size reaching this fraction of asymptotic bandwidth is reported
+TRANSFER_MODEL_HEADS = ['Mode', 'Direction', 'FifoMemoryType', 'FifoDepth', 'DataPattern', 'BlockSize', 'Campaign'] # BlockSize: duplex only
+
+"""Ranking of configurations (rank command): axes ranked together, candidates within RANKING_TIE_SIGMA combined uncertainties"""
+"""of the best are tied; the cheapest candidate reaching RANKING_FRACTION_OF_PEAK of the best speed is reported too"""
+RANKING_AXES = ['FifoMemoryType', 'FifoDepth']
+RANKING_TIE_SIGMA = 1.0
+RANKING_FRACTION_OF_PEAK = 0.95
+RANKING_FILE_NAME = 'ranking.csv'
+
+"""Pareto frontier of speed against cost axes and the cheapest candidates of ranking; values of every cost axis from the cheapest (values not listed are the most expensive)"""
+PARETO_COST_ORDERS = {
+	'FifoDepth': [16, 32, 64, 256, 1024, 2048],
+	'FifoMemoryType': ['shiftregister', 'distributedram', 'blockram']
+}
+PARETO_FILE_NAME = 'pareto_frontier.csv'
+
+"""Comparison of campaign (--csv-file) with baseline (compare command): change of target speed is significant above"""
+"""COMPARISON_SIGMA combined uncertainties and COMPARISON_MIN_RELATIVE_CHANGE; figures of change against pattern size"""
+COMPARISON_SIGMA = 2.0
+COMPARISON_MIN_RELATIVE_CHANGE = 0.01
+COMPARISON_FILE_NAME = 'comparison.csv'
+COMPARISON_FIGURE_HEADS = ['Mode', 'Direction', 'DataPattern']
+COMPARISON_SERIES_HEADS = ['FifoMemoryType', 'FifoDepth', 'BlockSize']
+COMPARISON_SYMBOLS = ['o', '*', '+', 'v', '^', 's', 'x', 'd']
+COMPARISON_TITLE = 'Change of speed against baseline for \\textit{{{}}} mode, \\textit{{{}}} direction and \\textit{{{}}} pattern type.'
+COMPARISON_SAVEFIG = 'delta_{}_{}_{}.pdf'
+
+"""Timeline of transfer program recovered from its glog files (timeline command): runs are joined with results rows"""
+"""logged within tolerance, time is split into transfers, run overhead, bitfile loads and startup"""
+RUN_TIMELINE_FILE_NAME = 'run_timeline.csv'
+LOG_MATCH_TOLERANCE_SECONDS = 2.0
+
+"""Drift of throughput over Time of campaign (drift command): reference configurations as list of dicts of column values,"""
+"""e.g. [{'Mode': '32bit', 'Direction': 'read', 'PatternSize': 1048576}] (None: every configuration measured over"""
+"""DRIFT_MIN_REFERENCE_SPAN of campaign), rolling window and change points of relative speed of references"""
+DRIFT_REFERENCES = None
+DRIFT_MIN_REFERENCE_SPAN = 0.5
+DRIFT_MIN_REFERENCE_SAMPLES = 10
+DRIFT_WINDOW_SECONDS = 3600.0
+DRIFT_CHANGE_POINT_THRESHOLD = 5.0 # CUSUM statistic in noise sigmas
+DRIFT_MIN_SEGMENT = 10 # The smallest number of reference samples between change points
+DRIFT_FILE_NAME = 'drift_corrected.csv'
+DRIFT_ROLLING_FILE_NAME = 'drift_rolling.csv'
+
 """Generate LaTeX results chapter? (default: no)"""
 GENERATE_RESULTS_CHAPTER = True
 RESULTS_CHAPTER_FILE_NAME = 'results_ver2.tex'
 FIG_FOLDER = 'src/results/' # Where figures will be sotred in TeX project?
 
 
+"""Profile stages of analysis (loading, casting, aggregation, parameter scan, rendering, chapter) and print summary at exit?
+(default: no; environment variable RUN_ANALYSIS_PROFILE=1 / 0 overrides it)"""
+PROFILE_STAGES = False
+PROFILE_MEMORY = False # Also measure peak memory with tracemalloc (several times slower; RUN_ANALYSIS_PROFILE_MEMORY=1 / 0 overrides it)
+PROFILE_TRACE_FILE_NAME = None # e.g. 'profile_trace.json' (viewable in chrome://tracing)
+PROFILE_CPROFILE_FILE_NAME = None # e.g. 'slowest_stage.prof' (cProfile stats of the slowest stage)
+
+"""Sweep planner: remaining runs of performance.cfg sweep (results in CSV_FILE are skipped), one config file per bitfile"""
+SWEEP_PLAN_FILE_NAME = 'sweep_plan.csv'
+SWEEP_CFG_FOLDER = './sweep_plan/'
+BITFILE_LOAD_SECONDS = 2.0 # Time of loading single bitfile to FPGA
+RUN_OVERHEAD_SECONDS = 0.0 # Time of every run spent beside transfers
+
+"""FIFO transfer simulator: results of performance.cfg sweep simulated without hardware (python fifo_simulator.py [performance.cfg])"""
+SIMULATED_RESULTS_FILE_NAME = 'simulated_results.csv'
+SIMULATION_SEED = 0 # The same seed gives the same results
+SIMULATION_JITTER = 0.02 # Sigma of log-normal noise of every host call duration (0: deterministic)
+SIMULATION_WORD_ERROR_RATE = 1e-12 # Probability that 32-bit word is corrupted in transfer
+
+"""Golden patterns of performance.cfg sweep for verification of captured transfers
+(python pattern_library.py [performance.cfg] builds it, python pattern_library.py capture mode pattern verifies)"""
+PATTERN_LIBRARY_FOLDER = './.pattern_library/'
+VERIFICATION_BLOCK_SIZE = 64 * 1024 * 1024 # How many bytes are compared at once
+
+
+"""Benchmark of analysis pipeline on synthetic results (python benchmark.py [baseline_report.json])"""
+BENCHMARK_ROWS = [1000, 10000, 100000, 1000000, 10000000]
+BENCHMARK_FOLDER = './.benchmark/' # Where generated datasets are kept between runs
+BENCHMARK_REPORT_FILE_NAME = 'benchmark_report.json'
+BENCHMARK_REPEATS = 3 # Best time of repeats is reported
+BENCHMARK_TRACE_MEMORY = True # Measure peak memory of every stage (in separate run)
+BENCHMARK_TOLERANCE = 0.2 # Relative growth of time or memory reported as regression
+
+
 """Try not to modify this section on your own (except you know exactely what are you doing)!"""
 
+"""Clock of FIFO counter in MHz (FIFO_CLOCK in performance.h)"""
+FIFO_CLOCK = 100.8
+
 """Results that need casting to integers"""
 INT_VALUES = ['FifoDepth', 'PatternSize', 'BlockSize', 'StatisticalIter', 'Iterations', 'Errors']
 
@@ -33,6 +160,12 @@ FLOAT_VALUES = ['PC time(total) [us]', 'PC time(per iteration) [us]',
 				'FPGA time(per iteration) [us]', 'SpeedPC [B/s]',
 				'SpeedFPGA [B/s]']
 
+"""Results that are stored as categorical codes instead of strings"""
+CATEGORICAL_VALUES = ['Mode', 'Direction', 'FifoMemoryType', 'DataPattern']
+
+"""How many csv rows are converted to typed columns at once (bounds memory used for raw strings)"""
+CSV_CHUNK_SIZE = 100000
+
 """Names of heads after refactoring"""
 REFACTORED_HEADS = ['Mode', 'Direction', 'FifoMemoryType', 'FifoDepth', 'PatternSize', 'BlockSize', 'DataPattern', 'SpeedPC', 'u(PC)', 'SpeedFPGA', 'u(FPGA)', 'Average', 'u(av)']
 
@@ -48,6 +181,14 @@ FIGURE_METADATA = {
 	'error' : 'Target ylabel should be defined as PC, FPGA or AV'
 }
 
+"""Metadata for figures of comparison with baseline"""
+COMPARISON_FIGURE_METADATA = dict(FIGURE_METADATA, **{
+	'ylabel_PC' : 'Change of speed PC [%]',
+	'ylabel_FPGA' : 'Change of speed FPGA [%]',
+	'ylabel_AV' : 'Change of average speed [%]',
+	'yticks' : [i for i in range(-50, 51, 10)]
+})
+
 """Properties that can be combined with each other"""
 BASIC_PROPERTIES = {
 	'Mode' : ['nonsym', '32bit', 'duplex'],
@@ -65,6 +206,9 @@ MODES_DICT = {
 	'pattern_memtype_depth': 'Depths'
 }
 
+"""Symbol used for values without own entry in legend (e.g. campaigns)"""
+DEFAULT_LEGEND_SYMBOL = 'o'
+
 """Combined parameters"""
 PLOTTING_OPTIONS = {
 	'memtype_depth_pattern' : {
@@ -116,6 +260,16 @@ PLOTTING_OPTIONS = {
 			2048 : 'r+'
 		}
 	}
+	# 'campaign_memtype_depth': {
+	# 	'title' : 'Transfer results for \\textit{{{}}} direction, \\textit{{{}}} FIFO memory type with \\textit{{{}}} depth value.',
+	# 	'subsection': 'Campaigns',
+	# 	'savefig' : '{}_{}_{}_campaigns.pdf',
+	# 	'valid_modes': ['32bit', 'nonsym'],
+	# 	'first_param' : 'FifoMemoryType',
+	# 	'second_param' : 'FifoDepth',
+	# 	'third_param' : 'Campaign',
+	# 	'legend' : {}
+	# },
 	# 'duplex_memtype_blocksize_pattern': {
 	# 	'title': 'Fifo memory type: {}. Block size = {}',
 	# 	'savefig': '{}_{}_{}_patterns.png',
@@ -0,0 +1,200 @@
+import functools
+import math
+
+import numpy as np
+
+
+"""Same limit as MAX_PATTERN_SIZE in performance.h"""
+MAX_PATTERN_SIZE = 1073741824
+
+"""Register sizes (in bytes) of transfer modes, as in DataGenerator::determineRegisterParameters"""
+REGISTER_SIZES = {
+	'32bit': 4,
+	'duplex': 4,
+	'nonsym': 8
+}
+
+PATTERNS = ['counter_8bit', 'counter_32bit', 'walking_1', 'asic']
+
+ASIC_RECORD_SIZE = 8
+ASIC_CHECKED_BYTES = 3
+
+
+@functools.lru_cache(maxsize=None)
+def _asic_amplitude_cycle():
+	"""Returns (transient, period, sequence) of 16-bit LFSR amplitude used by asic pattern.
+
+	The next amplitude depends only on the current one, so the sequence of
+	values gets periodic after at most 65536 steps.
+	"""
+	amplitude = 0x123
+	seen = {}
+	sequence = []
+	while amplitude not in seen:
+		seen[amplitude] = len(sequence)
+		sequence.append(amplitude)
+		amplitude = ((amplitude << 1) | (((amplitude >> 11) ^ (amplitude >> 5) ^ (amplitude >> 3)) & 1)) & 0xFFFF
+	transient = seen[amplitude]
+	return transient, len(sequence) - transient, np.array(sequence, dtype=np.uint64)
+
+
+@functools.lru_cache(maxsize=None)
+def _asic_low_words():
+	"""Returns (transient, period, words) of first four bytes of asic records (ID, channel, amplitude, timestamp LSB).
+
+	These bytes depend on ID (period 14 * 255 records), channel (255), amplitude
+	and parity of record, so after the amplitude transient they repeat with
+	period that is the least common multiple of all of them.
+	"""
+	amplitude_transient, amplitude_period, sequence = _asic_amplitude_cycle()
+	period = math.lcm(14 * 255, amplitude_period, 2)
+	k = np.arange(amplitude_transient + period, dtype=np.uint64)
+	channel = np.uint64(1) + k % np.uint64(255)
+	asic_id = np.uint64(1) + (k // np.uint64(255)) % np.uint64(14)
+	position = np.where(k < amplitude_transient, k,
+						amplitude_transient + (k - np.uint64(amplitude_transient)) % np.uint64(amplitude_period))
+	amplitude = sequence[position]
+	timestamp = k * np.uint64(ASIC_RECORD_SIZE) + np.uint64(1)
+
+	low_bytes = np.empty((len(k), 4), dtype=np.uint8)
+	byte = np.uint64(0xFF)
+	low_bytes[:, 0] = (asic_id + ((channel << np.uint64(4)) & byte)) & byte
+	low_bytes[:, 1] = ((channel >> np.uint64(4)) + ((amplitude << np.uint64(4)) & byte)) & byte
+	low_bytes[:, 2] = (amplitude >> np.uint64(4)) & byte
+	low_bytes[:, 3] = ((amplitude >> np.uint64(12)) + ((timestamp << np.uint64(4)) & byte)) & byte
+	return amplitude_transient, period, low_bytes.view('<u4').ravel()
+
+
+class DataGenerator(object):
+	"""Vectorized port of DataGenerator from src/datagen.cpp.
+
+	Generates byte-exact counter_8bit, counter_32bit, walking_1 and asic
+	patterns for any part of the pattern, so pattern of any size is processed
+	chunk by chunk with bounded memory.
+
+	Attributes:
+		mode (string): transfer mode ('32bit', 'nonsym' or 'duplex').
+		pattern (string): name of the pattern.
+		pattern_size (int): size of the whole pattern in bytes.
+		chunk_size (int): how many bytes are generated at once.
+	"""
+	def __init__(self, mode, pattern, pattern_size, chunk_size=64 * 1024 * 1024):
+		"""Args:
+			mode (string): transfer mode ('32bit', 'nonsym' or 'duplex').
+			pattern (string): name of the pattern.
+			pattern_size (int): size of the whole pattern in bytes.
+			chunk_size (int): how many bytes are generated at once.
+		"""
+		if mode not in REGISTER_SIZES:
+			raise ValueError('Wrong width mode: {}'.format(mode))
+		if pattern not in PATTERNS:
+			raise ValueError('Wrong pattern: {}'.format(pattern))
+		if not 0 <= pattern_size <= MAX_PATTERN_SIZE:
+			raise ValueError('Pattern size must be in range 0 - {}'.format(MAX_PATTERN_SIZE))
+		self.mode = mode
+		self.pattern = pattern
+		self.pattern_size = pattern_size
+		self.chunk_size = chunk_size - chunk_size % ASIC_RECORD_SIZE if chunk_size >= ASIC_RECORD_SIZE else ASIC_RECORD_SIZE
+		self.register_size = REGISTER_SIZES[mode]
+		self.__period = self.__periodic_pattern()
+
+	def __periodic_pattern(self):
+		"""counter_8bit and walking_1 repeat after few hundred bytes, so they are tiled from one period"""
+		if self.pattern == 'counter_8bit':
+			return np.arange(256, dtype=np.uint8)
+		if self.pattern == 'walking_1':
+			bits = 8 * self.register_size
+			words = np.left_shift(np.uint64(1), np.arange(bits, dtype=np.uint64))
+			return self.__words_to_bytes(words)
+		return None
+
+	def __words_to_bytes(self, words):
+		return words.astype('<u{}'.format(self.register_size)).view(np.uint8)
+
+	def __tiled(self, start, stop):
+		period = self.__period
+		first = start % len(period)
+		repeats = -(-(first + stop - start) // len(period))
+		return np.tile(period, repeats)[first:first + stop - start]
+
+	def __counter_32bit(self, start, stop):
+		first_word = start // self.register_size
+		last_word = -(-stop // self.register_size)
+		words = np.arange(first_word, last_word, dtype=np.uint64)
+		offset = start - first_word * self.register_size
+		return self.__words_to_bytes(words)[offset:offset + stop - start]
+
+	def __asic(self, start, stop):
+		first_record = start // ASIC_RECORD_SIZE
+		last_record = -(-stop // ASIC_RECORD_SIZE)
+		transient, period, low_words = _asic_low_words()
+		words = np.empty((last_record - first_record, 2), dtype='<u4')
+		head = max(0, min(last_record, transient) - first_record)
+		words[:head, 0] = low_words[first_record:first_record + head]
+		if head < len(words):
+			first = (first_record + head - transient) % period
+			repeats = -(-(first + len(words) - head) // period)
+			words[head:, 0] = np.tile(low_words[transient:], repeats)[first:first + len(words) - head]
+		timestamp = np.arange(first_record, last_record, dtype=np.uint64) * np.uint64(ASIC_RECORD_SIZE) + np.uint64(1)
+		words[:, 1] = timestamp >> np.uint64(4)
+		offset = start - first_record * ASIC_RECORD_SIZE
+		return words.view(np.uint8).ravel()[offset:offset + stop - start]
+
+	def generate(self, start=0, stop=None):
+		"""Returns bytes [start, stop) of the pattern as uint8 array"""
+		stop = self.pattern_size if stop is None else min(stop, self.pattern_size)
+		if start >= stop:
+			return np.empty(0, dtype=np.uint8)
+		if self.__period is not None:
+			return self.__tiled(start, stop)
+		if self.pattern == 'counter_32bit':
+			return self.__counter_32bit(start, stop)
+		return self.__asic(start, stop)
+
+	def iter_chunks(self):
+		"""Yields (offset, uint8 array) for consecutive chunks of the pattern"""
+		for start in range(0, self.pattern_size, self.chunk_size):
+			yield start, self.generate(start, start + self.chunk_size)
+
+	def fill_array_with_data(self):
+		"""Returns the whole pattern (as DataGenerator::fillArrayWithData)"""
+		return self.generate()
+
+	def checked_bytes_mask(self, start, stop):
+		"""Returns mask of bytes that are compared; for asic only first bytes of every record are checked"""
+		if self.pattern != 'asic':
+			return None
+		return (np.arange(start, stop) % ASIC_RECORD_SIZE) < ASIC_CHECKED_BYTES
+
+	def check_chunk_for_errors(self, data, start):
+		"""Returns (number of wrong bytes, offset of the first wrong byte or None) of data placed at start"""
+		data = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data.view(np.uint8).ravel()
+		stop = start + len(data)
+		expected = self.generate(start, stop)
+		mismatches = data[:len(expected)] != expected
+		mask = self.checked_bytes_mask(start, start + len(expected))
+		if mask is not None:
+			mismatches &= mask
+		errors = int(np.count_nonzero(mismatches))
+		first_mismatch = start + int(np.argmax(mismatches)) if errors else None
+		return errors, first_mismatch
+
+	def check_array_for_errors(self, data):
+		"""Returns (errors, first mismatch offset) of data compared with the pattern (as DataGenerator::checkArrayForErrors).
+
+		Data shorter or longer than the pattern is compared on common part only.
+		"""
+		data = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data.view(np.uint8).ravel()
+		errors = 0
+		first_mismatch = None
+		for start in range(0, min(len(data), self.pattern_size), self.chunk_size):
+			chunk_errors, chunk_first_mismatch = self.check_chunk_for_errors(data[start:start + self.chunk_size], start)
+			errors += chunk_errors
+			if first_mismatch is None:
+				first_mismatch = chunk_first_mismatch
+		return errors, first_mismatch
+
+	def check_file_for_errors(self, file_name, offset=0):
+		"""Returns (errors, first mismatch offset) of captured pipe dump stored in file, read memory-mapped"""
+		data = np.memmap(file_name, dtype=np.uint8, mode='r', offset=offset)
+		return self.check_array_for_errors(data)
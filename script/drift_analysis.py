@@ -0,0 +1,245 @@
+import numpy as np
+
+from aggregation import group_table, grouped_percentile
+from profiling import profiled
+
+
+"""Speeds followed over wall-clock time mapped to names of their columns in results"""
+DRIFT_SPEEDS = {
+	'SpeedPC': 'SpeedPC [B/s]',
+	'SpeedFPGA': 'SpeedFPGA [B/s]'
+}
+
+
+def parse_time_column(column):
+	"""Returns seconds since epoch (float, NaN for unparsable values) of Time column written by Results::logTime"""
+	column = np.asarray(column)
+	try:
+		parsed = column.astype('datetime64[s]')
+	except ValueError:
+		parsed = np.array([_parse_time(value) for value in column.tolist()], dtype='datetime64[s]')
+	seconds = parsed.astype(np.int64).astype(np.float64)
+	seconds[np.isnat(parsed)] = np.nan
+	return seconds
+
+
+def _parse_time(value):
+	try:
+		return np.datetime64(value, 's')
+	except ValueError:
+		return np.datetime64('NaT')
+
+
+def rolling_mean(t, values, group, window):
+	"""Mean of values of the same group within window (in units of t) centred on every sample.
+
+	Groups are shifted apart on time axis, so all windows are found with one
+	searchsorted on the whole array and summed from cumulative sums.
+	"""
+	if not len(t):
+		return np.empty(0)
+	shift = (np.nanmax(t) - np.nanmin(t) + 2 * window + 1) * group
+	shifted = t - np.nanmin(t) + shift
+	order = np.argsort(shifted, kind='stable')
+	shifted_sorted = shifted[order]
+	cumulative = np.concatenate([[0.0], np.cumsum(values[order])])
+	low = np.searchsorted(shifted_sorted, shifted_sorted - window / 2, side='left')
+	high = np.searchsorted(shifted_sorted, shifted_sorted + window / 2, side='right')
+	mean = np.empty(len(t))
+	mean[order] = (cumulative[high] - cumulative[low]) / (high - low)
+	return mean
+
+
+def _robust_sigma(values):
+	"""Standard deviation of noise estimated from median absolute difference of neighbours (insensitive to steps)"""
+	if len(values) < 3:
+		return np.nan
+	return 1.4826 * np.median(np.abs(np.diff(values))) / np.sqrt(2)
+
+
+def change_points(values, threshold=5.0, min_segment=10):
+	"""Returns sorted indices where mean of values shifts, found by binary segmentation.
+
+	Every segment is split where the CUSUM statistic
+	sqrt(k (n - k) / n) |mean(left) - mean(right)| / sigma is the highest
+	(computed for all k at once from cumulative sums), as long as it exceeds
+	threshold and both parts have at least min_segment values.
+	"""
+	values = np.asarray(values, dtype=np.float64)
+	sigma = _robust_sigma(values)
+	if not sigma > 0:
+		return []
+	points = []
+	segments = [(0, len(values))]
+	while segments:
+		start, stop = segments.pop()
+		n = stop - start
+		if n < 2 * min_segment:
+			continue
+		cumulative = np.cumsum(values[start:stop])
+		k = np.arange(min_segment, n - min_segment + 1)
+		left_mean = cumulative[k - 1] / k
+		right_mean = (cumulative[-1] - cumulative[k - 1]) / (n - k)
+		statistic = np.sqrt(k * (n - k) / n) * np.abs(left_mean - right_mean) / sigma
+		best = int(np.argmax(statistic))
+		if statistic[best] > threshold:
+			split = start + int(k[best])
+			points.append(split)
+			segments.extend([(start, split), (split, stop)])
+	return sorted(points)
+
+
+class DriftAnalysis(object):
+	"""Drift of throughput over wall-clock time of campaign, followed on repeated reference configurations.
+
+	Time column is parsed to seconds. Reference configurations are those
+	measured over long part of the campaign (or given explicitly); every
+	sample of them is divided by median of its configuration, so all of them
+	form one series of relative speed over time. Rolling mean of this series
+	shows slow drift, change points split it into segments of constant level
+	and speed of every row is corrected by level of the segment it was
+	measured in. Everything is computed with array operations over all rows.
+
+	Attributes:
+		key_heads (list): columns identifying configuration.
+		window (float): width of rolling window in seconds.
+		seconds (np.array): time of every row in seconds since epoch (NaN where Time is not valid).
+		group (np.array): configuration of every row.
+		reference (np.array): mask of configurations used as reference.
+		levels (dict): speed mapped to relative level (1: median) of segment of every row.
+		change_points (dict): speed mapped to list of dicts with time and relative levels before / after change.
+	"""
+	@profiled('drift analysis', lambda result, self, table, *args, **kwargs: {'rows': len(table)})
+	def __init__(self, table, key_heads, window=3600.0, references=None, min_reference_span=0.5, min_reference_samples=10,
+				 threshold=5.0, min_segment=10):
+		"""Args:
+			table (ResultsTable): raw results with Time column.
+			key_heads (list): columns identifying configuration.
+			window (float): width of rolling window in seconds.
+			references (list): dicts of column values selecting reference configurations (None: chosen automatically).
+			min_reference_span (float): fraction of campaign duration automatically chosen reference must span.
+			min_reference_samples (int): samples automatically chosen reference must have.
+			threshold (float): CUSUM statistic (in noise sigmas) above which level changes.
+			min_segment (int): the smallest number of reference samples between change points.
+		"""
+		self.key_heads = [head for head in key_heads if head in table]
+		self.window = window
+		self.__table = table
+		self.seconds = parse_time_column(table.columns['Time'])
+		self.group, first_indices = group_table(table, self.key_heads)
+		self.__keys = [table.row(i) for i in first_indices]
+		groups = len(first_indices)
+		valid = ~np.isnan(self.seconds)
+		self.__speeds = {speed: np.asarray(table.columns[head], dtype=np.float64) for speed, head in DRIFT_SPEEDS.items()}
+
+		if references:
+			self.reference = np.zeros(groups, dtype=bool)
+			for reference in references:
+				selected = table.mask(**reference)
+				self.reference[np.unique(self.group[selected])] = True
+		else:
+			counts = np.bincount(self.group[valid], minlength=groups)
+			first = np.full(groups, np.inf)
+			last = np.full(groups, -np.inf)
+			np.minimum.at(first, self.group[valid], self.seconds[valid])
+			np.maximum.at(last, self.group[valid], self.seconds[valid])
+			duration = np.nanmax(self.seconds) - np.nanmin(self.seconds) if valid.any() else 0.0
+			self.reference = (counts >= min_reference_samples) & (last - first >= min_reference_span * duration) & (duration > 0)
+
+		in_reference = self.reference[self.group] & valid
+		reference_rows = np.flatnonzero(in_reference)
+		self.__reference_rows = reference_rows[np.argsort(self.seconds[reference_rows], kind='stable')]
+		self.__relative = {}
+		self.levels = {}
+		self.change_points = {}
+		for speed, values in self.__speeds.items():
+			self.__relative[speed] = self.__relative_to_median(values, reference_rows)
+			self.levels[speed], self.change_points[speed] = self.__segment_levels(speed, threshold, min_segment)
+
+	def __relative_to_median(self, values, rows):
+		"""Returns values of rows (in order of rows sorted by time) divided by median of their configuration"""
+		relative = np.full(len(values), np.nan)
+		if len(rows):
+			_, group = np.unique(self.group[rows], return_inverse=True)
+			median = grouped_percentile(values[rows], group.ravel(), group.max() + 1, 50)
+			relative[rows] = values[rows] / median[group.ravel()]
+		return relative[self.__reference_rows]
+
+	def __segment_levels(self, speed, threshold, min_segment):
+		"""Returns (relative level of every row, list of change points) of speed"""
+		relative = self.__relative[speed]
+		levels = np.ones(len(self.seconds))
+		if not len(relative):
+			return levels, []
+		points = change_points(relative, threshold, min_segment)
+		bounds = [0] + points + [len(relative)]
+		segment_levels = np.array([np.mean(relative[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])])
+		times = self.seconds[self.__reference_rows]
+		# Row belongs to segment of the last reference sample measured before it (or the first segment)
+		boundary_times = times[points]
+		valid = ~np.isnan(self.seconds)
+		levels[valid] = segment_levels[np.searchsorted(boundary_times, self.seconds[valid], side='right')]
+		changes = [{
+			'Time': str(np.datetime64(int(times[point]), 's')).replace('T', ' '),
+			'Level before': segment_levels[i],
+			'Level after': segment_levels[i + 1]
+		} for i, point in enumerate(points)]
+		return levels, changes
+
+	def reference_configurations(self):
+		"""Returns list of dicts with key columns of reference configurations"""
+		return [dict((head, self.__keys[i][head]) for head in self.key_heads) for i in np.flatnonzero(self.reference)]
+
+	def rolling_list_of_dicts(self):
+		"""Returns rolling mean of throughput of every sample of reference configurations, in order of time"""
+		rows = self.__reference_rows
+		group = self.group[rows]
+		columns = {}
+		for speed, values in self.__speeds.items():
+			columns[speed] = values[rows] / 1000000
+			columns['Rolling ' + speed] = rolling_mean(self.seconds[rows], values[rows], group, self.window) / 1000000
+			columns['Relative ' + speed] = self.__relative[speed]
+			columns['Level ' + speed] = self.levels[speed][rows]
+		list_of_dicts = []
+		for i, row in enumerate(rows.tolist()):
+			row_dict = dict((head, self.__table.value(head, row)) for head in ['Time'] + self.key_heads)
+			row_dict.update((head, column[i].item()) for head, column in columns.items())
+			list_of_dicts.append(row_dict)
+		return list_of_dicts
+
+	def corrected_list_of_dicts(self):
+		"""Returns list of dicts with raw and drift-corrected mean speeds [MB/s] of every configuration"""
+		groups = len(self.__keys)
+		counts = np.bincount(self.group, minlength=groups)
+		means = {}
+		for speed, values in self.__speeds.items():
+			means[speed] = np.bincount(self.group, weights=values, minlength=groups) / counts / 1000000
+			means[speed + ' corrected'] = np.bincount(self.group, weights=values / self.levels[speed],
+													  minlength=groups) / counts / 1000000
+		means['Average'] = (means['SpeedPC'] + means['SpeedFPGA']) / 2
+		means['Average corrected'] = (means['SpeedPC corrected'] + means['SpeedFPGA corrected']) / 2
+		with np.errstate(divide='ignore', invalid='ignore'):
+			means['Correction [%]'] = 100 * (means['Average corrected'] / means['Average'] - 1)
+		list_of_dicts = []
+		for i in range(groups):
+			row_dict = dict((head, self.__keys[i][head]) for head in self.key_heads)
+			row_dict.update((head, column[i].item()) for head, column in means.items())
+			list_of_dicts.append(row_dict)
+		return list_of_dicts
+
+	def print_summary(self):
+		valid = ~np.isnan(self.seconds)
+		if not valid.any():
+			print("No valid Time values, drift cannot be analysed")
+			return
+		hours = (np.nanmax(self.seconds) - np.nanmin(self.seconds)) / 3600
+		print("{} rows over {:.1f} h, {} of {} configurations used as reference ({} samples)".format(
+			len(self.seconds), hours, int(np.count_nonzero(self.reference)), len(self.reference), len(self.__reference_rows)))
+		if not len(self.__reference_rows):
+			print("No configuration is repeated over the campaign, set reference configurations to follow drift")
+			return
+		for speed, changes in self.change_points.items():
+			print("{}: {} change points{}".format(speed, len(changes), ':' if changes else ''))
+			for change in changes:
+				print("\t{}: level {:.4f} -> {:.4f} ({:+.2f}%)".format(change['Time'], change['Level before'], change['Level after'],
+																  100 * (change['Level after'] / change['Level before'] - 1)))
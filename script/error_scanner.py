@@ -0,0 +1,231 @@
+from cfg import *
+import time
+
+import numpy as np
+
+from aggregation import robust_z_scores
+from results_table import iter_csv_columns
+
+
+"""Columns that identify configuration; statistical iterations of configuration form one group"""
+SCAN_KEY_HEADS = ['Mode', 'Direction', 'FifoMemoryType', 'FifoDepth', 'PatternSize', 'BlockSize', 'DataPattern']
+
+"""Key columns read as integers, the same ones as in parsed results table"""
+SCAN_INT_KEY_HEADS = [head for head in SCAN_KEY_HEADS if head in INT_VALUES]
+
+"""Numerical columns checked by scanner"""
+SCAN_INT_HEADS = ['Iterations', 'Errors']
+SCAN_FLOAT_HEADS = ['CountsInFPGA', 'FPGA time(total) [us]', 'FPGA time(per iteration) [us]', 'PC time(total) [us]',
+					'PC time(per iteration) [us]', 'SpeedPC [B/s]', 'SpeedFPGA [B/s]']
+
+"""Anomalies reported by scanner"""
+ANOMALIES = {
+	'speed_disagreement': 'SpeedPC and SpeedFPGA disagree (PC faster than FPGA or FPGA more than {max_speed_ratio:g} times faster)',
+	'fpga_time': 'FPGA times inconsistent with CountsInFPGA / {fifo_clock:g} MHz',
+	'pc_time': 'PC time per iteration inconsistent with total PC time',
+	'speed_time': 'speeds inconsistent with pattern size and times per iteration',
+	'invalid_speed': 'speeds that are not positive numbers',
+	'throughput_outlier': 'throughput outliers within statistical group (robust z-score > {outlier_threshold:g})'
+}
+
+
+class ErrorScanner(object):
+	"""Single pass, streaming scanner of transfer errors and anomalies in raw result csv files.
+
+	Files are read block by block, so memory use does not depend on their
+	size. Errors are summed per configuration. Consistency of speeds and
+	times is checked row by row; samples of every configuration are kept only
+	until all its statistical iterations arrive, then throughput outliers are
+	looked for within the group.
+
+	Attributes:
+		stat_iterations (int): how many statistical iterations form complete group.
+		max_speed_ratio (float): SpeedFPGA / SpeedPC above which speeds disagree.
+		speed_tolerance (float): relative excess of SpeedPC over SpeedFPGA that is still accepted.
+		time_tolerance (float): relative tolerance of consistency checks (values are saved with 6 digits).
+		outlier_threshold (float): robust z-score above which throughput is an outlier.
+		fifo_clock (float): clock of FIFO counter in MHz.
+		rows (int): number of scanned rows.
+		malformed_rows (int): number of rows with wrong number of fields or repeated header line.
+		anomalies (dict): anomaly name mapped to number of flagged rows.
+	"""
+	def __init__(self, stat_iterations, max_speed_ratio=SCAN_MAX_SPEED_RATIO, speed_tolerance=SCAN_SPEED_TOLERANCE,
+				 time_tolerance=SCAN_TIME_TOLERANCE, outlier_threshold=SCAN_OUTLIER_THRESHOLD, fifo_clock=FIFO_CLOCK, examples=5):
+		"""Args:
+			stat_iterations (int): how many statistical iterations form complete group.
+			max_speed_ratio (float): SpeedFPGA / SpeedPC above which speeds disagree.
+			speed_tolerance (float): relative excess of SpeedPC over SpeedFPGA that is still accepted.
+			time_tolerance (float): relative tolerance of consistency checks.
+			outlier_threshold (float): robust z-score above which throughput is an outlier.
+			fifo_clock (float): clock of FIFO counter in MHz.
+			examples (int): how many flagged rows of every kind are kept to be shown in summary.
+		"""
+		self.stat_iterations = stat_iterations
+		self.max_speed_ratio = max_speed_ratio
+		self.speed_tolerance = speed_tolerance
+		self.time_tolerance = time_tolerance
+		self.outlier_threshold = outlier_threshold
+		self.fifo_clock = fifo_clock
+		self.examples = examples
+		self.rows = 0
+		self.malformed_rows = 0
+		self.files = 0
+		self.seconds = 0.0
+		self.anomalies = {name: 0 for name in ANOMALIES}
+		self.__examples = {name: [] for name in list(ANOMALIES) + ['errors']}
+		self.__key_codes = {head: {} for head in SCAN_KEY_HEADS}
+		self.__configurations = {}
+		self.__config_rows = np.zeros(0, dtype=np.int64)
+		self.__config_error_rows = np.zeros(0, dtype=np.int64)
+		self.__config_errors = np.zeros(0, dtype=np.int64)
+		self.__pending = []
+		self.__file_names = []
+
+	def scan_csv(self, csv_file, delimiter=';'):
+		"""Scan one results file; files of one campaign can be scanned one after another"""
+		start = time.perf_counter()
+		self.__file_names.append(csv_file)
+		for line_numbers, columns, malformed_rows in iter_csv_columns(csv_file, delimiter, SCAN_KEY_HEADS + SCAN_INT_HEADS + SCAN_FLOAT_HEADS,
+																	  SCAN_INT_HEADS + SCAN_INT_KEY_HEADS, SCAN_FLOAT_HEADS):
+			self.malformed_rows += malformed_rows
+			self.__scan_block(len(self.__file_names) - 1, line_numbers, columns)
+		self.files += 1
+		self.seconds += time.perf_counter() - start
+
+	def __config_ids(self, columns):
+		"""Returns global configuration id of every row; ids are stable between blocks and files"""
+		codes = []
+		for head in SCAN_KEY_HEADS:
+			mapping = self.__key_codes[head]
+			values = columns[head].tolist() if isinstance(columns[head], np.ndarray) else columns[head]
+			codes.append(np.array([mapping.setdefault(value, len(mapping)) for value in values], dtype=np.int64))
+		unique_codes, inverse = np.unique(np.stack(codes, axis=1), axis=0, return_inverse=True)
+		ids = np.array([self.__configurations.setdefault(tuple(key), len(self.__configurations))
+						for key in unique_codes.tolist()], dtype=np.int64)
+		missing = len(self.__configurations) - len(self.__config_rows)
+		if missing > 0:
+			self.__config_rows = np.concatenate((self.__config_rows, np.zeros(missing, dtype=np.int64)))
+			self.__config_error_rows = np.concatenate((self.__config_error_rows, np.zeros(missing, dtype=np.int64)))
+			self.__config_errors = np.concatenate((self.__config_errors, np.zeros(missing, dtype=np.int64)))
+		return ids[inverse.ravel()]
+
+	def __flag(self, name, mask, file_index, line_numbers):
+		self.anomalies[name] += int(np.count_nonzero(mask))
+		self.__flag_examples(name, mask, file_index, line_numbers)
+
+	def __flag_examples(self, name, mask, file_index, line_numbers):
+		"""Keep (file, line) of the first flagged rows to be shown in summary"""
+		room = self.examples - len(self.__examples[name])
+		if room <= 0:
+			return
+		flagged = np.flatnonzero(mask)
+		file_index = np.broadcast_to(file_index, line_numbers.shape)
+		self.__examples[name].extend((self.__file_names[index], line_number) for index, line_number in
+									 zip(file_index[flagged[:room]].tolist(), line_numbers[flagged[:room]].tolist()))
+
+	def __inconsistent(self, value, expected):
+		with np.errstate(divide='ignore', invalid='ignore'):
+			return ~(np.abs(value - expected) <= self.time_tolerance * np.abs(expected))
+
+	def __scan_block(self, file_index, line_numbers, columns):
+		if not len(line_numbers):
+			return
+		self.rows += len(line_numbers)
+		config = self.__config_ids(columns)
+		errors = columns['Errors']
+		np.add.at(self.__config_rows, config, 1)
+		np.add.at(self.__config_error_rows, config, errors != 0)
+		np.add.at(self.__config_errors, config, errors)
+		self.__flag_examples('errors', errors != 0, file_index, line_numbers)
+
+		speed_pc = columns['SpeedPC [B/s]']
+		speed_fpga = columns['SpeedFPGA [B/s]']
+		iterations = columns['Iterations']
+		fpga_time = columns['FPGA time(total) [us]']
+		fpga_time_per_iteration = columns['FPGA time(per iteration) [us]']
+		pc_time = columns['PC time(total) [us]']
+		pc_time_per_iteration = columns['PC time(per iteration) [us]']
+		pattern_size = columns['PatternSize']
+		valid_speed = (speed_pc > 0) & (speed_fpga > 0) & np.isfinite(speed_pc) & np.isfinite(speed_fpga)
+		self.__flag('invalid_speed', ~valid_speed, file_index, line_numbers)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			disagreement = (speed_pc > speed_fpga * (1 + self.speed_tolerance)) | (speed_fpga > speed_pc * self.max_speed_ratio)
+		self.__flag('speed_disagreement', valid_speed & disagreement, file_index, line_numbers)
+		expected_fpga_time = columns['CountsInFPGA'] / self.fifo_clock
+		self.__flag('fpga_time', self.__inconsistent(fpga_time, expected_fpga_time) |
+				   self.__inconsistent(fpga_time_per_iteration, expected_fpga_time / iterations), file_index, line_numbers)
+		self.__flag('pc_time', self.__inconsistent(pc_time_per_iteration, pc_time / iterations), file_index, line_numbers)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			speed_time = (self.__inconsistent(speed_pc, pattern_size * 1e6 / pc_time_per_iteration) |
+						  self.__inconsistent(speed_fpga, pattern_size * 1e6 / fpga_time_per_iteration))
+		self.__flag('speed_time', valid_speed & speed_time, file_index, line_numbers)
+
+		self.__pending.append((config, speed_pc, speed_fpga, np.full(len(config), file_index), line_numbers))
+		self.__check_complete_groups()
+
+	def __check_complete_groups(self, finish=False):
+		"""Look for throughput outliers in groups that got all statistical iterations (or in all groups at finish)"""
+		if not self.__pending:
+			return
+		config, speed_pc, speed_fpga, file_index, line_numbers = (np.concatenate(arrays) for arrays in zip(*self.__pending))
+		complete = np.ones(len(config), dtype=bool) if finish else self.__config_rows[config] >= self.stat_iterations
+		self.__pending = [tuple(array[~complete] for array in (config, speed_pc, speed_fpga, file_index, line_numbers))]
+		if not np.any(complete):
+			return
+		groups, group = np.unique(config[complete], return_inverse=True)
+		group = group.ravel()
+		sizes = np.bincount(group, minlength=len(groups))
+		enough = sizes[group] >= 3
+		outliers = np.zeros(len(group), dtype=bool)
+		for speed in (speed_pc[complete], speed_fpga[complete]):
+			outliers |= robust_z_scores(speed, group, len(groups)) > self.outlier_threshold
+		self.__flag('throughput_outlier', enough & outliers, file_index[complete], line_numbers[complete])
+
+	def finish(self):
+		"""Check groups that never got all statistical iterations; call after the last file"""
+		self.__check_complete_groups(finish=True)
+
+	def __decoded_keys(self):
+		categories = {head: list(mapping) for head, mapping in self.__key_codes.items()}
+		keys = [None] * len(self.__configurations)
+		for key, config in self.__configurations.items():
+			keys[config] = dict((head, categories[head][code]) for head, code in zip(SCAN_KEY_HEADS, key))
+		return keys
+
+	def exit_status(self):
+		"""0: no problems, 1: transfer errors, 2: anomalies or malformed rows only"""
+		if np.any(self.__config_errors):
+			return 1
+		if self.malformed_rows or any(self.anomalies.values()):
+			return 2
+		return 0
+
+	@staticmethod
+	def __format_examples(examples):
+		return ', '.join('{}:{}'.format(csv_file, line_number) for csv_file, line_number in examples)
+
+	def print_summary(self, top_configurations=10):
+		print("Scanned {} rows of {} configurations in {} file(s) in {:.2f} s".format(
+			self.rows, len(self.__configurations), self.files, self.seconds))
+		if self.malformed_rows:
+			print("Malformed rows (wrong number of fields or repeated header line): {}".format(self.malformed_rows))
+		error_configurations = np.flatnonzero(self.__config_errors)
+		if len(error_configurations):
+			print("Transfer errors: {} errors in {} rows of {} configurations (e.g. {})".format(
+				int(self.__config_errors.sum()), int(self.__config_error_rows.sum()), len(error_configurations),
+				self.__format_examples(self.__examples['errors'])))
+			keys = self.__decoded_keys()
+			worst = error_configurations[np.argsort(-self.__config_errors[error_configurations], kind='stable')]
+			for config in worst[:top_configurations].tolist():
+				print("\t{} errors in {} of {} rows: {}".format(self.__config_errors[config], self.__config_error_rows[config],
+																self.__config_rows[config], keys[config]))
+		else:
+			print("No errors detected")
+		settings = {'max_speed_ratio': self.max_speed_ratio, 'fifo_clock': self.fifo_clock,
+					'outlier_threshold': self.outlier_threshold}
+		for name, description in ANOMALIES.items():
+			if self.anomalies[name]:
+				print("{} rows with {} (e.g. {})".format(self.anomalies[name], description.format(**settings),
+														 self.__format_examples(self.__examples[name])))
+		if not any(self.anomalies.values()):
+			print("No anomalies detected")
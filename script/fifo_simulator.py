@@ -0,0 +1,399 @@
+from cfg import *
+import os
+import re
+import sys
+
+import numpy as np
+
+from datagen import PATTERNS, DataGenerator
+from sweep_planner import enumerate_bitfiles, enumerate_runs, read_performance_cfg
+from synthetic_results import RESULT_HEADERS, format_result_rows, time_strings
+
+
+"""Endpoints and trigger bits of bitfiles (performance.h)"""
+NUMBER_OF_COUNTS_A = 0x20
+NUMBER_OF_COUNTS_B = 0x21
+ERROR_COUNT = 0x22
+PATTERN_TO_GENERATE = 0x00
+PIPE_IN = 0x80
+PIPE_OUT = 0xa0
+TRIGGER = 0x40
+RESET, START_TIMER, STOP_TIMER, RESET_PATTERN = range(4)
+MEGA = 1000000
+
+"""Host side of FrontPanel USB 3.0 pipes: asymptotic bandwidth [MB/s], setup time of pipe call [us],"""
+"""size of USB transaction [B] and gap between transactions [us]"""
+PIPE_MODELS = {
+	'read': (340.0, 40.0, 16384, 1.0),
+	'write': (320.0, 35.0, 16384, 1.0)
+}
+
+"""Time of ActivateTriggerIn call [us]; trigger takes effect in FPGA when call returns"""
+TRIGGER_US = 50.0
+
+"""Bytes moved by pipe interface per okClk cycle (32-bit okPipeIn / okPipeOut)"""
+PIPE_WORD_BYTES = 4
+
+"""Read latency of FIFO memory types [okClk cycles], paid at start of every USB transaction burst"""
+MEMORY_LATENCIES = {
+	'blockram': 2,
+	'distributedram': 1,
+	'shiftregister': 1
+}
+
+
+def pipe_us(size, direction, memory):
+	"""Duration of ReadFromPipeOut / WriteToPipeIn of size bytes (vectorized over size, direction and memory).
+
+	Transfer is split into USB transactions; every transaction costs a gap and
+	first-word latency of FIFO, data flow at USB bandwidth but never faster
+	than pipe interface (PIPE_WORD_BYTES per FIFO_CLOCK cycle).
+	"""
+	size = np.asarray(size, dtype=np.float64)
+	direction = np.broadcast_to(direction, size.shape)
+	memory = np.broadcast_to(memory, size.shape)
+	bandwidth, setup, transaction, gap = (np.array([PIPE_MODELS[d][i] for d in direction.ravel()]).reshape(size.shape)
+										  for i in range(4))
+	latency = np.array([MEMORY_LATENCIES[m] for m in memory.ravel()]).reshape(size.shape) / FIFO_CLOCK
+	transactions = np.ceil(size / transaction)
+	return setup + transactions * (gap + latency) + size / np.minimum(bandwidth, PIPE_WORD_BYTES * FIFO_CLOCK)
+
+
+def duplex_overflow(block_size, depth):
+	"""Does block written to duplex FIFO before being read back exceed its capacity (data is lost)?"""
+	return np.asarray(block_size) > np.asarray(depth) * PIPE_WORD_BYTES
+
+
+def _bitfile_configuration(bitfile):
+	"""Returns (mode, direction, memory, depth) of bitfile named as in TransferController::setupFPGA"""
+	match = re.search(r'(\w+?)_(32bit|nonsym|duplex)_fifo_(\w+)_(\d+)\.bit$', os.path.basename(bitfile))
+	if not match:
+		raise ValueError('Unknown bitfile {}'.format(bitfile))
+	direction, mode, memory, depth = match.groups()
+	return mode, direction, memory, int(depth)
+
+
+class SimulatedFrontPanel(object):
+	"""Stand-in of okCFrontPanel with FIFO benchmark bitfile, driven by simulated time.
+
+	Methods used by the transfer program are provided with the same names.
+	Pipes return and check real patterns (DataGenerator), the timer counts
+	FIFO_CLOCK cycles from START_TIMER to STOP_TIMER as the HDL does, and
+	every call advances simulated time according to the transfer model, so
+	timings read with now_us() are what the PC would measure.
+
+	Attributes:
+		jitter (float): sigma of log-normal noise of every host call duration (0: deterministic).
+		word_error_rate (float): probability that 32-bit word is corrupted in transfer.
+		configuration (tuple): (mode, direction, memory, depth) of loaded bitfile.
+	"""
+	def __init__(self, seed=0, jitter=0.0, word_error_rate=0.0):
+		self.jitter = jitter
+		self.word_error_rate = word_error_rate
+		self.configuration = None
+		self.__random = np.random.default_rng(seed)
+		self.__now_us = 0.0
+		self.__wire_ins = {}
+		self.__pattern = 0
+		self.__clk_counts = 0
+		self.__timer_started_us = None
+		self.__error_count = 0
+		self.__fifo = b''
+
+	def now_us(self):
+		return self.__now_us
+
+	def __spend(self, duration_us):
+		if self.jitter:
+			duration_us *= self.__random.lognormal(0, self.jitter)
+		self.__now_us += duration_us
+
+	def IsOpen(self):
+		return True
+
+	def ConfigureFPGA(self, bitfile):
+		self.configuration = _bitfile_configuration(bitfile)
+		self.__clk_counts = 0
+		self.__timer_started_us = None
+		self.__error_count = 0
+		return 0
+
+	def SetWireInValue(self, endpoint, value):
+		self.__wire_ins[endpoint] = value
+
+	def UpdateWireIns(self):
+		self.__pattern = self.__wire_ins.get(PATTERN_TO_GENERATE, 0)
+
+	def UpdateWireOuts(self):
+		pass
+
+	def GetWireOutValue(self, endpoint):
+		if endpoint == NUMBER_OF_COUNTS_A:
+			return self.__clk_counts & 0xFFFFFFFF
+		if endpoint == NUMBER_OF_COUNTS_B:
+			return self.__clk_counts >> 32
+		if endpoint == ERROR_COUNT:
+			return self.__error_count
+		return 0
+
+	def ActivateTriggerIn(self, endpoint, bit):
+		self.__spend(TRIGGER_US)
+		if bit == RESET:
+			self.__clk_counts = 0
+			self.__timer_started_us = None
+			self.__error_count = 0
+			self.__fifo = b''
+		elif bit == START_TIMER:
+			self.__timer_started_us = self.__now_us
+		elif bit == STOP_TIMER and self.__timer_started_us is not None:
+			self.__clk_counts += int(np.rint((self.__now_us - self.__timer_started_us) * FIFO_CLOCK)) + 1
+			self.__timer_started_us = None
+
+	def __corrupted_words(self, length):
+		"""Returns offsets of words corrupted in transfer of length bytes"""
+		words = length // PIPE_WORD_BYTES
+		count = self.__random.poisson(words * self.word_error_rate) if self.word_error_rate else 0
+		return np.sort(self.__random.choice(words, size=min(count, words), replace=False)) * PIPE_WORD_BYTES
+
+	def __transfer(self, length, direction):
+		self.__spend(pipe_us(length, direction, self.configuration[2]).item())
+
+	def ReadFromPipeOut(self, endpoint, length, data):
+		mode, direction, memory, depth = self.configuration
+		self.__transfer(length, 'read')
+		if mode == 'duplex':
+			received = np.frombuffer(self.__fifo.ljust(length, b'\0')[:length], dtype=np.uint8).copy()
+			self.__fifo = b''
+		else:
+			received = DataGenerator(mode, PATTERNS[self.__pattern], length).generate().copy()
+		received[self.__corrupted_words(length)] ^= 0xFF
+		data[:length] = received
+		return length
+
+	def WriteToPipeIn(self, endpoint, length, data):
+		mode, direction, memory, depth = self.configuration
+		self.__transfer(length, 'write')
+		written = np.array(data[:length], dtype=np.uint8)
+		corrupted = self.__corrupted_words(length)
+		written[corrupted] ^= 0xFF
+		if mode == 'duplex':
+			self.__fifo = written[:depth * PIPE_WORD_BYTES].tobytes()
+		else:
+			self.__error_count += len(corrupted)
+		return length
+
+
+def _prepare_for_transfer(device, pattern):
+	"""ITimer::prepareForTransfer"""
+	device.SetWireInValue(PATTERN_TO_GENERATE, PATTERNS.index(pattern))
+	device.UpdateWireIns()
+	device.ActivateTriggerIn(TRIGGER, RESET)
+
+
+def perform_read_timer(device, mode, pattern, pattern_size, iterations):
+	"""Read::performTimer. Returns (PC time total [us], errors found in received data)"""
+	_prepare_for_transfer(device, pattern)
+	generator = DataGenerator(mode, pattern, pattern_size)
+	data = np.empty(pattern_size, dtype=np.uint8)
+	pc_duration_total = 0.0
+	errors = 0
+	for _ in range(iterations):
+		device.ActivateTriggerIn(TRIGGER, RESET_PATTERN)
+		timer_start = device.now_us()
+		device.ActivateTriggerIn(TRIGGER, START_TIMER)
+		device.ReadFromPipeOut(PIPE_OUT, pattern_size, data)
+		device.ActivateTriggerIn(TRIGGER, STOP_TIMER)
+		pc_duration_total += device.now_us() - timer_start
+		errors += generator.check_array_for_errors(data)[0]
+	return pc_duration_total, errors
+
+
+def perform_write_timer(device, mode, pattern, pattern_size, iterations):
+	"""Write::performTimer. Returns (PC time total [us], 0; errors are counted by FPGA)"""
+	_prepare_for_transfer(device, pattern)
+	data = DataGenerator(mode, pattern, pattern_size).fill_array_with_data()
+	timer_start = device.now_us()
+	device.ActivateTriggerIn(TRIGGER, START_TIMER)
+	for _ in range(iterations):
+		device.ActivateTriggerIn(TRIGGER, RESET_PATTERN)
+		device.WriteToPipeIn(PIPE_IN, pattern_size, data)
+	device.ActivateTriggerIn(TRIGGER, STOP_TIMER)
+	return device.now_us() - timer_start, 0
+
+
+def perform_duplex_timer(device, mode, pattern, pattern_size, block_size, iterations):
+	"""Duplex::performTimer. Returns (PC time total [us], number of blocks received different than sent)"""
+	_prepare_for_transfer(device, pattern)
+	data = DataGenerator(mode, pattern, pattern_size).fill_array_with_data()
+	data = np.pad(data, (0, block_size)) # the last block may reach past the pattern
+	received_data = np.empty(block_size, dtype=np.uint8)
+	pc_duration_total = 0.0
+	errors = 0
+	for _ in range(iterations):
+		for j in range(0, pattern_size, block_size):
+			send_data = data[j:j + block_size]
+			timer_start = device.now_us()
+			device.ActivateTriggerIn(TRIGGER, START_TIMER)
+			device.WriteToPipeIn(PIPE_IN, block_size, send_data)
+			device.ReadFromPipeOut(PIPE_OUT, block_size, received_data)
+			device.ActivateTriggerIn(TRIGGER, STOP_TIMER)
+			pc_duration_total += device.now_us() - timer_start
+			errors += int(not np.array_equal(send_data, received_data))
+	return pc_duration_total, errors
+
+
+def run_on_device(device, params, run):
+	"""Performs single run (tuple of RUN_HEADS values) like TransferController and Results. Returns dict of result columns"""
+	mode, direction, memory, depth, pattern_size, block_size, pattern, stat_iteration = run
+	iterations = params['iterations']
+	if mode == 'duplex':
+		pc_time_total, errors = perform_duplex_timer(device, mode, pattern, pattern_size, block_size, iterations)
+	elif direction == 'read':
+		pc_time_total, errors = perform_read_timer(device, mode, pattern, pattern_size, iterations)
+	else:
+		pc_time_total, errors = perform_write_timer(device, mode, pattern, pattern_size, iterations)
+	device.UpdateWireOuts()
+	fpga_counts = device.GetWireOutValue(NUMBER_OF_COUNTS_A) + (device.GetWireOutValue(NUMBER_OF_COUNTS_B) << 32)
+	if direction == 'write':
+		errors = device.GetWireOutValue(ERROR_COUNT)
+	return _result_columns(run, iterations, np.array([fpga_counts]), np.array([pc_time_total]), np.array([errors]))
+
+
+def _result_columns(runs, iterations, fpga_counts, pc_time_total, errors):
+	"""Returns dict of columns of result rows computed as in Results::countPCTime and Results::countFPGATime"""
+	runs = [runs] if isinstance(runs[0], str) else runs
+	mode, direction, memory, depth, pattern_size, block_size, pattern, stat_iteration = (np.array(column) for column in zip(*runs))
+	pattern_size = pattern_size.astype(np.int64)
+	fpga_time_total = fpga_counts / FIFO_CLOCK
+	fpga_time_periteravg = fpga_time_total / iterations
+	pc_time_periteravg = pc_time_total / iterations
+	return {
+		'Mode': mode,
+		'Direction': direction,
+		'FifoMemoryType': memory,
+		'FifoDepth': depth,
+		'PatternSize': pattern_size,
+		'BlockSize': block_size,
+		'DataPattern': pattern,
+		'Iterations': np.full(len(runs), iterations),
+		'StatisticalIter': stat_iteration,
+		'CountsInFPGA': fpga_counts.astype(np.int64),
+		'FPGA time(total) [us]': fpga_time_total,
+		'FPGA time(per iteration) [us]': fpga_time_periteravg,
+		'PC time(total) [us]': pc_time_total.astype(np.float64),
+		'PC time(per iteration) [us]': pc_time_periteravg,
+		'SpeedPC [B/s]': pattern_size * MEGA / pc_time_periteravg,
+		'SpeedFPGA [B/s]': pattern_size * MEGA / fpga_time_periteravg,
+		'Errors': errors.astype(np.int64)
+	}
+
+
+class FifoTransferSimulator(object):
+	"""Vectorized simulation of whole performance.cfg sweep, written as results csv file.
+
+	Uses the same transfer model and protocol as SimulatedFrontPanel
+	(Read / Write / Duplex::performTimer), but computes all runs at once:
+	every run consists of a few kinds of identical calls, so its PC time is
+	a sum of call durations and FPGA counts are per-window cycles times
+	number of START-STOP windows. Duplex blocks larger than the FIFO lose
+	data. With jitter and word_error_rate set to 0 rows are identical to
+	those of SimulatedFrontPanel.
+
+	Attributes:
+		params (dict): sweep settings (see sweep_planner.read_performance_cfg).
+		runs (list): runs (tuples of RUN_HEADS values) in order of TransferController.
+		jitter (float): sigma of log-normal noise of every host call duration.
+		word_error_rate (float): probability that 32-bit word is corrupted in transfer.
+	"""
+	def __init__(self, params, seed=0, jitter=0.02, word_error_rate=1e-12):
+		"""Args:
+			params (dict): sweep settings (see sweep_planner.read_performance_cfg).
+			seed (int): seed of random generator, the same seed gives the same results.
+			jitter (float): sigma of log-normal noise of every host call duration (0: deterministic).
+			word_error_rate (float): probability that 32-bit word is corrupted in transfer.
+		"""
+		self.params = params
+		self.jitter = jitter
+		self.word_error_rate = word_error_rate
+		self.__seed = seed
+		self.__bitfile_starts = []
+		self.runs = []
+		for bitfile in enumerate_bitfiles(params):
+			self.__bitfile_starts.append(len(self.runs))
+			self.runs.extend(enumerate_runs(params, *bitfile))
+
+	def __calls_us(self, random, mean_us, calls):
+		"""Total duration of calls with mean duration each; sum of log-normal noise approximated by normal distribution"""
+		if not self.jitter:
+			return mean_us * calls
+		variance = np.expm1(self.jitter ** 2) * np.exp(self.jitter ** 2)
+		mean = np.exp(self.jitter ** 2 / 2)
+		total = random.normal(mean * calls, np.sqrt(variance * calls))
+		return mean_us * np.maximum(total, 0)
+
+	def __errors(self, random, words):
+		if not self.word_error_rate:
+			return np.zeros(len(words), dtype=np.int64)
+		return random.poisson(words * self.word_error_rate)
+
+	def columns(self):
+		"""Returns dict of result columns (numpy arrays) of all runs"""
+		random = np.random.default_rng(self.__seed)
+		iterations = self.params['iterations']
+		mode, direction, memory, depth, pattern_size, block_size, pattern, _ = (np.array(column) for column in zip(*self.runs))
+		pattern_size = pattern_size.astype(np.int64)
+		block_size = block_size.astype(np.int64)
+		duplex = mode == 'duplex'
+		read = ~duplex & (direction == 'read')
+		write = ~duplex & (direction == 'write')
+
+		read_pipe = pipe_us(np.where(duplex, block_size, pattern_size), 'read', memory)
+		write_pipe = pipe_us(np.where(duplex, block_size, pattern_size), 'write', memory)
+		blocks = -(-pattern_size // block_size)
+		# Time of one START-STOP window seen by FPGA and number of windows and calls of each kind in the run
+		window_us = np.select([read, write], [read_pipe + TRIGGER_US, iterations * (TRIGGER_US + write_pipe) + TRIGGER_US],
+							  TRIGGER_US + write_pipe + read_pipe)
+		windows = np.select([read, write], [iterations, 1], iterations * blocks)
+		triggers = np.select([read, write], [2 * iterations, iterations + 2], 2 * iterations * blocks)
+		read_calls = np.select([read, write], [iterations, 0], iterations * blocks)
+		write_calls = np.select([read, write], [0, iterations], iterations * blocks)
+
+		pc_time_total = (self.__calls_us(random, TRIGGER_US, triggers) + self.__calls_us(random, read_pipe, read_calls) +
+						 self.__calls_us(random, write_pipe, write_calls))
+		jitter_us = pc_time_total - (TRIGGER_US * triggers + read_pipe * read_calls + write_pipe * write_calls)
+		window_jitter_us = jitter_us * (windows * window_us) / (pc_time_total - jitter_us)
+		fpga_counts = windows * (np.rint(window_us * FIFO_CLOCK) + 1) + np.rint(window_jitter_us * FIFO_CLOCK)
+
+		words = pattern_size // PIPE_WORD_BYTES * iterations
+		errors = self.__errors(random, words)
+		if np.any(read):
+			asic = read & (pattern == 'asic')
+			errors[asic] = random.binomial(errors[asic], 0.5) # only every other word of asic record is checked
+		if np.any(duplex):
+			corrupted_blocks = random.binomial(windows, -np.expm1(-block_size // PIPE_WORD_BYTES * 2 * self.word_error_rate))
+			errors = np.where(duplex, np.where(duplex_overflow(block_size, depth), windows, corrupted_blocks), errors)
+		return _result_columns(self.runs, iterations, fpga_counts, pc_time_total, errors)
+
+	def write(self, file_name, delimiter=';', start_time='2019-05-01T12:00:00', bitfile_load_seconds=BITFILE_LOAD_SECONDS,
+			  run_overhead_seconds=RUN_OVERHEAD_SECONDS, chunk_size=100000):
+		"""Write results to csv file in schema of Results::saveResultsToFile. Returns number of written rows"""
+		columns = self.columns()
+		elapsed_us = columns['PC time(total) [us]'] + run_overhead_seconds * 1e6
+		elapsed_us[self.__bitfile_starts] += bitfile_load_seconds * 1e6
+		time = np.datetime64(start_time, 'us') + np.cumsum(elapsed_us).astype('timedelta64[us]')
+		columns = dict(Time=time_strings(time), **columns)
+		columns = {head: columns[head] for head in RESULT_HEADERS}
+		with open(file_name, mode='w') as results_file:
+			results_file.write(delimiter.join(RESULT_HEADERS) + '\n')
+			for first in range(0, len(self.runs), chunk_size):
+				chunk = {head: column[first:first + chunk_size] for head, column in columns.items()}
+				results_file.write(format_result_rows(chunk, chunk_size, delimiter))
+		return len(self.runs)
+
+
+if __name__ == "__main__":
+	cfg_file = sys.argv[1] if len(sys.argv) > 1 else PERFORMANCE_CFG_FILE
+	simulator = FifoTransferSimulator(read_performance_cfg(cfg_file), SIMULATION_SEED, SIMULATION_JITTER,
+									  SIMULATION_WORD_ERROR_RATE)
+	rows = simulator.write(SIMULATED_RESULTS_FILE_NAME, SEPARATOR)
+	print("Simulated {} runs of {} saved to {}".format(rows, cfg_file, SIMULATED_RESULTS_FILE_NAME))
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+
+
+"""Version of manifest layout, manifest written by another version is ignored (all figures are rendered)"""
+MANIFEST_VERSION = 1
+
+
+def _json_value(value):
+	"""Numpy arrays and scalars are hashed as lists and Python numbers, anything else as its string"""
+	if hasattr(value, 'tolist'):
+		return value.tolist()
+	return str(value)
+
+
+def figure_hash(*parts):
+	"""Returns hex digest of everything figure depends on, e.g. (settings of plotting option, figure job)"""
+	content = json.dumps(parts, sort_keys=True, default=_json_value)
+	return hashlib.sha1(content.encode()).hexdigest()
+
+
+def figure_files(savefig, output_modes, job):
+	"""Returns files of figure job saved per figure: PDF and / or PNG, in order of names returned by Figure.save_fig"""
+	fig_name = savefig.format(*job['name_args'])
+	files = []
+	if 'pdf' in output_modes:
+		files.append(fig_name)
+	if 'png' in output_modes:
+		files.append(os.path.splitext(fig_name)[0] + '.png')
+	return files
+
+
+class FigureManifest(object):
+	"""Hashes of data of saved figures, so figures that did not change are not rendered again.
+
+	Every output file (PDF of figure or multi-page PDF of plotting option) is
+	recorded with hash of its series, symbols, titles, metadata and output
+	settings. Figure is up to date when its hash did not change and all of
+	its files still exist.
+
+	Attributes:
+		file_name (string): JSON file with manifest.
+		entries (dict): output file mapped to hash of figure saved in it.
+	"""
+	def __init__(self, file_name, ignore_existing=False):
+		"""Args:
+			file_name (string): JSON file with manifest (created on first write).
+			ignore_existing (bool): start with empty manifest, so every figure is rendered (and recorded again).
+		"""
+		self.file_name = file_name
+		self.entries = {}
+		if not ignore_existing:
+			self.__read()
+
+	def __read(self):
+		try:
+			with open(self.file_name, mode='r') as manifest_file:
+				manifest = json.load(manifest_file)
+		except (OSError, ValueError):
+			return
+		if manifest.get('version') == MANIFEST_VERSION:
+			self.entries = manifest['entries']
+
+	def is_current(self, name, digest, files):
+		"""Returns True when output name was saved with the same hash and all files of the figure exist"""
+		return self.entries.get(name) == digest and all(os.path.isfile(file_name) for file_name in files)
+
+	def record(self, name, digest):
+		self.entries[name] = digest
+
+	def write(self):
+		with open(self.file_name + '.tmp', mode='w') as manifest_file:
+			json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, manifest_file, indent=1, sort_keys=True)
+		os.replace(self.file_name + '.tmp', self.file_name)
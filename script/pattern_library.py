@@ -0,0 +1,192 @@
+from cfg import *
+import json
+import os
+import sys
+
+import numpy as np
+
+from datagen import ASIC_CHECKED_BYTES, ASIC_RECORD_SIZE, REGISTER_SIZES, DataGenerator
+from sweep_planner import enumerate_bitfiles, enumerate_runs, read_performance_cfg
+
+
+"""Version of library layout, index written by another version is rebuilt"""
+LIBRARY_VERSION = 1
+
+"""Bytes of every 64-bit word compared in verification (asic: only first bytes of every record)"""
+WORD_MASKS = {
+	'asic': np.uint64((1 << 8 * ASIC_CHECKED_BYTES) - 1),
+	None: np.uint64(0xFFFFFFFFFFFFFFFF)
+}
+
+
+def _golden_file_name(mode, pattern):
+	"""Patterns depend only on register size, so modes with the same size (32bit, duplex) share a file"""
+	return '{}_{}bit.bin'.format(pattern, 8 * REGISTER_SIZES[mode])
+
+
+def _entry_key(mode, pattern, pattern_size):
+	return '{}/{}/{}'.format(mode, pattern, pattern_size)
+
+
+def patterns_of_cfg(params):
+	"""Returns sorted list of (mode, pattern, pattern size) transferred in sweep of performance.cfg params"""
+	combinations = set()
+	for bitfile in enumerate_bitfiles(params):
+		for run in enumerate_runs(params, *bitfile):
+			mode, _, _, _, pattern_size, _, pattern, _ = run
+			combinations.add((mode, pattern, pattern_size))
+	return sorted(combinations)
+
+
+class PatternLibrary(object):
+	"""Pregenerated golden patterns on disk for verification of captured transfers.
+
+	Every pattern is a prefix of the same pattern of larger size, so one file
+	per pattern and register size holds the largest needed size and all
+	smaller ones are its prefixes. The index (index.json) maps every
+	(mode, pattern, pattern size) to its file and length. Captures and golden
+	files are both read memory-mapped and compared block by block as 64-bit
+	words, so verification costs only reading of both files; bytes are
+	counted only in words that differ.
+
+	Attributes:
+		folder (string): directory with golden files and index.
+		block_size (int): how many bytes are compared at once.
+		entries (dict): 'mode/pattern/size' mapped to dict with file and size.
+	"""
+	def __init__(self, folder, block_size=64 * 1024 * 1024):
+		"""Args:
+			folder (string): directory with golden files and index (created if needed).
+			block_size (int): how many bytes are compared at once (rounded to whole asic records).
+		"""
+		self.folder = folder
+		self.block_size = max(ASIC_RECORD_SIZE, block_size - block_size % ASIC_RECORD_SIZE)
+		self.entries = {}
+		self.__files = {}
+		self.__read_index()
+
+	def __index_file(self):
+		return os.path.join(self.folder, 'index.json')
+
+	def __read_index(self):
+		try:
+			with open(self.__index_file(), mode='r') as index_file:
+				index = json.load(index_file)
+		except (OSError, ValueError):
+			return
+		if index.get('version') != LIBRARY_VERSION:
+			return
+		# Files that were removed or truncated after indexing are dropped with their entries
+		self.__files = {name: size for name, size in index['files'].items()
+						if os.path.isfile(os.path.join(self.folder, name))
+						and os.path.getsize(os.path.join(self.folder, name)) >= size}
+		self.entries = {key: entry for key, entry in index['entries'].items() if entry['file'] in self.__files}
+
+	def __write_index(self):
+		index_file_name = self.__index_file()
+		with open(index_file_name + '.tmp', mode='w') as index_file:
+			json.dump({'version': LIBRARY_VERSION, 'files': self.__files, 'entries': self.entries}, index_file, indent=1)
+		os.replace(index_file_name + '.tmp', index_file_name)
+
+	def __generate(self, mode, pattern, pattern_size):
+		"""Extends golden file of pattern up to pattern_size bytes (generated part is appended only)"""
+		name = _golden_file_name(mode, pattern)
+		file_name = os.path.join(self.folder, name)
+		generated = self.__files.get(name, 0)
+		if generated >= pattern_size:
+			return name
+		generator = DataGenerator(mode, pattern, pattern_size, self.block_size)
+		with open(file_name, mode='r+b' if generated else 'wb') as golden_file:
+			golden_file.seek(generated)
+			golden_file.truncate()
+			for start in range(generated, pattern_size, self.block_size):
+				golden_file.write(generator.generate(start, start + self.block_size))
+		self.__files[name] = pattern_size
+		return name
+
+	def build(self, combinations):
+		"""Makes sure golden patterns of all (mode, pattern, pattern size) combinations are in library.
+
+		Returns number of bytes generated now.
+		"""
+		os.makedirs(self.folder, exist_ok=True)
+		largest = {}
+		for mode, pattern, pattern_size in combinations:
+			name = _golden_file_name(mode, pattern)
+			largest[name] = max(largest.get(name, (0,)), (pattern_size, mode, pattern))
+		generated_before = sum(self.__files.values())
+		for pattern_size, mode, pattern in largest.values():
+			self.__generate(mode, pattern, pattern_size)
+		for mode, pattern, pattern_size in combinations:
+			self.entries[_entry_key(mode, pattern, pattern_size)] = {'file': _golden_file_name(mode, pattern),
+																	 'size': pattern_size}
+		self.__write_index()
+		return sum(self.__files.values()) - generated_before
+
+	def golden(self, mode, pattern, pattern_size):
+		"""Returns read-only memory-mapped golden pattern (uint8) or raises KeyError if it is not in library.
+
+		Sizes that were not built (e.g. incomplete capture) are served as prefix of larger pattern when there is one.
+		"""
+		key = _entry_key(mode, pattern, pattern_size)
+		entry = self.entries.get(key)
+		if entry is None and self.__files.get(_golden_file_name(mode, pattern), -1) >= pattern_size:
+			entry = {'file': _golden_file_name(mode, pattern), 'size': pattern_size}
+		if entry is None:
+			raise KeyError('Pattern {} is not in library {} (build it first)'.format(key, self.folder))
+		if not entry['size']:
+			return np.empty(0, dtype=np.uint8)
+		return np.memmap(os.path.join(self.folder, entry['file']), dtype=np.uint8, mode='r', shape=(entry['size'],))
+
+	def verify(self, data, mode, pattern, max_offsets=10):
+		"""Compares data with golden pattern of its size.
+
+		Args:
+			data (np.array): captured bytes, e.g. memory-mapped file.
+			mode (string): transfer mode ('32bit', 'nonsym' or 'duplex').
+			pattern (string): name of the pattern.
+			max_offsets (int): how many offsets of wrong bytes are reported.
+		Returns:
+			(number of wrong bytes, list of offsets of the first wrong bytes), as DataGenerator::checkArrayForErrors
+			for asic only checked bytes of every record count.
+		"""
+		data = np.frombuffer(data, dtype=np.uint8) if not isinstance(data, np.ndarray) else data.view(np.uint8).ravel()
+		golden = self.golden(mode, pattern, len(data))
+		word_mask = WORD_MASKS.get(pattern, WORD_MASKS[None])
+		errors = 0
+		offsets = []
+		for start in range(0, len(data), self.block_size):
+			block = data[start:start + self.block_size]
+			expected = golden[start:start + self.block_size]
+			words = len(block) // 8
+			different = (block[:8 * words].view('<u8') ^ expected[:8 * words].view('<u8')) & word_mask
+			wrong_words = np.flatnonzero(different)
+			wrong_bytes = (different[wrong_words].view(np.uint8).reshape(-1, 8) != 0)
+			byte_offsets = (8 * wrong_words[:, np.newaxis] + np.arange(8))[wrong_bytes]
+			tail = np.flatnonzero(block[8 * words:] != expected[8 * words:]) + 8 * words
+			if pattern == 'asic':
+				tail = tail[(start + tail) % ASIC_RECORD_SIZE < ASIC_CHECKED_BYTES]
+			errors += len(byte_offsets) + len(tail)
+			if len(offsets) < max_offsets:
+				offsets.extend((start + np.concatenate([byte_offsets, tail])[:max_offsets - len(offsets)]).tolist())
+		return errors, offsets
+
+	def verify_file(self, file_name, mode, pattern, offset=0, max_offsets=10):
+		"""Returns (errors, offsets of the first wrong bytes) of captured pipe dump stored in file, read memory-mapped"""
+		if os.path.getsize(file_name) <= offset:
+			return 0, []
+		return self.verify(np.memmap(file_name, dtype=np.uint8, mode='r', offset=offset), mode, pattern, max_offsets)
+
+
+if __name__ == "__main__":
+	library = PatternLibrary(PATTERN_LIBRARY_FOLDER, VERIFICATION_BLOCK_SIZE)
+	if len(sys.argv) == 4:
+		capture_file, mode, pattern = sys.argv[1:]
+		errors, offsets = library.verify_file(capture_file, mode, pattern)
+		print("{}: {} wrong bytes{}".format(capture_file, errors, " (first at {})".format(offsets) if errors else ''))
+		sys.exit(1 if errors else 0)
+	cfg_file = sys.argv[1] if len(sys.argv) == 2 else PERFORMANCE_CFG_FILE
+	combinations = patterns_of_cfg(read_performance_cfg(cfg_file))
+	generated = library.build(combinations)
+	print("{} patterns of {} in {} ({:.1f} MiB generated now)".format(len(combinations), cfg_file, PATTERN_LIBRARY_FOLDER,
+																		generated / 2 ** 20))
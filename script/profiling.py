@@ -0,0 +1,227 @@
+from cfg import *
+import atexit
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+
+
+"""Environment variables that override PROFILE_STAGES and PROFILE_MEMORY (1 / 0)"""
+PROFILE_ENVIRONMENT_VARIABLE = 'RUN_ANALYSIS_PROFILE'
+PROFILE_MEMORY_ENVIRONMENT_VARIABLE = 'RUN_ANALYSIS_PROFILE_MEMORY'
+
+
+def _switch(environment_variable, default):
+	value = os.environ.get(environment_variable)
+	if value is not None:
+		return value.strip().lower() not in ('', '0', 'false', 'no', 'off')
+	return default
+
+
+def profiling_enabled():
+	return _switch(PROFILE_ENVIRONMENT_VARIABLE, PROFILE_STAGES)
+
+
+def memory_profiling_enabled():
+	return _switch(PROFILE_MEMORY_ENVIRONMENT_VARIABLE, PROFILE_MEMORY)
+
+
+class _Stage(object):
+	"""Single running stage; items (e.g. rows, groups, figures, bytes) are added with count()"""
+	def __init__(self, profiler, name):
+		self.profiler = profiler
+		self.name = name
+		self.items = {}
+		self.children_peak = 0
+
+	def count(self, **items):
+		for item, value in items.items():
+			self.items[item] = self.items.get(item, 0) + value
+
+	def __enter__(self):
+		self.profiler.enter(self)
+		return self
+
+	def __exit__(self, *exc_info):
+		self.profiler.exit(self)
+		return False
+
+
+class _DisabledStage(object):
+	"""Stage used when profiling is disabled: does nothing"""
+	def count(self, **items):
+		pass
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		return False
+
+
+_DISABLED_STAGE = _DisabledStage()
+
+
+class Profiler(object):
+	"""Records wall time, CPU time, peak memory and item counts of analysis stages.
+
+	Stages can be nested; peak memory of a stage includes its nested stages.
+	Every outermost call of a stage can be run under cProfile, so the
+	slowest stage can be inspected function by function.
+
+	Attributes:
+		trace_memory (bool): measure peak memory with tracemalloc?
+		use_cprofile (bool): run outermost stages under cProfile?
+		stages (dict): name of stage mapped to its totals (calls, wall and CPU seconds, peak bytes, items).
+		events (list): every finished stage call (for JSON trace).
+	"""
+	def __init__(self, trace_memory=False, use_cprofile=False):
+		self.trace_memory = trace_memory
+		self.use_cprofile = use_cprofile
+		self.stages = {}
+		self.events = []
+		self.__stack = []
+		self.__profiles = {}
+		self.__origin = time.perf_counter()
+
+	def stage(self, name):
+		return _Stage(self, name)
+
+	def enter(self, stage):
+		if self.trace_memory:
+			if not tracemalloc.is_tracing():
+				tracemalloc.start()
+			stage.memory_at_enter, peak = tracemalloc.get_traced_memory()
+			if self.__stack:
+				self.__stack[-1].children_peak = max(self.__stack[-1].children_peak, peak)
+			tracemalloc.reset_peak()
+		stage.profile = None
+		if self.use_cprofile and not self.__stack:
+			stage.profile = self.__profiles.setdefault(stage.name, cProfile.Profile())
+			stage.profile.enable()
+		self.__stack.append(stage)
+		stage.cpu_start = time.process_time()
+		stage.wall_start = time.perf_counter()
+
+	def exit(self, stage):
+		wall = time.perf_counter() - stage.wall_start
+		cpu = time.process_time() - stage.cpu_start
+		self.__stack.pop()
+		if stage.profile:
+			stage.profile.disable()
+		peak = None
+		if self.trace_memory:
+			peak = max(tracemalloc.get_traced_memory()[1], stage.children_peak)
+			if self.__stack:
+				self.__stack[-1].children_peak = max(self.__stack[-1].children_peak, peak)
+			peak -= stage.memory_at_enter
+		totals = self.stages.setdefault(stage.name, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+													 'peak_bytes': 0, 'items': {}})
+		totals['calls'] += 1
+		totals['wall_seconds'] += wall
+		totals['cpu_seconds'] += cpu
+		if peak is not None:
+			totals['peak_bytes'] = max(totals['peak_bytes'], peak)
+		for item, value in stage.items.items():
+			totals['items'][item] = totals['items'].get(item, 0) + value
+		self.events.append({
+			'name': stage.name,
+			'start_seconds': stage.wall_start - self.__origin,
+			'wall_seconds': wall,
+			'cpu_seconds': cpu,
+			'peak_bytes': peak,
+			'depth': len(self.__stack),
+			'items': stage.items
+		})
+
+	def slowest_stage(self):
+		"""Returns name of stage with the longest total wall time among stages run under cProfile (or all)"""
+		names = [name for name in self.stages if name in self.__profiles] or list(self.stages)
+		return max(names, key=lambda name: self.stages[name]['wall_seconds']) if names else None
+
+	def print_summary(self):
+		if not self.stages:
+			return
+		print("Stage profile:")
+		print("\t{:<24}{:>7}{:>12}{:>12}{:>12}  {}".format('Stage', 'Calls', 'Wall [s]', 'CPU [s]', 'Peak [MB]', 'Items'))
+		for name, totals in sorted(self.stages.items(), key=lambda stage: -stage[1]['wall_seconds']):
+			peak = '{:.1f}'.format(totals['peak_bytes'] / 1e6) if self.trace_memory else '-'
+			items = ', '.join('{}={}'.format(item, value) for item, value in totals['items'].items())
+			print("\t{:<24}{:>7}{:>12.3f}{:>12.3f}{:>12}  {}".format(name, totals['calls'], totals['wall_seconds'],
+																	totals['cpu_seconds'], peak, items))
+
+	def save_trace(self, file_name):
+		"""Write stage calls as JSON trace (Trace Event Format, viewable in chrome://tracing or Perfetto)"""
+		trace_events = [{
+			'name': event['name'],
+			'ph': 'X',
+			'ts': event['start_seconds'] * 1e6,
+			'dur': event['wall_seconds'] * 1e6,
+			'pid': os.getpid(),
+			'tid': 0,
+			'args': dict(event['items'], cpu_seconds=event['cpu_seconds'], peak_bytes=event['peak_bytes'])
+		} for event in self.events]
+		with open(file_name, mode='w') as trace_file:
+			json.dump({'traceEvents': trace_events, 'stages': self.stages}, trace_file, indent=1)
+
+	def save_cprofile(self, file_name, lines=20):
+		"""Save cProfile stats of the slowest stage (pstats format) and print its most expensive functions"""
+		name = self.slowest_stage()
+		if name not in self.__profiles:
+			return None
+		self.__profiles[name].dump_stats(file_name)
+		output = io.StringIO()
+		pstats.Stats(self.__profiles[name], stream=output).sort_stats('cumulative').print_stats(lines)
+		print("cProfile of the slowest stage '{}' (saved to {}):".format(name, file_name))
+		print(output.getvalue())
+		return name
+
+	def report(self):
+		"""Print summary and write trace and cProfile files configured in cfg.py (called at exit)"""
+		self.print_summary()
+		if PROFILE_TRACE_FILE_NAME:
+			self.save_trace(PROFILE_TRACE_FILE_NAME)
+		if PROFILE_CPROFILE_FILE_NAME:
+			self.save_cprofile(PROFILE_CPROFILE_FILE_NAME)
+
+
+profiler = None
+if profiling_enabled():
+	profiler = Profiler(memory_profiling_enabled(), bool(PROFILE_CPROFILE_FILE_NAME))
+	atexit.register(profiler.report)
+
+
+def stage(name):
+	"""Returns context manager that records stage (or does nothing when profiling is disabled)"""
+	if profiler is None:
+		return _DISABLED_STAGE
+	return profiler.stage(name)
+
+
+def profiled(name, count=None):
+	"""Decorator recording every call of function as stage.
+
+	When profiling is disabled the function is returned unchanged, so it
+	costs nothing.
+
+	Args:
+		name (string): name of stage.
+		count (callable): called with (result, *args, **kwargs) of the call, returns dict of items.
+	"""
+	def decorator(function):
+		if profiler is None:
+			return function
+
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			with profiler.stage(name) as running_stage:
+				result = function(*args, **kwargs)
+				if count:
+					running_stage.count(**count(result, *args, **kwargs))
+			return result
+		return wrapper
+	return decorator
@@ -0,0 +1,250 @@
+import csv
+
+import numpy as np
+
+
+def _ordered_values(column, preferred_order):
+	"""Returns distinct values of column: values listed in preferred order first (in that order), the rest sorted"""
+	present = set(column)
+	listed = [value for value in preferred_order if value in present]
+	rest = present.difference(listed)
+	try:
+		rest = sorted(rest)
+	except TypeError:
+		rest = sorted(rest, key=str)
+	return listed + rest
+
+
+def _cost_ranks(values, cost_order):
+	"""Returns rank of every value: position in cost order, values not listed are more expensive (in their order)"""
+	ranks = {value: rank for rank, value in enumerate(cost_order)}
+	return np.array([ranks.get(value, len(cost_order) + i) for i, value in enumerate(values)])
+
+
+def print_list_of_dicts(list_of_dicts):
+	if not list_of_dicts:
+		print("Nothing to show")
+		return
+	headers = list(list_of_dicts[0])
+	rows = [['{:.4g}'.format(value) if isinstance(value, float) else value for value in row.values()]
+			for row in list_of_dicts]
+	widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+	for row in [headers] + rows:
+		print('  '.join(str(cell).rjust(width) for cell, width in zip(row, widths)))
+
+
+def save_list_of_dicts(list_of_dicts, file_name, delimiter=';'):
+	with open(file_name, mode='w', newline='') as table_file:
+		if list_of_dicts:
+			writer = csv.DictWriter(table_file, fieldnames=list(list_of_dicts[0]), delimiter=delimiter)
+			writer.writeheader()
+			writer.writerows(list_of_dicts)
+
+
+class ResultCube(object):
+	"""Refactored results as dense N-dimensional arrays of speed and its uncertainty.
+
+	Every axis (e.g. Mode, Direction, FifoMemoryType, FifoDepth, BlockSize,
+	DataPattern, PatternSize) is one dimension of the cube, missing
+	configurations are NaN. Any group of axes can be ranked at once for every
+	combination of the remaining ones: the best candidate is found with one
+	argmax, candidates slower than the best by less than tie_sigma combined
+	uncertainties are tied with it.
+
+	Attributes:
+		axes (list): names of axes in order of dimensions.
+		values (dict): axis mapped to list of its values (index along dimension).
+		y (np.array): speeds (NaN where configuration was not measured).
+		yerr (np.array): uncertainties of speeds.
+		y_head (string): name of speed column.
+		yerr_head (string): name of uncertainty column.
+	"""
+	def __init__(self, list_of_results_dicts, axes, axes_order=None, y_head='Average', yerr_head='u(av)'):
+		"""Args:
+			list_of_results_dicts (list): list of dicts of refactored data.
+			axes (list): names of columns used as axes (missing ones are skipped).
+			axes_order (dict): axis mapped to preferred order of its values, e.g. BASIC_PROPERTIES
+							   (values not listed follow sorted).
+			y_head (string): name of speed column.
+			yerr_head (string): name of uncertainty column.
+		"""
+		axes_order = axes_order if axes_order else {}
+		first_row = list_of_results_dicts[0] if list_of_results_dicts else {}
+		self.axes = [axis for axis in axes if axis in first_row]
+		self.y_head = y_head
+		self.yerr_head = yerr_head
+		self.values = {}
+		codes = []
+		for axis in self.axes:
+			column = [row[axis] for row in list_of_results_dicts]
+			self.values[axis] = _ordered_values(column, axes_order.get(axis, []))
+			index = {value: i for i, value in enumerate(self.values[axis])}
+			codes.append(np.fromiter((index[value] for value in column), dtype=np.int64, count=len(column)))
+		shape = tuple(len(self.values[axis]) for axis in self.axes)
+		self.y = np.full(shape, np.nan)
+		self.yerr = np.full(shape, np.nan)
+		if not list_of_results_dicts:
+			return
+		cells = np.ravel_multi_index(codes, shape)
+		duplicated = len(cells) - len(np.unique(cells))
+		if duplicated:
+			print("{} results share cell of cube with other results (axes {}), the last ones are kept".format(duplicated, self.axes))
+		self.y.flat[cells] = [row[y_head] for row in list_of_results_dicts]
+		self.yerr.flat[cells] = [row[yerr_head] for row in list_of_results_dicts]
+
+	def parse_selection(self, assignments):
+		"""Returns selection dict from strings like 'Direction=read' or 'PatternSize=65536' (values as in cube)"""
+		selection = {}
+		for assignment in assignments:
+			axis, _, text = assignment.partition('=')
+			if axis not in self.values:
+				raise ValueError("Unknown axis {} (available: {})".format(axis, self.axes))
+			matching = [value for value in self.values[axis] if str(value) == text]
+			if not matching:
+				raise ValueError("{} = {} is not in results (available: {})".format(axis, text, self.values[axis]))
+			selection[axis] = matching[0]
+		return selection
+
+	def __selected(self, selection):
+		"""Returns (y, yerr, remaining axes) of cube with selected axes fixed to given values"""
+		index = []
+		for axis in self.axes:
+			if axis in selection:
+				if selection[axis] not in self.values[axis]:
+					raise ValueError("{} = {} is not in results (available: {})".format(axis, selection[axis], self.values[axis]))
+				index.append(self.values[axis].index(selection[axis]))
+			else:
+				index.append(slice(None))
+		unknown = set(selection).difference(self.axes)
+		if unknown:
+			raise ValueError("Unknown axes {} (available: {})".format(sorted(unknown), self.axes))
+		index = tuple(index)
+		return self.y[index], self.yerr[index], [axis for axis in self.axes if axis not in selection]
+
+	def __candidates(self, over, selection):
+		"""Returns (y, yerr) with over axes flattened into the last dimension, remaining axes and candidates.
+
+		Candidates are combinations of values of over axes in C order: the first
+		axis is the most significant one, values of every axis follow their order.
+		"""
+		y, yerr, remaining = self.__selected(selection if selection else {})
+		if not over or set(over).difference(remaining):
+			raise ValueError("Axes to rank over {} must be unselected axes of cube {}".format(over, remaining))
+		others = [axis for axis in remaining if axis not in over]
+		order = [remaining.index(axis) for axis in others + list(over)]
+		others_shape = tuple(len(self.values[axis]) for axis in others)
+		y = np.transpose(y, order).reshape(others_shape + (-1,))
+		yerr = np.transpose(yerr, order).reshape(others_shape + (-1,))
+		candidates = list(np.ndindex(*(len(self.values[axis]) for axis in over)))
+		return y, yerr, others, candidates
+
+	def __candidate_ranks(self, axes, candidates, cost_orders):
+		"""Returns array of cost rank of every candidate on every axis (candidates x axes)"""
+		cost_orders = cost_orders if cost_orders else {}
+		ranks = [_cost_ranks(self.values[axis], cost_orders.get(axis, self.values[axis])) for axis in axes]
+		return np.array([[ranks[i][value] for i, value in enumerate(candidate)] for candidate in candidates])
+
+	def __key_dicts(self, axes, index_tuples):
+		return [dict((axis, self.values[axis][i]) for axis, i in zip(axes, index_tuple)) for index_tuple in index_tuples]
+
+	def argmax(self, over, selection=None, tie_sigma=1.0):
+		"""Best candidate of over axes for every combination of the remaining axes (vectorized).
+
+		Args:
+			over (list): axes ranked together, e.g. ['FifoMemoryType', 'FifoDepth'].
+			selection (dict): axes fixed to single values, e.g. {'Direction': 'read', 'PatternSize': 65536}.
+			tie_sigma (float): candidates slower than the best by at most tie_sigma * sqrt(u_best^2 + u^2) are tied.
+		Returns:
+			dict of arrays over remaining axes: 'best' (candidate index, -1 where nothing was measured),
+			'y', 'yerr' (of the best), 'tied' (mask of tied candidates in the last dimension) and
+			'others', 'candidates' describing dimensions.
+		"""
+		y, yerr, others, candidates = self.__candidates(over, selection)
+		measured = ~np.all(np.isnan(y), axis=-1)
+		best = np.argmax(np.where(np.isnan(y), -np.inf, y), axis=-1)
+		best_y = np.take_along_axis(y, best[..., np.newaxis], axis=-1)
+		best_yerr = np.take_along_axis(yerr, best[..., np.newaxis], axis=-1)
+		with np.errstate(invalid='ignore'):
+			tied = best_y - y <= tie_sigma * np.sqrt(np.square(best_yerr) + np.square(np.nan_to_num(yerr)))
+		return {
+			'best': np.where(measured, best, -1),
+			'y': best_y[..., 0],
+			'yerr': best_yerr[..., 0],
+			'tied': tied & measured[..., np.newaxis],
+			'others': others,
+			'candidates': candidates
+		}
+
+	def ranking(self, over, selection=None, tie_sigma=1.0, fraction_of_peak=0.95, cost_orders=None):
+		"""Returns list of dicts with the best candidate of over axes for every combination of the remaining axes.
+
+		Next to the best candidate the cheapest tied one is reported (e.g. the
+		shallowest FIFO when ranking over FifoDepth) and the cheapest one reaching
+		fraction of peak speed. Candidates are compared by cost ranks of over axes,
+		the first axis is the most significant one.
+
+		Args:
+			cost_orders (dict): over axis mapped to its values from the cheapest (default: order of cube values).
+		"""
+		ranked = self.argmax(over, selection, tie_sigma)
+		y, _, _, candidates = self.__candidates(over, selection)
+		with np.errstate(invalid='ignore'):
+			within = y >= fraction_of_peak * ranked['y'][..., np.newaxis]
+		candidate_ranks = self.__candidate_ranks(over, candidates, cost_orders)
+		cost = np.empty(len(candidates), dtype=np.int64)
+		cost[np.lexsort(candidate_ranks.T[::-1])] = np.arange(len(candidates))
+		cheapest_tied = np.argmin(np.where(ranked['tied'], cost, len(candidates)), axis=-1)
+		cheapest_within = np.argmin(np.where(within, cost, len(candidates)), axis=-1)
+		candidate_names = ['/'.join(str(value) for value in key_dict.values())
+						   for key_dict in self.__key_dicts(over, candidates)]
+		over_name = '/'.join(over)
+		rows = []
+		for index in map(tuple, np.argwhere(ranked['best'] >= 0)):
+			row = dict((axis, self.values[axis][i]) for axis, i in zip(ranked['others'], index))
+			row['Best ' + over_name] = candidate_names[ranked['best'][index]]
+			row[self.y_head] = ranked['y'][index].item()
+			row[self.yerr_head] = ranked['yerr'][index].item()
+			row['Tied'] = ', '.join(candidate_names[i] for i in np.flatnonzero(ranked['tied'][index]))
+			row['Cheapest tied'] = candidate_names[cheapest_tied[index]]
+			row['Cheapest within {:g}% of peak'.format(100 * fraction_of_peak)] = candidate_names[cheapest_within[index]]
+			rows.append(row)
+		return rows
+
+	def pareto_frontier(self, cost_axes, cost_orders=None, selection=None, tie_sigma=1.0):
+		"""Returns list of dicts with configurations on Pareto frontier of speed against cost axes.
+
+		Candidate is dominated when another one of the same remaining axes on
+		frontier is not more expensive on any cost axis and is faster or slower
+		by at most tie_sigma combined uncertainties, so more expensive
+		configuration stays on frontier only when it is significantly faster.
+		Ties are not transitive, so candidates are visited from the cheapest and
+		only the ones already on frontier can dominate.
+
+		Args:
+			cost_axes (list): axes of cost, e.g. ['FifoDepth', 'FifoMemoryType'].
+			cost_orders (dict): cost axis mapped to its values from the cheapest (default: order of cube values).
+			selection (dict): axes fixed to single values.
+			tie_sigma (float): how many combined uncertainties faster counts as not slower.
+		"""
+		y, yerr, others, candidates = self.__candidates(cost_axes, selection)
+		candidate_ranks = self.__candidate_ranks(cost_axes, candidates, cost_orders)
+		not_more_expensive = np.all(candidate_ranks[np.newaxis, :, :] <= candidate_ranks[:, np.newaxis, :], axis=-1)
+		np.fill_diagonal(not_more_expensive, False)
+
+		y_a, y_b = y[..., :, np.newaxis], y[..., np.newaxis, :]
+		tolerance = tie_sigma * np.sqrt(np.square(yerr[..., :, np.newaxis]) + np.square(yerr[..., np.newaxis, :]))
+		with np.errstate(invalid='ignore'):
+			dominates = not_more_expensive & (y_b >= y_a - np.nan_to_num(tolerance))
+		on_frontier = np.zeros(y.shape, dtype=bool)
+		for candidate in np.lexsort(candidate_ranks.T[::-1]):
+			dominated = np.any(dominates[..., candidate, :] & on_frontier, axis=-1)
+			on_frontier[..., candidate] = ~dominated & ~np.isnan(y[..., candidate])
+
+		rows = []
+		for index in map(tuple, np.argwhere(on_frontier)):
+			row = dict((axis, self.values[axis][i]) for axis, i in zip(others, index[:-1]))
+			row.update(self.__key_dicts(cost_axes, [candidates[index[-1]]])[0])
+			row[self.y_head] = y[index].item()
+			row[self.yerr_head] = yerr[index].item()
+			rows.append(row)
+		return rows
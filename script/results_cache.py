@@ -0,0 +1,213 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+
+import numpy as np
+
+from aggregation import StreamingAggregator
+from profiling import profiled
+from results_table import ResultsTable
+
+
+class ResultsCache(object):
+	"""On-disk cache of parsed results table and aggregated statistics of single csv file.
+
+	Every column and every array of aggregator state is stored as separate
+	.npy file and loaded memory-mapped. The cache is valid for csv path and
+	parsing settings; csv size, mtime and hash of the already parsed part
+	decide whether it can be used as is, extended with appended rows or
+	has to be rebuilt.
+
+	Attributes:
+		cache_path (string): directory where this csv file is cached.
+	"""
+	BLOCK_SIZE = 16 * 1024 * 1024
+	"""Version of cache layout, part of settings, so caches written by another version are rebuilt"""
+	VERSION = 3
+
+	def __init__(self, cache_folder, csv_file, delimiter, int_values, float_values, categorical_values,
+				 refactored_heads, stat_iterations, chunk_size=100000):
+		"""Args:
+			cache_folder (string): directory for caches of all csv files.
+			csv_file (string): name of csv file that contains data.
+			delimiter (char): the character used for separating values in csv file.
+			int_values (list): specifes which values need to be integers.
+			float_values (list): specifes which values need to be floats.
+			categorical_values (list): specifes which values are stored as categorical codes.
+			refactored_heads (list): list of headers for refactoring the original data.
+			stat_iterations (int): how many iterations were performed for better statistics.
+			chunk_size (int): how many csv rows are converted to arrays at once.
+		"""
+		self.__csv_file = os.path.abspath(csv_file)
+		self.__delimiter = delimiter
+		self.__int_values = int_values
+		self.__float_values = float_values
+		self.__categorical_values = categorical_values
+		self.__refactored_heads = refactored_heads
+		self.__stat_iterations = stat_iterations
+		self.__chunk_size = chunk_size
+		self.__settings = {
+			'version': self.VERSION,
+			'csv_file': self.__csv_file,
+			'delimiter': delimiter,
+			'int_values': list(int_values),
+			'float_values': list(float_values),
+			'categorical_values': list(categorical_values),
+			'refactored_heads': list(refactored_heads),
+			'stat_iterations': stat_iterations
+		}
+		settings_hash = hashlib.sha1(json.dumps(self.__settings, sort_keys=True).encode()).hexdigest()
+		self.cache_path = os.path.join(cache_folder, settings_hash[:16])
+
+	@profiled('cache loading', lambda result, self: {'rows': len(result[0])})
+	def load(self):
+		"""Returns (ResultsTable, StreamingAggregator) taken from cache, updated or rebuilt if needed"""
+		meta = self.__read_meta()
+		stat_result = os.stat(self.__csv_file)
+		if meta and meta['size'] == stat_result.st_size and meta['mtime'] == stat_result.st_mtime_ns:
+			return self.__load_arrays(meta)
+		prefix_hash = None
+		if meta and stat_result.st_size >= meta['offset']:
+			prefix_hash = self.__hash_of_prefix(meta['offset'])
+		# Cache that includes last line without newline is rebuilt, that line may have been written only partly
+		if prefix_hash and prefix_hash.hexdigest() == meta['content_hash'] and not meta.get('tail'):
+			table, aggregator = self.__load_arrays(meta)
+			new_table, offset, content_hash = self.__parse(meta['offset'], prefix_hash, table)
+			if not len(new_table):
+				meta.update(size=stat_result.st_size, mtime=stat_result.st_mtime_ns, offset=offset, tail=self.__tail,
+							content_hash=content_hash, malformed_rows=meta['malformed_rows'] + new_table.malformed_rows)
+				self.__write_meta(self.cache_path, meta)
+				table.malformed_rows = meta['malformed_rows']
+				return table, aggregator
+			table = table.append(new_table)
+			aggregator.add_table(new_table)
+		else:
+			table, offset, content_hash = self.__parse(0, hashlib.sha1())
+			aggregator = StreamingAggregator(self.__key_heads(table.headers), self.__stat_iterations)
+			aggregator.add_table(table)
+		self.__save(table, aggregator, offset, content_hash, stat_result)
+		return self.__load_arrays(self.__read_meta())
+
+	def clear(self):
+		shutil.rmtree(self.cache_path, ignore_errors=True)
+
+	def __key_heads(self, headers):
+		return [head for head in self.__refactored_heads if head in headers]
+
+	def __meta_file(self):
+		return os.path.join(self.cache_path, 'meta.json')
+
+	def __read_meta(self):
+		try:
+			with open(self.__meta_file(), mode='r') as meta_file:
+				meta = json.load(meta_file)
+		except (OSError, ValueError):
+			return None
+		if meta.get('settings') != self.__settings:
+			return None
+		return meta
+
+	def __hash_of_prefix(self, length):
+		"""Returns sha1 object fed with first length bytes of csv file"""
+		content_hash = hashlib.sha1()
+		with open(self.__csv_file, mode='rb') as results_file:
+			while length > 0:
+				block = results_file.read(min(self.BLOCK_SIZE, length))
+				if not block:
+					break
+				content_hash.update(block)
+				length -= len(block)
+		return content_hash
+
+	def __iter_lines(self, offset, content_hash):
+		"""Yields blocks of lines starting at offset; updates offset and hash of complete lines.
+
+		Last line without newline is yielded too, but only its length (tail) is
+		recorded, so offset and hash always end at a complete line.
+		"""
+		with open(self.__csv_file, mode='rb') as results_file:
+			results_file.seek(offset)
+			remainder = b''
+			while True:
+				block = results_file.read(self.BLOCK_SIZE)
+				if not block:
+					break
+				block = remainder + block
+				cut = block.rfind(b'\n') + 1
+				remainder = block[cut:]
+				if cut:
+					content_hash.update(block[:cut])
+					self.__offset = offset = offset + cut
+					yield block[:cut].decode()
+			self.__tail = len(remainder)
+			if remainder:
+				yield remainder.decode()
+
+	def __parse(self, offset, content_hash, cached_table=None):
+		"""Parse lines from offset. Returns (table, offset after the last complete line, hash of bytes before it)
+
+		Args:
+			content_hash (hashlib object): hash of bytes before offset, updated with parsed bytes.
+			cached_table (ResultsTable): table the parsed rows will be appended to (None: parse headers too).
+		"""
+		self.__offset = offset
+		self.__tail = 0
+		lines = (line for block in self.__iter_lines(offset, content_hash)
+				 for line in io.StringIO(block))
+		if cached_table is None:
+			headers = next(csv.reader(lines, delimiter=self.__delimiter))
+			categories = None
+		else:
+			headers = cached_table.headers
+			categories = cached_table.categories
+		table = ResultsTable.from_rows(headers, csv.reader(lines, delimiter=self.__delimiter), self.__int_values,
+									   self.__float_values, self.__categorical_values, self.__chunk_size, categories)
+		return table, self.__offset, content_hash.hexdigest()
+
+	def __save(self, table, aggregator, offset, content_hash, stat_result):
+		temporary_path = self.cache_path + '.tmp'
+		shutil.rmtree(temporary_path, ignore_errors=True)
+		os.makedirs(temporary_path)
+		for i, head in enumerate(table.headers):
+			np.save(os.path.join(temporary_path, 'column_{}.npy'.format(i)), np.asarray(table.columns[head]))
+		state = aggregator.state()
+		state_names = sorted(state)
+		for i, name in enumerate(state_names):
+			np.save(os.path.join(temporary_path, 'state_{}.npy'.format(i)), state[name])
+		meta = {
+			'settings': self.__settings,
+			'size': stat_result.st_size,
+			'mtime': stat_result.st_mtime_ns,
+			'offset': offset,
+			'content_hash': content_hash,
+			'tail': self.__tail,
+			'headers': table.headers,
+			'categories': table.categories,
+			'malformed_rows': table.malformed_rows,
+			'key_heads': aggregator.key_heads,
+			'state_names': state_names
+		}
+		self.__write_meta(temporary_path, meta)
+		shutil.rmtree(self.cache_path, ignore_errors=True)
+		os.replace(temporary_path, self.cache_path)
+
+	@staticmethod
+	def __write_meta(path, meta):
+		meta_file_name = os.path.join(path, 'meta.json')
+		with open(meta_file_name + '.tmp', mode='w') as meta_file:
+			json.dump(meta, meta_file)
+		os.replace(meta_file_name + '.tmp', meta_file_name)
+
+	def __load_arrays(self, meta):
+		columns = {}
+		for i, head in enumerate(meta['headers']):
+			columns[head] = np.load(os.path.join(self.cache_path, 'column_{}.npy'.format(i)), mmap_mode='r')
+		table = ResultsTable(meta['headers'], columns, meta['categories'], meta['malformed_rows'])
+		state = {}
+		for i, name in enumerate(meta['state_names']):
+			state[name] = np.load(os.path.join(self.cache_path, 'state_{}.npy'.format(i)))
+		aggregator = StreamingAggregator.from_state(state, meta['key_heads'], self.__stat_iterations)
+		return table, aggregator
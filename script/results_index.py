@@ -0,0 +1,119 @@
+import numpy as np
+
+
+class ResultsIndex(object):
+	"""Group-by index over refactored results.
+
+	Columns are converted to numpy arrays once. Grouping over a given tuple of
+	axes (e.g. Mode, Direction, FifoMemoryType, FifoDepth, DataPattern) is built
+	in one sort on first use and cached, so every later lookup of a series is
+	a single dict access.
+
+	Attributes:
+		axes (list): names of columns that can be used as grouping keys.
+		x_head (string): name of column used as x values of series.
+		y_head (string): name of column used as y values of series.
+		yerr_head (string): name of column used as y uncertainty of series.
+	"""
+	def __init__(self, list_of_results_dicts, axes, x_head='PatternSize', y_head='Average', yerr_head='u(av)'):
+		"""Args:
+			list_of_results_dicts (list): list of dicts of refactored data.
+			axes (iterable): names of columns that can be used as grouping keys.
+			x_head (string): name of column used as x values of series.
+			y_head (string): name of column used as y values of series.
+			yerr_head (string): name of column used as y uncertainty of series.
+		"""
+		self.axes = list(axes)
+		self.x_head = x_head
+		self.y_head = y_head
+		self.yerr_head = yerr_head
+		self.__codes = {}
+		self.__categories = {}
+		for axis in self.axes:
+			column = [row[axis] for row in list_of_results_dicts]
+			categories, codes = self.__encode(column)
+			self.__categories[axis] = categories
+			self.__codes[axis] = codes
+		self.__x = np.array([row[x_head] for row in list_of_results_dicts])
+		self.__y = np.array([row[y_head] for row in list_of_results_dicts], dtype=np.float64)
+		self.__yerr = np.array([row[yerr_head] for row in list_of_results_dicts], dtype=np.float64)
+		self.__groups = {}
+
+	def __len__(self):
+		return len(self.__y)
+
+	def values(self, axis):
+		"""Returns values of axis in order of first appearance"""
+		return list(self.__categories[axis])
+
+	@staticmethod
+	def __encode(column):
+		mapping = {}
+		codes = np.fromiter((mapping.setdefault(value, len(mapping)) for value in column),
+							dtype=np.int64, count=len(column))
+		return list(mapping), codes
+
+	def __build_groups(self, axes):
+		if not len(self):
+			return {}
+		keys = np.stack([self.__codes[axis] for axis in axes], axis=1)
+		unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+		inverse = inverse.ravel()
+		order = np.argsort(inverse, kind='stable')
+		bounds = np.searchsorted(inverse[order], np.arange(len(unique_keys) + 1))
+		groups = {}
+		for i, key_codes in enumerate(unique_keys):
+			key = tuple(self.__categories[axis][code] for axis, code in zip(axes, key_codes))
+			groups[key] = order[bounds[i]:bounds[i+1]]
+		return groups
+
+	def groups(self, axes):
+		"""Returns dict mapping tuple of axes values to indices of matching rows (built once per axes)"""
+		axes = tuple(axes)
+		if axes not in self.__groups:
+			self.__groups[axes] = self.__build_groups(axes)
+		return self.__groups[axes]
+
+	def indices(self, axes, key):
+		return self.groups(axes).get(tuple(key))
+
+	def series(self, axes, key):
+		"""Returns dict with x, y and yerr lists of rows matching key or None if there is no such row"""
+		indices = self.indices(axes, key)
+		if indices is None:
+			return None
+		return {
+			'x': self.__x[indices].tolist(),
+			'y': self.__y[indices].tolist(),
+			'yerr': self.__yerr[indices].tolist()
+		}
+
+
+def max_and_most_frequent(results_dict, x_param):
+	"""Returns winner (param with maximal y) for each x and list of params that won most often.
+
+	Args:
+		results_dict (dict): param mapped to dict with 'x', 'y' and 'yerr' lists.
+		x_param (list): x values the winners are looked for.
+	"""
+	params = list(results_dict)
+	if not params or not x_param:
+		return [], []
+	y_matrix = np.full((len(params), len(x_param)), np.nan)
+	for i, param in enumerate(params):
+		y = results_dict[param]['y'][:len(x_param)]
+		y_matrix[i, :len(y)] = y
+	valid = ~np.all(np.isnan(y_matrix), axis=0)
+	if not np.all(valid):
+		y_matrix = y_matrix[:, :np.argmin(valid)]
+	if not y_matrix.shape[1]:
+		return [], []
+	winners = np.nanargmax(y_matrix, axis=0)
+	max_values = y_matrix[winners, np.arange(len(winners))]
+	max_third_param_list = [{params[w]: "{0:.3f}".format(v)} for w, v in zip(winners.tolist(), max_values.tolist())]
+
+	counts = np.bincount(winners, minlength=len(params))
+	_, first_seen = np.unique(winners, return_index=True)
+	in_order_of_appearance = winners[np.sort(first_seen)]
+	most_frequent_third_param = [params[w] for w in in_order_of_appearance.tolist() if counts[w] == counts.max()]
+	return max_third_param_list, most_frequent_third_param
@@ -0,0 +1,360 @@
+import csv
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+from profiling import profiled
+
+
+def read_csv_headers(csv_file, delimiter):
+	"""Returns headers (the first row) of csv file or None if file is empty"""
+	with open(csv_file, mode='r', newline='') as results_file:
+		return next(csv.reader(results_file, delimiter=delimiter), None)
+
+
+class ResultsTable(object):
+	"""Columnar storage of results: one typed numpy array per column.
+
+	Integer and float columns are kept as int64 / float64 arrays. Categorical
+	columns (e.g. Mode, Direction) are kept as small integer codes together
+	with the list of categories, every other column is kept as a string array.
+
+	Attributes:
+		headers (list): list of column names in original order.
+		columns (dict): column name mapped to numpy array (codes for categorical columns).
+		categories (dict): categorical column name mapped to list of its categories.
+		malformed_rows (int): how many rows were skipped because of wrong number of fields or repeated header line.
+	"""
+	def __init__(self, headers, columns, categories=None, malformed_rows=0):
+		"""Args:
+			headers (list): list of column names in original order.
+			columns (dict): column name mapped to numpy array.
+			categories (dict): categorical column name mapped to list of its categories.
+			malformed_rows (int): how many rows were skipped while reading.
+		"""
+		self.headers = list(headers)
+		self.columns = columns
+		self.categories = categories if categories else {}
+		self.malformed_rows = malformed_rows
+
+	@classmethod
+	def from_csv(cls, csv_file, delimiter, int_values, float_values, categorical_values, chunk_size=100000):
+		"""Read csv file chunk by chunk, so only chunk_size rows of strings are kept in memory at once"""
+		with open(csv_file, mode='r', newline='') as results_file:
+			results_reader = csv.reader(results_file, delimiter=delimiter)
+			headers = next(results_reader, None)
+			if headers is None:
+				raise ValueError('File {} is empty'.format(csv_file))
+			return cls.from_rows(headers, results_reader, int_values, float_values, categorical_values, chunk_size)
+
+	@classmethod
+	def from_rows(cls, headers, rows, int_values, float_values, categorical_values, chunk_size=100000, categories=None):
+		"""Build table from iterable of string rows.
+
+		Args:
+			categories (dict): categories to start with, so codes stay compatible with other table.
+		"""
+		builder = _ColumnsBuilder(headers, int_values, float_values, categorical_values, categories)
+		for chunk, malformed_rows in _read_chunks(rows, headers, chunk_size):
+			builder.malformed_rows += malformed_rows
+			builder.add_chunk(chunk)
+		return builder.build()
+
+	@classmethod
+	def iter_csv(cls, csv_file, delimiter, int_values, float_values, categorical_values, chunk_size=100000):
+		"""Yields one independent table per chunk of csv file, so memory use does not depend on file size"""
+		with open(csv_file, mode='r', newline='') as results_file:
+			results_reader = csv.reader(results_file, delimiter=delimiter)
+			headers = next(results_reader, None)
+			if headers is None:
+				raise ValueError('File {} is empty'.format(csv_file))
+			for chunk, malformed_rows in _read_chunks(results_reader, headers, chunk_size):
+				builder = _ColumnsBuilder(headers, int_values, float_values, categorical_values)
+				builder.malformed_rows = malformed_rows
+				builder.add_chunk(chunk)
+				yield builder.build()
+
+	def __len__(self):
+		if isinstance(self.columns, ConcatenatedColumns):
+			return self.columns.rows
+		if not self.headers:
+			return 0
+		return len(self.columns[self.headers[0]])
+
+	def __contains__(self, head):
+		return head in self.columns
+
+	def __getitem__(self, head):
+		"""Returns decoded column (categories instead of codes)"""
+		if head in self.categories:
+			return np.asarray(self.categories[head], dtype=object)[self.columns[head]]
+		return self.columns[head]
+
+	def is_categorical(self, head):
+		return head in self.categories
+
+	def codes(self, head):
+		"""Returns raw integer codes of categorical column"""
+		return self.columns[head]
+
+	def code_of(self, head, value):
+		"""Returns code of value in categorical column or -1 if value never occurs"""
+		try:
+			return self.categories[head].index(value)
+		except ValueError:
+			return -1
+
+	def mask(self, **conditions):
+		"""Returns boolean mask of rows that match all of head=value conditions"""
+		result = np.ones(len(self), dtype=bool)
+		for head, value in conditions.items():
+			if head in self.categories:
+				result &= self.columns[head] == self.code_of(head, value)
+			else:
+				result &= self.columns[head] == value
+		return result
+
+	@classmethod
+	def concatenate(cls, tables):
+		"""Returns one table with rows of all tables (with same headers); every column is copied on its first use"""
+		headers = tables[0].headers
+		categories = {head: {} for head in tables[0].categories}
+		remaps = {head: [] for head in categories}
+		for table in tables:
+			for head, mapping in categories.items():
+				remaps[head].append(np.array([mapping.setdefault(category, len(mapping)) for category in table.categories[head]],
+											 dtype=np.int16))
+		parts = {head: [table.columns[head] for table in tables] for head in headers}
+		columns = ConcatenatedColumns(headers, parts, remaps, sum(len(table) for table in tables))
+		categories = {head: list(mapping) for head, mapping in categories.items()}
+		return cls(headers, columns, categories, sum(table.malformed_rows for table in tables))
+
+	def append(self, other):
+		"""Returns new table with rows of other table (with same headers) appended"""
+		return ResultsTable.concatenate([self, other])
+
+	def take(self, indices):
+		"""Returns new table with rows selected by index array or boolean mask"""
+		columns = {head: column[indices] for head, column in self.columns.items()}
+		return ResultsTable(self.headers, columns, self.categories)
+
+	def value(self, head, index):
+		"""Returns single value as python object"""
+		if head in self.categories:
+			return self.categories[head][self.columns[head][index]]
+		return self.columns[head][index].item()
+
+	def row(self, index):
+		return {head: self.value(head, index) for head in self.headers}
+
+	def row_list(self, index):
+		return [self.value(head, index) for head in self.headers]
+
+	def dict_view(self):
+		"""Returns read-only sequence of row dicts created on demand"""
+		return RowsView(self, as_dict=True)
+
+	def list_view(self):
+		"""Returns read-only sequence of row lists created on demand"""
+		return RowsView(self, as_dict=False)
+
+
+class ConcatenatedColumns(Mapping):
+	"""Columns of many tables that are concatenated lazily, one column at a time on its first access.
+
+	Columns that are never used are never copied, and memory-mapped parts
+	(e.g. cached campaigns) of such columns are not even read.
+
+	Attributes:
+		rows (int): number of rows of all parts.
+	"""
+	def __init__(self, headers, parts, remaps, rows):
+		"""Args:
+			headers (list): column names.
+			parts (dict): column name mapped to list of its arrays in every table.
+			remaps (dict): categorical column name mapped to list of arrays translating codes of every table to common ones.
+			rows (int): number of rows of all parts.
+		"""
+		self.rows = rows
+		self.__headers = list(headers)
+		self.__parts = parts
+		self.__remaps = remaps
+		self.__columns = {}
+
+	def __getitem__(self, head):
+		if head not in self.__columns:
+			parts = self.__parts.pop(head)
+			if head in self.__remaps:
+				parts = [remap[part] if len(remap) else np.asarray(part, dtype=np.int16)
+						 for part, remap in zip(parts, self.__remaps.pop(head))]
+			self.__columns[head] = np.concatenate(parts)
+		return self.__columns[head]
+
+	def __contains__(self, head):
+		return head in self.__columns or head in self.__parts
+
+	def __iter__(self):
+		return iter(self.__headers)
+
+	def __len__(self):
+		return len(self.__headers)
+
+
+class RowsView(Sequence):
+	"""Lazy, list-like view on ResultsTable rows.
+
+	Rows are converted to dicts (or lists) only when accessed, so the view
+	costs nothing until iterated.
+	"""
+	def __init__(self, table, as_dict=True):
+		self.__table = table
+		self.__as_dict = as_dict
+
+	def __len__(self):
+		return len(self.__table)
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [self[i] for i in range(*index.indices(len(self)))]
+		if index < 0:
+			index += len(self)
+		if not 0 <= index < len(self):
+			raise IndexError('row index out of range')
+		if self.__as_dict:
+			return self.__table.row(index)
+		return self.__table.row_list(index)
+
+
+def _read_chunks(results_reader, headers, chunk_size):
+	"""Yields lists of at most chunk_size rows and number of malformed rows skipped before each.
+
+	Rows equal to headers are malformed too: transfer program writes header
+	line on every start, so resumed measurement repeats it inside the file.
+	"""
+	chunk = []
+	malformed_rows = 0
+	for row in results_reader:
+		if len(row) != len(headers) or row == headers:
+			malformed_rows += 1
+			continue
+		chunk.append(row)
+		if len(chunk) == chunk_size:
+			yield chunk, malformed_rows
+			chunk = []
+			malformed_rows = 0
+	if chunk or malformed_rows:
+		yield chunk, malformed_rows
+
+
+def iter_csv_columns(csv_file, delimiter, heads, int_values=(), float_values=(), block_size=16 * 1024 * 1024):
+	"""Yields (line numbers, dict of selected columns, number of malformed rows) for consecutive blocks of csv file.
+
+	Only selected heads are converted: integer and float ones to numpy arrays,
+	the rest is returned as lists of strings. Lines are split with str.split,
+	which is several times faster than csv module (blocks with quotes are
+	still read with csv module), so huge files can be scanned quickly with
+	memory bounded by block size. Line numbers count from 1 with header line.
+	Repeated header lines (written by resumed measurement) count as malformed.
+	"""
+	with open(csv_file, mode='rb') as results_file:
+		headers = next(csv.reader([results_file.readline().decode()], delimiter=delimiter))
+		missing_heads = [head for head in heads if head not in headers]
+		if missing_heads:
+			raise ValueError('Columns {} not found in {}'.format(missing_heads, csv_file))
+		indices = [headers.index(head) for head in heads]
+		line_number = 2
+		remainder = b''
+		while True:
+			block = results_file.read(block_size)
+			if not block:
+				if remainder.strip():
+					yield _columns_of_lines(remainder.decode(), delimiter, headers, heads, indices,
+											int_values, float_values, line_number)
+				return
+			block = remainder + block
+			cut = block.rfind(b'\n') + 1
+			remainder = block[cut:]
+			if cut:
+				line_numbers, columns, malformed_rows = _columns_of_lines(block[:cut].decode(), delimiter, headers,
+																		  heads, indices, int_values, float_values,
+																		  line_number)
+				line_number += len(line_numbers) + malformed_rows
+				yield line_numbers, columns, malformed_rows
+
+
+def _columns_of_lines(text, delimiter, headers, heads, indices, int_values, float_values, first_line_number):
+	lines = text.splitlines()
+	row_length = len(headers)
+	if ('"' not in text and delimiter.join(headers) not in text and
+			text.count(delimiter) == len(lines) * (row_length - 1)):
+		tokens = delimiter.join(lines).split(delimiter)
+		line_numbers = np.arange(first_line_number, first_line_number + len(lines))
+		raw_columns = [tokens[i::row_length] for i in indices]
+	else:
+		rows = csv.reader(lines, delimiter=delimiter) if '"' in text else (line.split(delimiter) for line in lines)
+		valid = [(i, row) for i, row in enumerate(rows) if len(row) == row_length and row != headers]
+		line_numbers = first_line_number + np.array([i for i, row in valid], dtype=np.int64)
+		raw_columns = [[row[i] for _, row in valid] for i in indices]
+	columns = {}
+	for head, column in zip(heads, raw_columns):
+		if head in int_values:
+			columns[head] = np.array(list(map(int, column)), dtype=np.int64)
+		elif head in float_values:
+			columns[head] = np.array(list(map(float, column)), dtype=np.float64)
+		else:
+			columns[head] = column
+	return line_numbers, columns, len(lines) - len(line_numbers)
+
+
+class _ColumnsBuilder(object):
+	"""Converts chunks of string rows to typed arrays and merges categories between chunks"""
+	def __init__(self, headers, int_values, float_values, categorical_values, categories=None):
+		self.headers = headers
+		self.int_values = [head for head in int_values if head in headers]
+		self.float_values = [head for head in float_values if head in headers]
+		self.categorical_values = [head for head in categorical_values if head in headers]
+		self.malformed_rows = 0
+		self.__chunks = {head: [] for head in headers}
+		self.__categories = {head: {} for head in self.categorical_values}
+		for head, values in (categories or {}).items():
+			if head in self.__categories:
+				self.__categories[head] = {category: code for code, category in enumerate(values)}
+
+	@profiled('type casting', lambda result, self, rows: {'rows': len(rows)})
+	def add_chunk(self, rows):
+		if not rows:
+			return
+		string_array = np.array(rows, dtype=str)
+		for i, head in enumerate(self.headers):
+			column = string_array[:, i]
+			if head in self.int_values:
+				column = column.astype(np.int64)
+			elif head in self.float_values:
+				column = column.astype(np.float64)
+			elif head in self.categorical_values:
+				column = self.__encode(head, column)
+			self.__chunks[head].append(column)
+
+	def __encode(self, head, column):
+		chunk_categories, inverse = np.unique(column, return_inverse=True)
+		mapping = self.__categories[head]
+		global_codes = np.array([mapping.setdefault(str(category), len(mapping)) for category in chunk_categories],
+								dtype=np.int16)
+		return global_codes[inverse.ravel()]
+
+	def build(self):
+		columns = {}
+		for head in self.headers:
+			chunks = self.__chunks[head]
+			if chunks:
+				columns[head] = np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+			elif head in self.int_values:
+				columns[head] = np.empty(0, dtype=np.int64)
+			elif head in self.float_values:
+				columns[head] = np.empty(0, dtype=np.float64)
+			elif head in self.categorical_values:
+				columns[head] = np.empty(0, dtype=np.int16)
+			else:
+				columns[head] = np.empty(0, dtype=str)
+		categories = {head: list(mapping) for head, mapping in self.__categories.items()}
+		return ResultsTable(self.headers, columns, categories, self.malformed_rows)
@@ -1,37 +1,118 @@
 from cfg import * 
+import argparse
 import csv
-import math
-import matplotlib.pyplot as plt
-import statistics as stat
+import functools
+import json
+import os
+import re
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from aggregation import GroupedStatistics, StreamingAggregator
+from campaign_comparison import CampaignComparison
+from campaigns import (CAMPAIGN_HEAD, is_multi_campaign_source, load_campaigns, read_headers_from_performance_cfg,
+					   resolve_csv_files, resolve_results_csv_files)
+from drift_analysis import DriftAnalysis
+from error_scanner import ErrorScanner
+from figure_manifest import FigureManifest, figure_files, figure_hash
+from profiling import profiled
+from result_cube import ResultCube, print_list_of_dicts, save_list_of_dicts
+from results_cache import ResultsCache
+from results_index import ResultsIndex, max_and_most_frequent
+from results_table import ResultsTable, read_csv_headers
+from transfer_log import TransferLog
+from transfer_model import TransferModel, fit_latency_bandwidth, model_speed
 
 
 class ResultsParser(object):
-	"""Transform data from csv file to list of dicts.
+	"""Transform data from csv file to columnar results table.
 
 	Attributes:
 		int_values (list): specifes which values need to be integers.
 		float_values (list): specifes which values need to be floats.
+		categorical_values (list): specifes which values are stored as categorical codes.
 		refactored_heads (list): list of headers for refactoring the original data.
 		stat_iterations (int): how many iterations were performed for better statistics.
-		results_list (list): list of results from csv file.
+		table (ResultsTable): typed, columnar results from csv file (single file without cache is read on first use).
 		headers_list (list): list of headers from csv file.
-		list_of_results_dicts (list): list of dicts of original data.
+		results_list (RowsView): lazy list of rows (lists) on top of table.
+		list_of_results_dicts (RowsView): lazy list of dicts of original data on top of table.
 	"""
-	def __init__(self, csv_file, delimiter, int_values, float_values, refactored_heads, stat_iterations):
+	def __init__(self, csv_file, delimiter, int_values, float_values, refactored_heads, stat_iterations,
+				 categorical_values=CATEGORICAL_VALUES, chunk_size=CSV_CHUNK_SIZE, cache_folder=None, headers=None,
+				 load_workers=LOAD_WORKERS):
 		"""Args:
-			csv_file (string): name of csv file that contains data.
+			csv_file (string): name of csv file that contains data, or directory / glob pattern
+							   of csv files that are analysed as one dataset with Campaign column.
 			delimiter (char): the character used for separating values in csv file.
 			int_values (list): specifes which values need to be integers.
 			float_values (list): specifes which values need to be floats.
 			refactored_heads (list): list of headers for refactoring the original data.
 			stat_iterations (int): how many iterations were performed for better statistics.
+			categorical_values (list): specifes which values are stored as categorical codes.
+			chunk_size (int): how many csv rows are converted to arrays at once.
+			cache_folder (string): where parsed and aggregated results are cached (None: no caching).
+			headers (list): expected headers of csv files from many campaigns (None: headers of the first file).
+			load_workers (int): number of threads reading csv files from many campaigns.
 		"""
 		self.int_values = int_values
 		self.float_values = float_values
+		self.categorical_values = categorical_values
 		self.refactored_heads = refactored_heads
 		self.stat_iterations = stat_iterations
-		self.results_list, self.headers_list = ResultsParser.results_and_headers_lists_from_file(csv_file, delimiter)
-		self.list_of_results_dicts = self.__generate_results_list_of_dicts()
+		self.__csv_file = csv_file
+		self.__delimiter = delimiter
+		self.__chunk_size = chunk_size
+		self.__cache_folder = cache_folder
+		self.__headers = headers
+		self.__load_workers = load_workers
+		self.__table = None
+		self.__aggregator = None
+		# Single csv file without cache is read only when table is needed, aggregate() streams it in chunks instead
+		if is_multi_campaign_source(csv_file) or cache_folder:
+			self.__load()
+
+	@profiled('loading results', lambda result, self: {'rows': len(self.__table)})
+	def __load(self):
+		if is_multi_campaign_source(self.__csv_file):
+			self.__table = load_campaigns(self.__csv_file, self.__delimiter, self.int_values, self.float_values,
+										  self.categorical_values, self.__headers, self.__chunk_size, self.__load_workers,
+										  self.__cache_folder, self.refactored_heads, self.stat_iterations)
+		elif self.__cache_folder:
+			cache = ResultsCache(self.__cache_folder, self.__csv_file, self.__delimiter, self.int_values, self.float_values,
+								 self.categorical_values, self.refactored_heads, self.stat_iterations, self.__chunk_size)
+			self.__table, self.__aggregator = cache.load()
+		else:
+			self.__table = ResultsTable.from_csv(self.__csv_file, self.__delimiter, self.int_values, self.float_values,
+												 self.categorical_values, self.__chunk_size)
+
+	@property
+	def table(self):
+		"""Typed, columnar results (read on first use)"""
+		if self.__table is None:
+			self.__load()
+		return self.__table
+
+	@property
+	def headers_list(self):
+		if self.__table is None:
+			return read_csv_headers(self.__csv_file, self.__delimiter)
+		return self.__table.headers
+
+	@property
+	def results_list(self):
+		return self.table.list_view()
+
+	@property
+	def list_of_results_dicts(self):
+		return self.table.dict_view()
+
+	def rows(self):
+		"""Returns number of results (counted while aggregating when table was not read)"""
+		if self.__table is None:
+			return self.aggregate().rows
+		return len(self.__table)
 
 	@staticmethod
 	def results_and_headers_lists_from_file(csv_file, delimiter):
@@ -42,97 +123,91 @@ class ResultsParser(object):
 			results_list = list(results_reader)
 		return results_list, headers_list
 
-	def __hash_data(self, results_list):
-		"""Transform desired numeric data from string to int / float"""
-		for row in results_list:
-			for int_value in self.int_values:
-				row[self.headers_list.index(int_value)] = int(row[self.headers_list.index(int_value)])
-			for float_value in self.float_values:
-				row[self.headers_list.index(float_value)] = float(row[self.headers_list.index(float_value)])
-		return results_list
-
-	def __generate_results_list_of_dicts(self):
-		hashed_results_list = self.__hash_data(self.results_list)
-		list_of_results_dicts = []
-		for row in hashed_results_list:
-			results_dicts = {head : row[self.headers_list.index(head)] for head in self.headers_list}
-			list_of_results_dicts.append(results_dicts)
-		return list_of_results_dicts
-
-	def __transform_row_to_dict(self, row,  params):
-		row_dict = {}
-		for head in self.refactored_heads:
-			if head in self.headers_list:
-				row_dict[head] = row[head]
-			else:
-				row_dict[head] = params.get_refactored_param(head)
-		return row_dict
-
-	def get_refactored_list_of_results_dicts(self, in_megabytes=True):
+	def key_heads(self):
+		"""Returns heads that identify configuration (refactored heads present in csv file and campaign)"""
+		key_heads = [head for head in self.refactored_heads if head in self.headers_list]
+		if CAMPAIGN_HEAD in self.headers_list:
+			key_heads.append(CAMPAIGN_HEAD)
+		return key_heads
+
+	def aggregate(self):
+		"""Returns StreamingAggregator fed with all rows, grouped by full configuration"""
+		if self.__aggregator:
+			return self.__aggregator
+		if self.__table is None:
+			self.__aggregator = StreamingAggregator.from_csv(self.__csv_file, self.__delimiter, self.int_values,
+															 self.float_values, self.categorical_values, self.key_heads(),
+															 self.stat_iterations, self.__chunk_size)
+			return self.__aggregator
+		aggregator = StreamingAggregator(self.key_heads(), self.stat_iterations)
+		aggregator.add_table(self.table)
+		return aggregator
+
+	def grouped_statistics(self, dropped_stat_iterations=DROPPED_STATISTICAL_ITERATIONS, outlier_threshold=OUTLIER_THRESHOLD,
+						   percentiles=PERCENTILES):
+		"""Returns GroupedStatistics (mean, stdev, median, min/max, percentiles) of all configurations"""
+		return GroupedStatistics(self.table, self.key_heads(), self.stat_iterations, dropped_stat_iterations,
+								 outlier_threshold, percentiles)
+
+	def get_refactored_list_of_results_dicts(self, in_megabytes=True, include_incomplete=False,
+											 dropped_stat_iterations=DROPPED_STATISTICAL_ITERATIONS,
+											 outlier_threshold=OUTLIER_THRESHOLD):
 		"""Returns list of dicts of refactored data.
 		Args:
 			in_megabytes (bool): does speed values need to be perfomed in megabytes
 								 instead of bytes? (True by default)
+			include_incomplete (bool): keep configurations with less statistical
+									   iterations than expected? (False by default)
+			dropped_stat_iterations (list): statistical iterations left out of statistics.
+			outlier_threshold (float): robust z-score above which sample is rejected (None: no rejection).
 		"""
-		refactored_list_of_results_dicts = []
-		results_fpga_array = []
-		results_pc_array = []
-		for row in self.list_of_results_dicts:
-			results_fpga_array.append(row['SpeedFPGA [B/s]'])
-			results_pc_array.append(row['SpeedPC [B/s]'])
-			if row['StatisticalIter'] == self.stat_iterations:
-				params = CounterParams(results_fpga_array, results_pc_array, in_megabytes)
-				row_dict = self.__transform_row_to_dict(row, params)
-				refactored_list_of_results_dicts.append(row_dict)
-				results_fpga_array = []
-				results_pc_array = []
-		return refactored_list_of_results_dicts
+		if dropped_stat_iterations or outlier_threshold is not None:
+			statistics = self.grouped_statistics(dropped_stat_iterations, outlier_threshold)
+		else:
+			statistics = self.aggregate()
+		ResultsParser.report_incomplete_groups(statistics)
+		return statistics.list_of_results_dicts(self.refactored_heads, in_megabytes, include_incomplete)
 
+	@staticmethod
+	def report_incomplete_groups(statistics):
+		for key_dict, count in statistics.incomplete_groups():
+			print("Incomplete group ({} of {} statistical iterations):\n".format(count, statistics.stat_iterations), key_dict)
+		for key_dict, count in statistics.over_counted_groups():
+			print("Group measured more than once ({} rows, only the latest row of each of the first {} statistical iterations is used):\n".format(
+				count, statistics.stat_iterations), key_dict)
+
+	@profiled('error check', lambda result, self: {'rows': len(self.table)})
 	def check_errors(self):
 		errors_occurance = 0
-		for results_dict in self.list_of_results_dicts:
-			errors = results_dict['Errors']
-			if errors != 0:
-				print(errors, "errors occured in row:\n", results_dict)
-				errors_occurance += 1
+		for index in np.flatnonzero(self.table['Errors'] != 0):
+			results_dict = self.table.row(index)
+			print(results_dict['Errors'], "errors occured in row:\n", results_dict)
+			errors_occurance += 1
 		if errors_occurance == 0:
 			print("No errors detected")
 
-class CounterParams(object):
-	def __init__(self, speed_fpga_list, speed_pc_list, in_megabytes):
-		if in_megabytes is True:
-			self.divider = 1000000
-		else:
-			self.divider = 1
-		self.av_speed_fpga = stat.mean(speed_fpga_list)
-		self.av_speed_pc = stat.mean(speed_pc_list)
-		self.stdev_speed_fpga = stat.stdev(speed_fpga_list)
-		self.stdev_speed_pc = stat.stdev(speed_pc_list)
-		self.av_speed = self.__av_speed()
-		self.stdev_speed = self.__stdev_speed()
-
-	def __av_speed(self):
-		return (self.av_speed_fpga + self.av_speed_pc) / 2
-
-	def __stdev_speed(self):
-		fpga_arg = math.pow(self.stdev_speed_fpga/2, 2)
-		pc_arg = math.pow(self.stdev_speed_pc/2, 2)
-		sum_of_args = fpga_arg + pc_arg
-		return math.sqrt(sum_of_args)
-
-	def get_refactored_param(self, head):
-		if head == 'SpeedPC':
-			return self.av_speed_pc / self.divider
-		elif head == 'SpeedFPGA':
-			return self.av_speed_fpga / self.divider
-		elif head == 'u(PC)':
-			return self.stdev_speed_pc / self.divider
-		elif head == 'u(FPGA)':
-			return self.stdev_speed_fpga / self.divider
-		elif head == 'Average':
-			return self.av_speed / self.divider
-		elif head == 'u(av)':
-			return self.stdev_speed / self.divider
+class ChapterBuilder(object):
+	"""Keeps LaTeX results chapter in memory and writes it to file at once.
+
+	The file is written to temporary file first and then moved in place, so
+	a run that dies never leaves half-written chapter behind.
+	"""
+	def __init__(self, file_name):
+		self.file_name = file_name
+		self.__fragments = []
+
+	def append(self, string_to_append):
+		self.__fragments.append(string_to_append)
+
+	@profiled('chapter writing', lambda result, self: {'bytes': result})
+	def write(self):
+		content = ''.join(self.__fragments)
+		temporary_file_name = self.file_name + '.tmp'
+		with open(temporary_file_name, "w") as fd:
+			fd.write(content)
+		os.replace(temporary_file_name, self.file_name)
+		return len(content)
+
 
 class ResultsHandler(object):
 	def __init__(self, list_of_results_dicts, plot_metadata, target_speed, basic_properties):
@@ -140,67 +215,50 @@ class ResultsHandler(object):
 		self.metadata = plot_metadata
 		self.target_speed = target_speed
 		self.basic_properties = basic_properties
+		axes = list(basic_properties)
+		if list_of_results_dicts and CAMPAIGN_HEAD in list_of_results_dicts[0]:
+			axes.append(CAMPAIGN_HEAD)
+		self.results_index = ResultsIndex(list_of_results_dicts, axes)
 		self.x_param = []
 		self.chapter_file_name = None
+		self.chapter = None
 		self.fig_folder = None
 		self.generate_results_chapter = False
+		self.render_workers = 1
+		self.transfer_model_overlay = False
+		self.output_modes = FIGURE_OUTPUT_MODES
+		self.png_dpi = PNG_DPI
+		self.figure_manifest = None
 
 	def enable_results_chapter_generation(self, results_chapter_file_name, fig_folder):
 		self.generate_results_chapter = True
 		self.chapter_file_name = results_chapter_file_name
+		self.chapter = ChapterBuilder(results_chapter_file_name)
 		self.fig_folder = fig_folder
 
+	def __axis_values(self, label):
+		"""Values of axis from basic properties, or all values present in results (e.g. for Campaign)"""
+		if label in self.basic_properties:
+			return self.basic_properties[label]
+		return self.results_index.values(label)
+
 	def __iterate_using_params(self, first_param_label, second_param_label, third_param_label, valid_modes):
 		list_of_param_dicts = []
+		axes = ('Mode', 'Direction', first_param_label, second_param_label, third_param_label)
 		for mode in self.basic_properties['Mode']:
+			if mode not in valid_modes:
+				continue
 			for direction in self.basic_properties['Direction']:
-				for first_param in self.basic_properties[first_param_label]:
-					for second_param in self.basic_properties[second_param_label]:
+				for first_param in self.__axis_values(first_param_label):
+					for second_param in self.__axis_values(second_param_label):
 						results_dict = {}
-						x_param = []
-						for third_param in self.basic_properties[third_param_label]:
-							x_param = []
-							y_param = []
-							yerr_param = []
-							for row in self.list_of_results_dicts:
-								if ((mode == row['Mode']) and
-									(mode in valid_modes) and
-									(direction == row['Direction']) and
-									(first_param == row[first_param_label]) and
-									(second_param == row[second_param_label]) and
-									(third_param == row[third_param_label])):
-									x_param.append(row['PatternSize'])
-									y_param.append(row['Average'])
-									yerr_param.append(row['u(av)'])
-							if y_param:
-								results_dict[third_param] = {
-									'x': x_param,
-									'y': y_param,
-									'yerr': yerr_param
-								}
-								self.x_param = x_param
-						max_third_param_list = []
-						for i, x in enumerate(self.x_param):
-							max_value = None
-							for param in results_dict:
-								current_value = results_dict[param]['y'][i]
-								if not max_value:
-									max_value = current_value
-									max_third_param_list.append({param : "{0:.3f}".format(max_value)})
-									continue
-								elif current_value > max_value:
-									max_value = current_value
-									max_third_param_list[i] = {param : "{0:.3f}".format(max_value)}
-
-						most_frequent_third_param_dict = {}
-						for mtp in max_third_param_list:
-							for m in mtp:
-								if not m in most_frequent_third_param_dict:
-									most_frequent_third_param_dict[m] = 0
-								else:
-									most_frequent_third_param_dict[m] += 1
-						# print(most_frequent_third_param_dict)
-						most_frequent_third_param = [par for par in most_frequent_third_param_dict if most_frequent_third_param_dict[par] == max(most_frequent_third_param_dict.values())]
+						for third_param in self.__axis_values(third_param_label):
+							key = (mode, direction, first_param, second_param, third_param)
+							series = self.results_index.series(axes, key)
+							if series:
+								results_dict[third_param] = series
+								self.x_param = series['x']
+						max_third_param_list, most_frequent_third_param = max_and_most_frequent(results_dict, self.x_param)
 
 						param_dict = {
 							'mode': mode,
@@ -215,6 +273,7 @@ class ResultsHandler(object):
 							list_of_param_dicts.append(param_dict)
 		return list_of_param_dicts
 
+	@profiled('parameter scan', lambda result, *args, **kwargs: {'param_dicts': len(result)})
 	def list_of_results_with_parameters(self, plotting_option, option=None):
 		first_param_label = plotting_option['first_param']
 		second_param_label = plotting_option['second_param']
@@ -227,8 +286,11 @@ class ResultsHandler(object):
 		return list_of_param_dicts
 
 	def __append_string_to_chapter_file(self, string_to_append):
-		with open(self.chapter_file_name, "a") as fd:
-			fd.write(string_to_append)
+		self.chapter.append(string_to_append)
+
+	def write_results_chapter(self):
+		"""Write whole results chapter at once. Returns number of written characters"""
+		return self.chapter.write()
 
 	def __generate_first_column_for_tab(self, rows, is_max_row_needed=True):
 		first_row = '\\textbf{Pattern size [B]} '
@@ -284,23 +346,30 @@ class ResultsHandler(object):
 			except IndexError:
 				break
 
+	def __include_figure(self, fig_name):
+		"""Returns \\includegraphics of figure file or of page of multi-page PDF given as (file, page)"""
+		if isinstance(fig_name, tuple):
+			return "\\includegraphics[width=\\textwidth,page={}]{{{}}}".format(fig_name[1], self.fig_folder + fig_name[0])
+		return "\\includegraphics[width=\\textwidth]{{{}}}".format(self.fig_folder + fig_name)
+
 	def __organize_figures(self, fig_names_list):
-		fig_init = "\\includegraphics[width=\\textwidth]{{{}}}"
 		minipage = '\\begin{{minipage}}{{0.48\\textwidth}}\n\t\\centering\n\t{}\n\t\\caption{{{}}}\n\\end{{minipage}}%\n'
 		is_new_line = False
 		for fig_name_dict in fig_names_list:
-			fig_name = ''.join(fig_name_dict.keys())
-			fig_title = ''.join(fig_name_dict.values())
+			fig_name, fig_title = next(iter(fig_name_dict.items()))
 			if not is_new_line:
 				fig_declaration = '\\begin{figure}[H]\n\\centering\n'
-				fig_declaration += minipage.format(fig_init.format(self.fig_folder + fig_name), fig_title)
+				fig_declaration += minipage.format(self.__include_figure(fig_name), fig_title)
 				fig_declaration += '\\hspace{0.02\\textwidth}\n'
 				is_new_line = True
 			else:
-				fig_declaration += minipage[:-2].format(fig_init.format(self.fig_folder + fig_name), fig_title)
+				fig_declaration += minipage[:-2].format(self.__include_figure(fig_name), fig_title)
 				fig_declaration += '\n\\end{figure}\n\n'
 				self.__append_string_to_chapter_file(fig_declaration)
 				is_new_line = False
+		if is_new_line:
+			fig_declaration += '\\end{figure}\n\n'
+			self.__append_string_to_chapter_file(fig_declaration)
 
 	def __add_subsection(self, subsection_name):
 		subsection_def = '\\subsection{{{}}}\n'.format(subsection_name)
@@ -327,55 +396,239 @@ class ResultsHandler(object):
 		ending = '\n\t\\end{tabular}\n\\end{center}\n'
 		self.__append_string_to_chapter_file(ending)
 
-	def __generate_subsection_based_on_plot_option(self, ploting_option, list_of_param_dict, all_fig_names):
-		nonsym_figs = []
-		bit32_figs = []
-		duplex_figs = []
-		for fig in all_fig_names:
-			if 'nonsym' in ''.join(fig.keys()):
-				nonsym_figs.append(fig)
-			elif '32bit' in ''.join(fig.keys()):
-				bit32_figs.append(fig)
-			elif 'duplex' in ''.join(fig.keys()):
-				duplex.append(fig)
+	def __add_tab_of_best_third_params(self, plotting_option, param_dicts):
+		longest_series = max((series['x'] for param_dict in param_dicts for series in param_dict['third_param'].values()), key=len)
+		self.x_param = longest_series
+		rows = []
+		self.__generate_first_column_for_tab(rows)
+		for param_dict in param_dicts:
+			self.__append_next_column_to_tab(rows, param_dict)
+		tab_label = 'The best {} for {} mode, {} direction and {} {}'.format(plotting_option['third_param'], param_dicts[0]['mode'],
+																		   param_dicts[0]['direction'], plotting_option['first_param'],
+																		   param_dicts[0]['first_param'])
+		self.__add_tab(rows, tab_label)
+
+	@profiled('chapter building')
+	def __generate_subsection_based_on_plot_option(self, plotting_option, list_of_param_dicts, all_fig_names, fig_modes):
+		self.__add_subsection(plotting_option['subsection'])
+		for mode in self.basic_properties['Mode']:
+			mode_param_dicts = [param_dict for param_dict in list_of_param_dicts if param_dict['mode'] == mode]
+			if not mode_param_dicts:
+				continue
+			self.__add_subsubsection('{} mode'.format(mode))
+			for direction in self.basic_properties['Direction']:
+				for first_param in self.__axis_values(plotting_option['first_param']):
+					tab_param_dicts = [param_dict for param_dict in mode_param_dicts
+									   if param_dict['direction'] == direction and param_dict['first_param'] == first_param]
+					if tab_param_dicts:
+						self.__add_tab_of_best_third_params(plotting_option, tab_param_dicts)
+			mode_figs = [fig for fig, fig_mode in zip(all_fig_names, fig_modes) if fig_mode == mode]
+			self.__organize_figures(mode_figs)
+
+	def enable_parallel_rendering(self, render_workers):
+		"""Args:
+			render_workers (int): number of processes rendering figures (0: one per CPU core).
+		"""
+		self.render_workers = render_workers
 
+	def set_output_modes(self, output_modes, png_dpi=PNG_DPI):
+		"""Args:
+			output_modes (list): 'pdf' (PDF per figure), 'multipage' (one PDF per plotting option) and / or 'png'.
+			png_dpi (int): resolution of PNG thumbnails.
+		"""
+		unknown = set(output_modes).difference(FIGURE_OUTPUT_MODE_NAMES)
+		if unknown or not output_modes:
+			raise ValueError("Output modes should be chosen from {}, got {}".format(FIGURE_OUTPUT_MODE_NAMES, output_modes))
+		self.output_modes = list(output_modes)
+		self.png_dpi = png_dpi
 
-	def handle_results(self, plotting_option, plot_index, separate_third_parameters=False):
-		list_of_param_dicts = self.list_of_results_with_parameters(plotting_option)
-		figure = Figure(self.metadata, self.target_speed, plotting_option['title'], plotting_option['savefig'])
-		fig_names = []
+	def enable_incremental_rendering(self, manifest_file_name, force=False):
+		"""Args:
+			manifest_file_name (string): JSON file with hashes of saved figures.
+			force (bool): render all figures anyway (manifest is written again).
+		"""
+		self.figure_manifest = FigureManifest(manifest_file_name, ignore_existing=force)
+
+	def enable_transfer_model_overlay(self):
+		"""Draw fitted t = t0 + size / bandwidth curve over every series"""
+		self.transfer_model_overlay = True
 
-		
+	@staticmethod
+	def __add_transfer_models(jobs):
+		"""Fit transfer model to all series of all jobs at once and store (t0, bandwidth) of each in job['models']"""
+		all_series = [series for job in jobs for series in job['series']]
+		if not all_series:
+			return
+		size = np.concatenate([x for x, y, yerr, symbol, label in all_series])
+		speed = np.concatenate([y for x, y, yerr, symbol, label in all_series])
+		speed_uncertainty = np.concatenate([yerr for x, y, yerr, symbol, label in all_series])
+		group = np.repeat(np.arange(len(all_series)), [len(x) for x, y, yerr, symbol, label in all_series])
+		params = fit_latency_bandwidth(size, speed, speed_uncertainty, group, len(all_series))
+		models = list(zip(params['t0'].tolist(), params['bandwidth'].tolist()))
+		for job in jobs:
+			job['models'] = models[:len(job['series'])]
+			models = models[len(job['series']):]
+
+	def __figure_jobs(self, plotting_option, plot_index, list_of_param_dicts, separate_third_parameters):
+		jobs = []
 		for i, param_dict in enumerate(list_of_param_dicts):
+			title_args = (param_dict['direction'], param_dict['first_param'], param_dict['second_param'])
+			series = []
 			for j, result in enumerate(param_dict['third_param']):
 				x = param_dict['third_param'][result]['x']
 				y = param_dict['third_param'][result]['y']
 				yerr = param_dict['third_param'][result]['yerr']
-				symbol = plotting_option['legend'][result]
-				label = result
-				figure.plot_fig_with_errorbars(x, y, yerr, symbol, label)
+				symbol = plotting_option['legend'].get(result, DEFAULT_LEGEND_SYMBOL)
+				series.append((x, y, yerr, symbol, result))
 				if separate_third_parameters:
-					fig_title = figure.set_title(param_dict['direction'], param_dict['first_param'], param_dict['second_param'])
-					fig_title = self.__refactor_string_to_latex_standard(fig_title)
-					fig_name = figure.save_fig(str(plot_index) + '_' + str(i) + '_' + str(j), param_dict['mode'], param_dict['direction'])
-					fig_names.append({fig_name : fig_title})
+					name_args = (str(plot_index) + '_' + str(i) + '_' + str(j), param_dict['mode'], param_dict['direction'])
+					jobs.append({'series': series, 'title_args': title_args, 'name_args': name_args})
+					series = []
 			if not separate_third_parameters:
-				fig_title = figure.set_title(param_dict['direction'], param_dict['first_param'], param_dict['second_param'])
-				fig_title = self.__refactor_string_to_latex_standard(fig_title)
-				fig_name = figure.save_fig(str(plot_index) + '_' + str(i), param_dict['mode'], param_dict['direction'])
-				fig_names.append({fig_name : fig_title})
+				name_args = (str(plot_index) + '_' + str(i), param_dict['mode'], param_dict['direction'])
+				jobs.append({'series': series, 'title_args': title_args, 'name_args': name_args})
+		if self.transfer_model_overlay:
+			self.__add_transfer_models(jobs)
+		return jobs
+
+	@profiled('rendering', lambda result, *args: {'figures': len(result)})
+	def __render_figure_jobs(self, plotting_option, plot_index, jobs):
+		_pyplot()
+		if 'multipage' in self.output_modes:
+			figure = Figure(self.metadata, self.target_speed, plotting_option['title'], plotting_option['savefig'],
+							self.output_modes, self.png_dpi, multipage_file_name(plotting_option['savefig'], plot_index))
+			try:
+				return [figure.draw_job(job) for job in jobs]
+			finally:
+				figure.close()
+		if self.render_workers == 1 or len(jobs) < 2:
+			figure = Figure(self.metadata, self.target_speed, plotting_option['title'], plotting_option['savefig'],
+							self.output_modes, self.png_dpi)
+			return [figure.draw_job(job) for job in jobs]
+		render = functools.partial(_render_figure_job, self.metadata, self.target_speed,
+								   plotting_option['title'], plotting_option['savefig'], self.output_modes, self.png_dpi)
+		workers = self.render_workers if self.render_workers else os.cpu_count()
+		chunksize = max(1, len(jobs) // (4 * workers))
+		with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as pool:
+			return list(pool.map(render, jobs, chunksize=chunksize))
+
+	def __render_changed_figure_jobs(self, plotting_option, plot_index, jobs):
+		"""Render jobs whose hash in manifest changed or whose files are missing. Returns names of all figures"""
+		if self.figure_manifest is None:
+			return self.__render_figure_jobs(plotting_option, plot_index, jobs)
+		savefig = plotting_option['savefig']
+		settings = (self.metadata, self.target_speed, plotting_option['title'], savefig, self.output_modes, self.png_dpi,
+					SET_TITLES_IN_FIGS, FIGURE_RC_PARAMS)
+		if 'multipage' in self.output_modes:
+			# Pages of multi-page PDF cannot be replaced one by one, so the whole file is hashed and rendered again
+			name = multipage_file_name(savefig, plot_index)
+			digest = figure_hash(settings, jobs)
+			files = [name] + [file_name for job in jobs for file_name in figure_files(savefig, self.output_modes, job)]
+			if self.figure_manifest.is_current(name, digest, files):
+				print("{}: {} figures unchanged, not rendered".format(name, len(jobs)))
+				return [(name, page) for page in range(1, len(jobs) + 1)]
+			fig_names = self.__render_figure_jobs(plotting_option, plot_index, jobs)
+			self.figure_manifest.record(name, digest)
+			self.figure_manifest.write()
+			print("{}: {} figures rendered".format(name, len(jobs)))
+			return fig_names
+		digests = [figure_hash(settings, job) for job in jobs]
+		files = [figure_files(savefig, self.output_modes, job) for job in jobs]
+		changed = [i for i, job in enumerate(jobs) if not self.figure_manifest.is_current(files[i][0], digests[i], files[i])]
+		if changed:
+			self.__render_figure_jobs(plotting_option, plot_index, [jobs[i] for i in changed])
+			for i in changed:
+				self.figure_manifest.record(files[i][0], digests[i])
+			self.figure_manifest.write()
+		print("Plotting option {}: {} of {} figures rendered, the rest unchanged".format(plot_index, len(changed), len(jobs)))
+		return [job_files[0] for job_files in files]
+
+	def handle_results(self, plotting_option, plot_index, separate_third_parameters=False):
+		"""Draw and save all figures of plotting option.
+
+		Returns list of {fig_name: fig_title} dicts; fig_name is the file referenced
+		by chapter or (file, page) of multi-page PDF.
+		"""
+		list_of_param_dicts = self.list_of_results_with_parameters(plotting_option)
+		jobs = self.__figure_jobs(plotting_option, plot_index, list_of_param_dicts, separate_third_parameters)
+		saved_fig_names = self.__render_changed_figure_jobs(plotting_option, plot_index, jobs)
+		fig_names = []
+		for job, fig_name in zip(jobs, saved_fig_names):
+			fig_title = plotting_option['title'].format(*job['title_args'])
+			fig_title = self.__refactor_string_to_latex_standard(fig_title)
+			fig_names.append({fig_name : fig_title})
 
 		if self.generate_results_chapter:
-			self.__generate_subsection_based_on_plot_option(plotting_option, list_of_param_dicts, fig_names)
+			fig_modes = [job['name_args'][1] for job in jobs]
+			self.__generate_subsection_based_on_plot_option(plotting_option, list_of_param_dicts, fig_names, fig_modes)
+		return fig_names
+
+
+"""Ways figures can be saved in"""
+FIGURE_OUTPUT_MODE_NAMES = ['pdf', 'multipage', 'png']
+
+_worker_figures = {}
+_plt = None
+
+def _pyplot():
+	"""Import matplotlib only when the first figure is drawn, so commands without plots start fast.
+
+	Settings and fonts are set up here once per process; worker processes
+	forked later inherit them.
+	"""
+	global _plt
+	if _plt is None:
+		import matplotlib
+		import matplotlib.pyplot as plt
+		from matplotlib import font_manager
+		matplotlib.rcParams.update(FIGURE_RC_PARAMS)
+		font_manager.findfont(font_manager.FontProperties())
+		_plt = plt
+	return _plt
+
+def multipage_file_name(savefig, plot_index):
+	"""Returns name of multi-page PDF of plotting option: savefig without format fields, e.g. 0_patterns.pdf"""
+	folder, name = os.path.split(savefig)
+	name = os.path.splitext(re.sub(r'\{[^}]*\}_?', '', name))[0]
+	return os.path.join(folder, '{}_{}.pdf'.format(plot_index, name))
+
+def _init_render_worker():
+	"""Render figures in worker processes with non-interactive backend"""
+	_pyplot().switch_backend('Agg')
+
+def _render_figure_job(metadata, target_ylabel, fig_title, fig_name, output_modes, png_dpi, job):
+	"""Draw single figure job in worker process, reusing one Figure per plotting option"""
+	key = (fig_title, fig_name)
+	if key not in _worker_figures:
+		_worker_figures[key] = Figure(metadata, target_ylabel, fig_title, fig_name, output_modes, png_dpi)
+	return _worker_figures[key].draw_job(job)
 
 
 class Figure(object):
-	def __init__(self, metadata, target_ylabel, fig_title, fig_name):
-		self.__fig, self.__ax = plt.subplots()
+	def __init__(self, metadata, target_ylabel, fig_title, fig_name, output_modes=('pdf',), png_dpi=PNG_DPI,
+				 multipage_name=None):
+		"""Args:
+			output_modes (iterable): 'pdf' (file per figure), 'multipage' (page of multi-page PDF) and / or 'png'.
+			png_dpi (int): resolution of PNG thumbnails.
+			multipage_name (string): multi-page PDF written in 'multipage' mode (closed by close()).
+		"""
+		self.__fig, self.__ax = _pyplot().subplots()
 		self.__metadata = metadata
 		self.__target = target_ylabel
 		self.__fig_title = fig_title
 		self.__fig_name = fig_name
+		self.__output_modes = output_modes
+		self.__png_dpi = png_dpi
+		self.__multipage_name = multipage_name
+		self.__pages = None
+		if 'multipage' in output_modes:
+			from matplotlib.backends.backend_pdf import PdfPages
+			self.__pages = PdfPages(multipage_name)
+
+	def close(self):
+		if self.__pages is not None:
+			self.__pages.close()
+		_pyplot().close(self.__fig)
 
 	def __set_metadata(self):
 		self.__ax.set_xlabel(self.__metadata['xlabel'])
@@ -395,7 +648,14 @@ class Figure(object):
 			raise ValueError(self.__metadata['error'])
 
 	def plot_fig_with_errorbars(self, x, y, yerr, symbol, label):
-		self.__ax.errorbar(x, y, yerr=yerr, fmt=symbol, label=label)
+		return self.__ax.errorbar(x, y, yerr=yerr, fmt=symbol, label=label)
+
+	def plot_transfer_model(self, x, t0, bandwidth, color):
+		"""Plot speed predicted by t = t0 + size / bandwidth over range of x as dashed line"""
+		if not x or np.isnan(bandwidth):
+			return
+		sizes = np.geomspace(min(x), max(x), 100)
+		self.__ax.plot(sizes, model_speed(sizes, t0, bandwidth), '--', color=color, linewidth=1)
 
 	def set_title(self, *args):
 		if args:
@@ -408,28 +668,311 @@ class Figure(object):
 				self.__ax.title(fig_title)
 		return fig_title
 
+	@profiled('figure saving', lambda result, *args: {'figures': 1})
 	def save_fig(self, *args):
+		"""Save figure in all output modes. Returns name referenced by chapter: PDF file, (multi-page PDF, page) or PNG file"""
 		self.__set_metadata()
 		self.__ax.legend(loc='upper left')
 		if args:
 			fig_name = self.__fig_name.format(*args)
-			self.__fig.savefig(fig_name)
 		else:
 			fig_name = self.__fig_name
+		saved_names = []
+		if 'pdf' in self.__output_modes:
 			self.__fig.savefig(fig_name)
+			saved_names.append(fig_name)
+		if 'multipage' in self.__output_modes:
+			self.__pages.savefig(self.__fig)
+			saved_names.append((self.__multipage_name, self.__pages.get_pagecount()))
+		if 'png' in self.__output_modes:
+			png_name = os.path.splitext(fig_name)[0] + '.png'
+			self.__fig.savefig(png_name, dpi=self.__png_dpi)
+			saved_names.append(png_name)
 		self.__ax.clear()
-		return fig_name
-
-
-if __name__ == "__main__":
-	results = ResultsParser(CSV_FILE, SEPARATOR, INT_VALUES, FLOAT_VALUES, REFACTORED_HEADS, STATISTICAL_ITERATIONS)
+		return saved_names[0]
+
+	@profiled('figure drawing', lambda result, *args: {'figures': 1})
+	def draw_job(self, job):
+		"""Plot all series of figure job, set its title and save it. Returns figure name"""
+		models = job.get('models', [None] * len(job['series']))
+		for (x, y, yerr, symbol, label), model in zip(job['series'], models):
+			errorbars = self.plot_fig_with_errorbars(x, y, yerr, symbol, label)
+			if model:
+				self.plot_transfer_model(x, *model, errorbars[0].get_color())
+		self.set_title(*job['title_args'])
+		return self.save_fig(*job['name_args'])
+
+
+def build_argument_parser():
+	"""Returns parser of command line; defaults of all options come from cfg.py"""
+	common = argparse.ArgumentParser(add_help=False)
+	common.add_argument('--csv-file', default=CSV_FILE,
+						help='csv file, directory or glob pattern of csv files with results (default: %(default)s)')
+	common.add_argument('--separator', default=SEPARATOR, help='separator in csv file (default: %(default)s)')
+	common.add_argument('--stat-iterations', type=int, default=STATISTICAL_ITERATIONS,
+						help='statistical iterations per configuration (default: %(default)s)')
+	common.add_argument('--performance-cfg', default=PERFORMANCE_CFG_FILE,
+						help='config file of transfer program with headers list (default: %(default)s)')
+	common.add_argument('--cache-folder', default=RESULTS_CACHE_FOLDER,
+						help='where parsed results are cached (default: %(default)s)')
+	common.add_argument('--no-cache', dest='cache_folder', action='store_const', const=None, help='do not use cache')
+	common.add_argument('--dropped-stat-iterations', type=int, nargs='*', default=DROPPED_STATISTICAL_ITERATIONS,
+						help='statistical iterations left out of statistics (default: %(default)s)')
+	common.add_argument('--outlier-threshold', type=float, default=OUTLIER_THRESHOLD,
+						help='robust z-score above which sample is rejected (default: %(default)s)')
+	common.add_argument('--include-incomplete', action='store_true',
+						help='keep configurations with less statistical iterations than expected')
+
+	plotting = argparse.ArgumentParser(add_help=False)
+	plotting.add_argument('--options', nargs='+', choices=list(PLOTTING_OPTIONS), default=list(PLOTTING_OPTIONS),
+						  help='plotting options to draw (default: all)')
+	plotting.add_argument('--target-speed', choices=['AV', 'PC', 'FPGA'], default=TARGET_SPEED,
+						  help='speed collocated with pattern sizes (default: %(default)s)')
+	plotting.add_argument('--separated', action=argparse.BooleanOptionalAction, default=PARAMETERS_SEPARATED,
+						  help='each combination of parameters on separated chart (default: %(default)s)')
+	plotting.add_argument('--render-workers', type=int, default=RENDER_WORKERS,
+						  help='processes rendering figures, 0: one per CPU core (default: %(default)s)')
+	plotting.add_argument('--output-modes', nargs='+', choices=FIGURE_OUTPUT_MODE_NAMES, default=FIGURE_OUTPUT_MODES,
+						  help='pdf: PDF per figure, multipage: PDF per plotting option, png: thumbnails (default: %(default)s)')
+	plotting.add_argument('--png-dpi', type=int, default=PNG_DPI, help='resolution of PNG thumbnails (default: %(default)s)')
+	plotting.add_argument('--incremental', action=argparse.BooleanOptionalAction, default=INCREMENTAL_RENDERING,
+						  help='render only figures changed since last run, using manifest of figure hashes (default: %(default)s)')
+	plotting.add_argument('--force-render', action='store_true',
+						  help='render all figures and record their hashes in manifest again')
+	plotting.add_argument('--manifest-file', default=FIGURE_MANIFEST_FILE_NAME,
+						  help='manifest with hashes of saved figures (default: %(default)s)')
+	plotting.add_argument('--fit-transfer-model', action=argparse.BooleanOptionalAction, default=FIT_TRANSFER_MODEL,
+						  help='fit t = t0 + size / bandwidth and draw it on figures (default: %(default)s)')
+
+	parser = argparse.ArgumentParser(description='Analysis of FIFO transfer results.')
+	subparsers = parser.add_subparsers(dest='command')
+	subparsers.add_parser('check', parents=[common], help='scan results for transfer errors and anomalies (nonzero exit status when found)')
+	subparsers.add_parser('aggregate', parents=[common], help='aggregate statistical iterations and print summary')
+	subparsers.add_parser('plot', parents=[common, plotting], help='draw figures of plotting options')
+	chapter = subparsers.add_parser('chapter', parents=[common, plotting], help='draw figures and write LaTeX results chapter')
+	chapter.add_argument('--chapter-file', default=RESULTS_CHAPTER_FILE_NAME, help='LaTeX chapter file (default: %(default)s)')
+	chapter.add_argument('--fig-folder', default=FIG_FOLDER, help='where figures are stored in TeX project (default: %(default)s)')
+	rank = subparsers.add_parser('rank', parents=[common], help='rank configurations and find Pareto frontier of speed against cost')
+	rank.add_argument('--over', nargs='+', default=RANKING_AXES, help='axes ranked together (default: %(default)s)')
+	rank.add_argument('--where', nargs='*', default=[], metavar='AXIS=VALUE',
+					  help='fix axes to single values, e.g. Direction=read PatternSize=65536')
+	rank.add_argument('--tie-sigma', type=float, default=RANKING_TIE_SIGMA,
+					  help='candidates within this many combined uncertainties of the best are tied (default: %(default)s)')
+	rank.add_argument('--fraction-of-peak', type=float, default=RANKING_FRACTION_OF_PEAK,
+					  help='the cheapest candidate reaching this fraction of the best speed is reported (default: %(default)s)')
+	rank.add_argument('--ranking-file', default=RANKING_FILE_NAME, help='csv file with ranking (default: %(default)s)')
+	rank.add_argument('--pareto-file', default=PARETO_FILE_NAME, help='csv file with Pareto frontier (default: %(default)s)')
+	compare = subparsers.add_parser('compare', parents=[common],
+									help='compare results (--csv-file) with baseline and flag significant changes of speed '
+										 '(nonzero exit status on regressions)')
+	compare.add_argument('baseline', help='csv file, directory or glob pattern of csv files with baseline results')
+	compare.add_argument('--target-speed', choices=['AV', 'PC', 'FPGA'], default=TARGET_SPEED,
+						 help='speed deciding about regressions and drawn on figures (default: %(default)s)')
+	compare.add_argument('--sigma', type=float, default=COMPARISON_SIGMA,
+						 help='change is significant above this many combined uncertainties (default: %(default)s)')
+	compare.add_argument('--min-change', type=float, default=COMPARISON_MIN_RELATIVE_CHANGE,
+						 help='smaller relative changes are never flagged (default: %(default)s)')
+	compare.add_argument('--comparison-file', default=COMPARISON_FILE_NAME,
+						 help='csv file with comparison table (default: %(default)s)')
+	compare.add_argument('--no-figures', action='store_true', help='do not draw figures of changes')
+	timeline = subparsers.add_parser('timeline', parents=[common],
+									 help='join glog files of transfer program with results and split its time into '
+										  'transfers, run overhead and bitfile loads')
+	timeline.add_argument('log_files', nargs='+', help='glog files of transfer program (INFO level), in order of sessions')
+	timeline.add_argument('--timeline-file', default=RUN_TIMELINE_FILE_NAME,
+						  help='csv file with timeline of every run (default: %(default)s)')
+	timeline.add_argument('--tolerance', type=float, default=LOG_MATCH_TOLERANCE_SECONDS,
+						  help='accepted difference between Time of results row and log timestamp in seconds (default: %(default)s)')
+	drift = subparsers.add_parser('drift', parents=[common],
+								  help='follow throughput of reference configurations over Time, find change points and '
+									   'correct speeds of all configurations')
+	drift.add_argument('--reference', nargs='+', action='append', metavar='AXIS=VALUE',
+					   help='columns selecting reference configurations, repeat for more (default: from cfg.py or automatic)')
+	drift.add_argument('--window', type=float, default=DRIFT_WINDOW_SECONDS,
+					   help='width of rolling window in seconds (default: %(default)s)')
+	drift.add_argument('--threshold', type=float, default=DRIFT_CHANGE_POINT_THRESHOLD,
+					   help='CUSUM statistic in noise sigmas above which level changes (default: %(default)s)')
+	drift.add_argument('--drift-file', default=DRIFT_FILE_NAME,
+					   help='csv file with raw and drift-corrected speeds (default: %(default)s)')
+	drift.add_argument('--rolling-file', default=DRIFT_ROLLING_FILE_NAME,
+					   help='csv file with rolling throughput of reference configurations (default: %(default)s)')
+	export = subparsers.add_parser('export', parents=[common], help='write aggregated results to csv or json file')
+	export.add_argument('output', help='output file; .json extension selects json, anything else csv')
+	export.add_argument('--describe', action='store_true',
+						help='export every statistic (mean, stdev, median, min, max, percentiles) instead of refactored heads')
+	return parser
+
+
+def results_parser_from_args(args, csv_file=None):
+	headers = read_headers_from_performance_cfg(args.performance_cfg) if os.path.isfile(args.performance_cfg) else None
+	return ResultsParser(csv_file if csv_file else args.csv_file, args.separator, INT_VALUES, FLOAT_VALUES, REFACTORED_HEADS, args.stat_iterations,
+						 cache_folder=args.cache_folder, headers=headers)
+
+
+def refactored_results_from_args(results, args):
+	return results.get_refactored_list_of_results_dicts(include_incomplete=args.include_incomplete,
+														dropped_stat_iterations=args.dropped_stat_iterations,
+														outlier_threshold=args.outlier_threshold)
+
+
+def command_check(args):
+	"""Scan raw results for transfer errors and anomalies. Returns 0 when clean, 1 on errors, 2 on anomalies only"""
+	scanner = ErrorScanner(args.stat_iterations)
+	for csv_file in resolve_results_csv_files(args.csv_file, args.separator):
+		scanner.scan_csv(csv_file, args.separator)
+	scanner.finish()
+	scanner.print_summary()
+	return scanner.exit_status()
+
+
+def command_aggregate(args):
+	results = results_parser_from_args(args)
+	list_of_results_dicts = refactored_results_from_args(results, args)
+	print("{} rows, {} configurations".format(results.rows(), len(list_of_results_dicts)))
+
+
+def command_plot(args, results=None):
+	"""Draw figures (and write chapter when args come from chapter command)"""
+	chapter_file_name = getattr(args, 'chapter_file', None)
+	results = results if results else results_parser_from_args(args)
+	parsed_list_of_results_dicts = refactored_results_from_args(results, args)
+	rh = ResultsHandler(parsed_list_of_results_dicts, FIGURE_METADATA, args.target_speed, BASIC_PROPERTIES)
+	rh.enable_parallel_rendering(args.render_workers)
+	rh.set_output_modes(args.output_modes, args.png_dpi)
+	if args.incremental:
+		rh.enable_incremental_rendering(args.manifest_file, args.force_render)
+	if args.fit_transfer_model:
+		transfer_model = TransferModel(parsed_list_of_results_dicts, TRANSFER_MODEL_HEADS, FRACTION_OF_PEAK)
+		transfer_model.print_table()
+		transfer_model.save_csv(TRANSFER_MODEL_FILE_NAME, args.separator)
+		rh.enable_transfer_model_overlay()
+	if chapter_file_name:
+		rh.enable_results_chapter_generation(chapter_file_name, args.fig_folder)
+	for i, plot_option in enumerate(PLOTTING_OPTIONS):
+		if plot_option in args.options:
+			rh.handle_results(PLOTTING_OPTIONS[plot_option], i, args.separated)
+	if chapter_file_name:
+		rh.write_results_chapter()
+
+
+def command_rank(args):
+	list_of_results_dicts = refactored_results_from_args(results_parser_from_args(args), args)
+	axes = list(BASIC_PROPERTIES) + ['PatternSize', CAMPAIGN_HEAD]
+	cube = ResultCube(list_of_results_dicts, axes, BASIC_PROPERTIES)
+	selection = cube.parse_selection(args.where)
+	ranking = cube.ranking(args.over, selection, args.tie_sigma, args.fraction_of_peak, PARETO_COST_ORDERS)
+	print_list_of_dicts(ranking)
+	save_list_of_dicts(ranking, args.ranking_file, args.separator)
+	cost_axes = [axis for axis in PARETO_COST_ORDERS if axis in cube.axes and axis not in selection]
+	pareto_frontier = cube.pareto_frontier(cost_axes, PARETO_COST_ORDERS, selection, args.tie_sigma)
+	save_list_of_dicts(pareto_frontier, args.pareto_file, args.separator)
+	print("{} best configurations saved to {}, {} configurations on Pareto frontier saved to {}".format(
+		len(ranking), args.ranking_file, len(pareto_frontier), args.pareto_file))
+
+
+def command_compare(args):
+	"""Compare results with baseline. Returns 1 when any configuration is significantly slower, else 0"""
+	baseline = refactored_results_from_args(results_parser_from_args(args, args.baseline), args)
+	candidate = refactored_results_from_args(results_parser_from_args(args), args)
+	comparison = CampaignComparison(baseline, candidate, REFACTORED_HEADS[:REFACTORED_HEADS.index('SpeedPC')],
+									args.target_speed, args.sigma, args.min_change)
+	comparison.print_summary()
+	list_of_dicts = comparison.list_of_dicts()
+	print_list_of_dicts([row for row in list_of_dicts if row['Status'] != 'unchanged'])
+	save_list_of_dicts(list_of_dicts, args.comparison_file, args.separator)
+	print("Comparison of {} configurations saved to {}".format(len(list_of_dicts), args.comparison_file))
+	if not args.no_figures and len(comparison):
+		figure = Figure(COMPARISON_FIGURE_METADATA, args.target_speed, COMPARISON_TITLE, COMPARISON_SAVEFIG)
+		try:
+			for job in comparison.figure_jobs(COMPARISON_FIGURE_HEADS, COMPARISON_SERIES_HEADS, COMPARISON_SYMBOLS):
+				figure.draw_job(job)
+		finally:
+			figure.close()
+	return 1 if comparison.counts()['regression'] else 0
+
+
+def command_timeline(args):
+	csv_files = resolve_csv_files(args.csv_file)
+	if not csv_files:
+		print("No results found for {}, runs are not joined with results".format(args.csv_file))
+	transfer_log = TransferLog(args.tolerance)
+	runs = transfer_log.save_timeline(args.timeline_file, args.log_files, args.csv_file if csv_files else None, args.separator)
+	transfer_log.print_summary()
+	print("Timeline of {} runs saved to {}".format(runs, args.timeline_file))
+
+
+def parse_references(references):
+	"""Returns list of dicts from lists of 'AXIS=VALUE' strings; values of integer columns are converted to int"""
+	parsed = []
+	for assignments in references:
+		reference = {}
+		for assignment in assignments:
+			head, _, value = assignment.partition('=')
+			reference[head] = int(value) if head in INT_VALUES else value
+		parsed.append(reference)
+	return parsed
+
+
+def command_drift(args):
+	results = results_parser_from_args(args)
+	references = parse_references(args.reference) if args.reference else DRIFT_REFERENCES
+	key_heads = [head for head in results.key_heads() if head != CAMPAIGN_HEAD]
+	drift = DriftAnalysis(results.table, key_heads, args.window, references, DRIFT_MIN_REFERENCE_SPAN,
+						  DRIFT_MIN_REFERENCE_SAMPLES, args.threshold, DRIFT_MIN_SEGMENT)
+	drift.print_summary()
+	save_list_of_dicts(drift.corrected_list_of_dicts(), args.drift_file, args.separator)
+	print("Drift-corrected speeds saved to {}".format(args.drift_file))
+	rolling_list_of_dicts = drift.rolling_list_of_dicts()
+	if not rolling_list_of_dicts:
+		print("No samples of reference configurations, {} is not written".format(args.rolling_file))
+		return
+	save_list_of_dicts(rolling_list_of_dicts, args.rolling_file, args.separator)
+	print("Rolling throughput of references saved to {}".format(args.rolling_file))
+
+
+def command_export(args):
+	results = results_parser_from_args(args)
+	if args.describe:
+		statistics = results.grouped_statistics(args.dropped_stat_iterations, args.outlier_threshold)
+		list_of_dicts = statistics.describe_list_of_dicts()
+	else:
+		list_of_dicts = refactored_results_from_args(results, args)
+	with open(args.output, mode='w', newline='') as output_file:
+		if args.output.endswith('.json'):
+			json.dump(list_of_dicts, output_file, indent=1)
+		elif list_of_dicts:
+			writer = csv.DictWriter(output_file, fieldnames=list(list_of_dicts[0]), delimiter=args.separator)
+			writer.writeheader()
+			writer.writerows(list_of_dicts)
+	print("{} configurations exported to {}".format(len(list_of_dicts), args.output))
+
+
+COMMANDS = {
+	'check': command_check,
+	'aggregate': command_aggregate,
+	'plot': command_plot,
+	'chapter': command_plot,
+	'rank': command_rank,
+	'compare': command_compare,
+	'timeline': command_timeline,
+	'drift': command_drift,
+	'export': command_export
+}
+
+
+def main(argv=None):
+	"""Run command given in argv; without command the analysis configured in cfg.py is run"""
+	parser = build_argument_parser()
+	args = parser.parse_args(argv)
+	if args.command:
+		return COMMANDS[args.command](args) or 0
+	args = parser.parse_args(['chapter' if GENERATE_RESULTS_CHAPTER else 'plot'])
+	results = results_parser_from_args(args)
 	if CHECK_FOR_ERRORS:
 		results.check_errors()
+	command_plot(args, results)
+	return 0
 
-	parsed_list_of_results_dicts = results.get_refactored_list_of_results_dicts()
-	if GENERATE_RESULTS_CHAPTER:
-		rh.enable_results_chapter_generation(RESULTS_CHAPTER_FILE_NAME, FIG_FOLDER)
-	for i, plot_option in enumerate(PLOTTING_OPTIONS):
-		rh.handle_results(PLOTTING_OPTIONS[plot_option], i, PARAMETERS_SEPARATED)
-	# rh.save_to_figs(PLOTTING_OPTIONS['memtype_depth_pattern'], 0, PARAMETERS_SEPARATED)
-	# rh.handle_results(PLOTTING_OPTIONS['memtype_depth_pattern'], 0, PARAMETERS_SEPARATED)
+
+if __name__ == "__main__":
+	sys.exit(main())
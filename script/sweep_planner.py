@@ -0,0 +1,295 @@
+from cfg import *
+import csv
+import os
+import re
+
+import numpy as np
+
+from aggregation import group_table
+from campaigns import resolve_results_csv_files
+from datagen import MAX_PATTERN_SIZE
+from results_table import ResultsTable
+
+
+"""Allowed values and defaults of params scope, as in Configurations (performance.h, config.cpp)"""
+PARAMS_DEFAULTS = {
+	'mode': ['32bit', 'nonsym', 'duplex'],
+	'direction': ['read', 'write'],
+	'memory': ['blockram', 'distributedram', 'shiftregister'],
+	'depth': [16, 64, 256, 1024, 2048],
+	'pattern_size': [2 ** i for i in range(4, MAX_PATTERN_SIZE.bit_length())],
+	'block_size_duplex': [16, 64, 256, 1024],
+	'pattern_size_duplex': [2 ** i for i in range(10, MAX_PATTERN_SIZE.bit_length())],
+	'pattern': ['counter_8bit', 'counter_32bit', 'walking_1', 'asic']
+}
+
+"""Columns of csv file that identify single run (one statistical iteration of one configuration)"""
+RUN_HEADS = ['Mode', 'Direction', 'FifoMemoryType', 'FifoDepth', 'PatternSize', 'BlockSize', 'DataPattern', 'StatisticalIter']
+
+"""Less and less specific configurations past speeds are looked up by when estimating time of run"""
+ESTIMATION_HEADS = [
+	['Mode', 'Direction', 'FifoMemoryType', 'FifoDepth', 'PatternSize', 'BlockSize', 'DataPattern'],
+	['Mode', 'Direction', 'PatternSize', 'BlockSize'],
+	['Mode', 'PatternSize'],
+	['PatternSize'],
+	['Mode']
+]
+
+
+def _strip_comments(content):
+	"""Removes //, # and /* */ comments of libconfig file, leaving quoted strings untouched"""
+	return re.sub(r'("[^"]*")|//[^\n]*|#[^\n]*|/\*.*?\*/', lambda match: match.group(1) or '', content, flags=re.DOTALL)
+
+
+def read_performance_cfg(cfg_file):
+	"""Returns dict with bitfiles_path and all settings of params scope of performance.cfg.
+
+	Lists that are empty or missing are replaced with defaults and values that
+	are not allowed raise ValueError, as in Configurations::vectorParser.
+	"""
+	with open(cfg_file, mode='r') as performance_cfg:
+		content = _strip_comments(performance_cfg.read())
+	match = re.search(r'^\s*params\s*[:=]\s*\{(.*?)\}', content, re.MULTILINE | re.DOTALL)
+	if not match:
+		raise ValueError('No params scope in {}'.format(cfg_file))
+	settings = dict(re.findall(r'(\w+)\s*[:=]\s*(\[[^\]]*\]|[^;\n]+)', match.group(1)))
+
+	params = {}
+	for option, default in PARAMS_DEFAULTS.items():
+		values = re.findall(r'"([^"]*)"|(\d+)', settings.get(option, '[]'))
+		values = [string if string else int(number) for string, number in values]
+		for value in values:
+			if value not in default:
+				raise ValueError('{} <- is not a valid parameter for {} option!'.format(value, option))
+		params[option] = values if values else list(default)
+	for option in ('statistic_iter', 'iterations'):
+		params[option] = max(1, int(settings.get(option, 1)))
+
+	bitfiles_path = re.search(r'^\s*bitfiles_path\s*[:=]\s*"([^"]*)"', content, re.MULTILINE)
+	params['bitfiles_path'] = bitfiles_path.group(1) if bitfiles_path else ''
+	return params
+
+
+def bitfile_name(params, mode, direction, memory, depth):
+	"""Path of bitfile loaded for configuration, as in TransferController::setupFPGA"""
+	return '{}{}/{}_{}_fifo_{}_{}.bit'.format(params['bitfiles_path'], mode, direction, mode, memory, depth)
+
+
+def enumerate_bitfiles(params):
+	"""Returns list of (mode, direction, memory, depth) in the order TransferController loads bitfiles.
+
+	Nonsym mode uses blockram only and depth 32 instead of 16 for write
+	direction, duplex mode is bidir with depth 2048. Bitfile that the C++
+	sweep would load twice (e.g. nonsym write with both 16 and 32) is kept once.
+	"""
+	bitfiles = []
+	for mode in params['mode']:
+		memories = ['blockram'] if mode == 'nonsym' else params['memory']
+		directions = ['bidir'] if mode == 'duplex' else params['direction']
+		for direction in directions:
+			for memory in memories:
+				if mode == 'duplex':
+					depths = [2048]
+				elif mode == 'nonsym' and direction == 'write':
+					depths = [32 if depth == 16 else depth for depth in params['depth']]
+				else:
+					depths = params['depth']
+				for depth in depths:
+					if (mode, direction, memory, depth) not in bitfiles:
+						bitfiles.append((mode, direction, memory, depth))
+	return bitfiles
+
+
+def enumerate_runs(params, mode, direction, memory, depth):
+	"""Returns list of runs (tuples of RUN_HEADS values) performed with one bitfile, in order of TransferController.
+
+	As in TransferController::runOnSpecificDepth all modes use pattern_size
+	list (duplex one is parsed but not used); block size is a pattern size
+	in non duplex modes and asic pattern is run only in nonsym mode.
+	"""
+	patterns = [pattern for pattern in params['pattern'] if mode == 'nonsym' or pattern != 'asic']
+	runs = []
+	for pattern_size in params['pattern_size']:
+		block_sizes = params['block_size_duplex'] if mode == 'duplex' else [pattern_size]
+		for block_size in block_sizes:
+			for pattern in patterns:
+				for stat_iteration in range(1, params['statistic_iter'] + 1):
+					runs.append((mode, direction, memory, depth, pattern_size, block_size, pattern, stat_iteration))
+	return runs
+
+
+class SweepPlanner(object):
+	"""Plans (remaining part of) the sweep defined by performance.cfg.
+
+	The full run matrix is enumerated the way TransferController does it,
+	runs already present in result csv files are skipped, and the rest is
+	grouped by bitfile, so every bitfile is loaded once. Time of each run is
+	estimated from SpeedPC of past measurements.
+
+	Attributes:
+		params (dict): settings of params scope of performance.cfg.
+		bitfiles (list): (mode, direction, memory, depth) of every bitfile in order of sweep.
+		steps (list): dicts with bitfile, its configuration, pending runs and their estimated seconds.
+	"""
+	def __init__(self, cfg_file, results_source=None, delimiter=';', bitfile_load_seconds=0.0,
+				 run_overhead_seconds=0.0):
+		"""Args:
+			cfg_file (string): performance.cfg file the sweep is defined by.
+			results_source (string): csv file, directory or glob pattern of already collected results (None: none).
+			delimiter (char): the character used for separating values in csv files.
+			bitfile_load_seconds (float): time needed to load a bitfile, added once per step.
+			run_overhead_seconds (float): time of every run spent beside transfers (data generation, checking).
+		"""
+		self.cfg_file = cfg_file
+		self.params = read_performance_cfg(cfg_file)
+		self.bitfile_load_seconds = bitfile_load_seconds
+		self.run_overhead_seconds = run_overhead_seconds
+		self.__results = self.__read_results(results_source, delimiter)
+		self.__speeds = self.__past_speeds()
+		self.bitfiles = enumerate_bitfiles(self.params)
+		self.total_runs = 0
+		self.steps = []
+		completed = self.__completed_runs()
+		for bitfile in self.bitfiles:
+			runs = enumerate_runs(self.params, *bitfile)
+			self.total_runs += len(runs)
+			pending = [run for run in runs if run not in completed]
+			if pending:
+				seconds = self.__estimate_seconds(pending)
+				self.steps.append({
+					'bitfile': bitfile_name(self.params, *bitfile),
+					'configuration': bitfile,
+					'runs': pending,
+					'seconds': seconds,
+					'total_seconds': float(np.nansum(seconds)) + bitfile_load_seconds
+				})
+
+	@staticmethod
+	def __read_results(results_source, delimiter):
+		if not results_source:
+			return None
+		tables = [ResultsTable.from_csv(csv_file, delimiter, INT_VALUES, FLOAT_VALUES, CATEGORICAL_VALUES, CSV_CHUNK_SIZE)
+				  for csv_file in resolve_results_csv_files(results_source, delimiter)]
+		tables = [table for table in tables if len(table) and all(head in table for head in RUN_HEADS)]
+		return ResultsTable.concatenate(tables) if tables else None
+
+	def __completed_runs(self):
+		if self.__results is None:
+			return set()
+		columns = [self.__results[head].tolist() for head in RUN_HEADS]
+		return set(zip(*columns))
+
+	def __past_speeds(self):
+		"""Returns list of dicts (one per ESTIMATION_HEADS level) mapping configuration to mean SpeedPC [B/s]"""
+		if self.__results is None or 'SpeedPC [B/s]' not in self.__results:
+			return []
+		speed = np.asarray(self.__results.columns['SpeedPC [B/s]'], dtype=np.float64)
+		valid = np.isfinite(speed) & (speed > 0)
+		table = self.__results.take(valid)
+		speeds = []
+		for heads in ESTIMATION_HEADS:
+			if not len(table):
+				break
+			group, first_indices = group_table(table, heads)
+			mean_speed = np.bincount(group, weights=speed[valid]) / np.bincount(group)
+			keys = zip(*[table[head][first_indices].tolist() for head in heads])
+			speeds.append(dict(zip(keys, mean_speed.tolist())))
+		return speeds
+
+	def __speed_of_run(self, run):
+		run_dict = dict(zip(RUN_HEADS, run))
+		for heads, speeds in zip(ESTIMATION_HEADS, self.__speeds):
+			speed = speeds.get(tuple(run_dict[head] for head in heads))
+			if speed:
+				return speed
+		return np.nan
+
+	def __estimate_seconds(self, runs):
+		"""Estimated time of every run: iterations * pattern size / SpeedPC plus overhead (NaN if nothing is known)"""
+		pattern_size = np.array([run[RUN_HEADS.index('PatternSize')] for run in runs], dtype=np.float64)
+		speed = np.array([self.__speed_of_run(run) for run in runs])
+		return self.params['iterations'] * pattern_size / speed + self.run_overhead_seconds
+
+	def pending_runs(self):
+		return sum(len(step['runs']) for step in self.steps)
+
+	def estimated_seconds(self):
+		"""Returns (estimated time of pending runs, number of runs without estimation)"""
+		seconds = sum(np.nansum(step['seconds']) + self.bitfile_load_seconds for step in self.steps)
+		unknown = sum(int(np.count_nonzero(np.isnan(step['seconds']))) for step in self.steps)
+		return float(seconds), unknown
+
+	def print_summary(self):
+		seconds, unknown = self.estimated_seconds()
+		print("{} of {} runs pending in {} of {} bitfiles".format(self.pending_runs(), self.total_runs,
+																 len(self.steps), len(self.bitfiles)))
+		for i, step in enumerate(self.steps):
+			print("{:3d}. {} ({} runs, {:.1f} s)".format(i + 1, step['bitfile'], len(step['runs']),
+														   step['total_seconds']))
+		print("Estimated time: {:.2f} h".format(seconds / 3600), end='')
+		print(" ({} runs without past measurements not included)".format(unknown) if unknown else '')
+
+	def save_plan(self, file_name, delimiter=';'):
+		"""Write every pending run in planned order with its bitfile and estimated time to csv file"""
+		with open(file_name, mode='w', newline='') as plan_file:
+			writer = csv.writer(plan_file, delimiter=delimiter)
+			writer.writerow(['Step', 'Bitfile'] + RUN_HEADS + ['EstimatedSeconds'])
+			for i, step in enumerate(self.steps):
+				for run, seconds in zip(step['runs'], step['seconds'].tolist()):
+					writer.writerow([i + 1, step['bitfile']] + list(run) + [seconds])
+
+	def __params_scope(self, step):
+		"""params scope that makes TransferController run (at least) pending runs of step with its bitfile only"""
+		mode, direction, memory, depth = step['configuration']
+		runs = dict(zip(RUN_HEADS, zip(*step['runs'])))
+
+		def values(head, option):
+			return [value for value in self.params[option] if value in set(runs[head])]
+
+		def as_list(values):
+			return '[ ' + ', '.join('"{}"'.format(value) if isinstance(value, str) else str(value) for value in values) + ' ]'
+
+		if mode == 'nonsym' and direction == 'write' and depth == 32:
+			depth = 16 # TransferController changes 16 to 32 itself and 32 is not a valid depth
+		block_sizes = values('BlockSize', 'block_size_duplex') if mode == 'duplex' else self.params['block_size_duplex']
+		lines = [
+			'mode = {};'.format(as_list([mode])),
+			'direction = {};'.format(as_list([direction] if mode != 'duplex' else self.params['direction'])),
+			'memory = {};'.format(as_list([memory])),
+			'depth = {};'.format(as_list([depth])),
+			'pattern_size = {};'.format(as_list(values('PatternSize', 'pattern_size'))),
+			'block_size_duplex = {};'.format(as_list(block_sizes)),
+			'pattern_size_duplex = {};'.format(as_list(self.params['pattern_size_duplex'])),
+			'pattern = {};'.format(as_list(values('DataPattern', 'pattern'))),
+			'statistic_iter = {};'.format(max(runs['StatisticalIter'])),
+			'iterations = {};'.format(self.params['iterations'])
+		]
+		return 'params:\n{\n' + ''.join('\t' + line + '\n' for line in lines) + '}\n'
+
+	def save_cfg_files(self, folder):
+		"""Write one config file per step (run them in order of names); scopes other than params are copied from cfg file.
+
+		A step covers the product of its pending sizes, patterns and statistical
+		iterations, so runs completed before a crash may be repeated. Returns
+		list of written files.
+		"""
+		with open(self.cfg_file, mode='r') as performance_cfg:
+			content = performance_cfg.read()
+		params_scope = re.search(r'^\s*params\s*[:=]\s*\{.*?\}\s*;?', _strip_comments(content), re.MULTILINE | re.DOTALL)
+		other_scopes = _strip_comments(content).replace(params_scope.group(0), '\n')
+		os.makedirs(folder, exist_ok=True)
+		cfg_files = []
+		for i, step in enumerate(self.steps):
+			name = '{:03d}_{}'.format(i + 1, os.path.basename(step['bitfile']).replace('.bit', '.cfg'))
+			cfg_file = os.path.join(folder, name)
+			with open(cfg_file, mode='w') as step_cfg:
+				step_cfg.write(other_scopes.rstrip() + '\n\n' + self.__params_scope(step))
+			cfg_files.append(cfg_file)
+		return cfg_files
+
+
+if __name__ == "__main__":
+	planner = SweepPlanner(PERFORMANCE_CFG_FILE, CSV_FILE, SEPARATOR, BITFILE_LOAD_SECONDS, RUN_OVERHEAD_SECONDS)
+	planner.print_summary()
+	planner.save_plan(SWEEP_PLAN_FILE_NAME, SEPARATOR)
+	planner.save_cfg_files(SWEEP_CFG_FOLDER)
@@ -0,0 +1,166 @@
+from cfg import FIFO_CLOCK
+import math
+import os
+
+import numpy as np
+
+from sweep_planner import PARAMS_DEFAULTS, enumerate_bitfiles, enumerate_runs
+
+
+"""Headers written by Results::saveResultsToFile (default headers of performance.cfg)"""
+RESULT_HEADERS = ['Time', 'Mode', 'Direction', 'FifoMemoryType', 'FifoDepth', 'PatternSize', 'BlockSize', 'DataPattern',
+				  'Iterations', 'StatisticalIter', 'CountsInFPGA', 'FPGA time(total) [us]', 'FPGA time(per iteration) [us]',
+				  'PC time(total) [us]', 'PC time(per iteration) [us]', 'SpeedPC [B/s]', 'SpeedFPGA [B/s]', 'Errors']
+
+"""Asymptotic PC bandwidth [MB/s] and fixed PC overhead of single transfer [us] of every mode"""
+MODE_MODELS = {
+	'32bit': (190.0, 60.0),
+	'nonsym': (380.0, 80.0),
+	'duplex': (150.0, 120.0)
+}
+
+"""Relative slowdown of FIFO memory types"""
+MEMORY_FACTORS = {
+	'blockram': 1.0,
+	'distributedram': 0.97,
+	'shiftregister': 0.94
+}
+
+
+def format_result_rows(columns, rows, delimiter):
+	"""Formats rows like std::ostream in Results::saveResultsToFile: integers as they are, floats with 6 significant digits (%g)"""
+	row_format = delimiter.join('%g' if column.dtype.kind == 'f' else '%s' for column in columns.values()) + '\n'
+	values = zip(*(column[:rows].tolist() for column in columns.values()))
+	return ''.join([row_format % row for row in values])
+
+
+def time_strings(time):
+	"""Formats datetime64 array like Results::logTime (%Y-%m-%d %X)"""
+	return np.char.replace(np.datetime_as_string(time, unit='s'), 'T', ' ')
+
+
+def default_sweep_params(statistic_iter=10, iterations=10):
+	"""Returns params of full default sweep (as performance.cfg with all lists left empty)"""
+	params = {option: list(values) for option, values in PARAMS_DEFAULTS.items()}
+	params.update(statistic_iter=statistic_iter, iterations=iterations, bitfiles_path='')
+	return params
+
+
+def synthetic_configurations(params):
+	"""Returns list of configurations (runs without statistical iteration) in order of TransferController"""
+	single_iteration = dict(params, statistic_iter=1)
+	configurations = []
+	for bitfile in enumerate_bitfiles(params):
+		configurations.extend(run[:-1] for run in enumerate_runs(single_iteration, *bitfile))
+	return configurations
+
+
+class SyntheticResults(object):
+	"""Realistic results csv files, as written by Results::saveResultsToFile.
+
+	Rows follow the order of TransferController (StatisticalIter changes the
+	fastest) with statistical iterations of params. Rows that do not fit in
+	one sweep are further campaigns (e.g. the same sweep on other boards), each
+	one written to its own file and started when the previous one ended, so the
+	number of configurations grows with the number of rows; the last sweep is
+	an interrupted campaign. Speeds follow t = t0 + size / bandwidth with
+	log-normal noise, times are computed the same way as in Results class
+	and formatted like std::ostream does.
+
+	Attributes:
+		rows (int): number of rows of all campaigns.
+		params (dict): sweep settings (see sweep_planner.read_performance_cfg).
+		stat_iterations (int): statistical iterations of every configuration.
+		campaign_rows (int): number of rows of one full sweep.
+		campaigns (int): number of campaigns (files) the rows need.
+		error_rate (float): probability of transfer with errors.
+	"""
+	def __init__(self, rows, params=None, seed=0, error_rate=0.001, chunk_size=100000):
+		"""Args:
+			rows (int): number of rows of all campaigns.
+			params (dict): sweep settings (None: default sweep with 10 statistical iterations).
+			seed (int): seed of random generator, the same seed gives the same files.
+			error_rate (float): probability of transfer with errors.
+			chunk_size (int): how many rows are formatted at once.
+		"""
+		self.rows = rows
+		self.params = params if params else default_sweep_params()
+		self.stat_iterations = self.params['statistic_iter']
+		self.__configurations = synthetic_configurations(self.params)
+		self.campaign_rows = len(self.__configurations) * self.stat_iterations
+		self.campaigns = max(1, math.ceil(rows / self.campaign_rows))
+		self.error_rate = error_rate
+		self.__seed = seed
+		self.__chunk_size = chunk_size
+
+	def __columns(self, configurations, random, start_time):
+		"""Returns dict of columns (numpy arrays) of all statistical iterations of configurations"""
+		mode, direction, memory, depth, pattern_size, block_size, pattern = zip(*configurations)
+		repeat = self.stat_iterations
+		bandwidth = np.array([MODE_MODELS[m][0] * MEMORY_FACTORS[mem] for m, mem in zip(mode, memory)])
+		overhead = np.array([MODE_MODELS[m][1] for m in mode]) * (1 + 16 / np.array(depth))
+		pattern_size = np.repeat(np.array(pattern_size, dtype=np.int64), repeat)
+		rows = len(pattern_size)
+
+		iterations = self.params['iterations']
+		noise = random.lognormal(0, 0.03, rows)
+		pc_time_periteravg = (np.repeat(overhead, repeat) + pattern_size / np.repeat(bandwidth, repeat)) * noise
+		fpga_time_periteravg_model = pattern_size / (1.05 * np.repeat(bandwidth, repeat)) + 1.0
+		fpga_counts = np.rint(fpga_time_periteravg_model * iterations * FIFO_CLOCK * random.lognormal(0, 0.01, rows))
+		fpga_time_total = fpga_counts / FIFO_CLOCK
+		fpga_time_periteravg = fpga_time_total / iterations
+		pc_time_total = pc_time_periteravg * iterations
+		time = start_time + np.cumsum(pc_time_total * 1.5 + 2e5).astype('timedelta64[us]')
+		return {
+			'Time': time_strings(time),
+			'Mode': np.repeat(mode, repeat),
+			'Direction': np.repeat(direction, repeat),
+			'FifoMemoryType': np.repeat(memory, repeat),
+			'FifoDepth': np.repeat(depth, repeat),
+			'PatternSize': pattern_size,
+			'BlockSize': np.repeat(block_size, repeat),
+			'DataPattern': np.repeat(pattern, repeat),
+			'Iterations': np.full(rows, iterations),
+			'StatisticalIter': np.tile(np.arange(1, repeat + 1), len(configurations)),
+			'CountsInFPGA': fpga_counts.astype(np.int64),
+			'FPGA time(total) [us]': fpga_time_total,
+			'FPGA time(per iteration) [us]': fpga_time_periteravg,
+			'PC time(total) [us]': pc_time_total,
+			'PC time(per iteration) [us]': pc_time_periteravg,
+			'SpeedPC [B/s]': pattern_size * 1e6 / pc_time_periteravg,
+			'SpeedFPGA [B/s]': pattern_size * 1e6 / fpga_time_periteravg,
+			'Errors': np.where(random.random(rows) < self.error_rate, random.integers(1, 100, rows), 0)
+		}
+
+	def write(self, file_name, delimiter=';', start_time='2019-05-01T12:00:00'):
+		"""Write results of the first campaign to csv file (all rows when they fit in one sweep). Returns number of written rows"""
+		return self.__write_campaign(file_name, delimiter, np.datetime64(start_time, 'us'), 0)[0]
+
+	def write_campaigns(self, folder, delimiter=';', start_time='2019-05-01T12:00:00'):
+		"""Write every campaign to its own csv file (campaign_001.csv, ...) in folder. Returns number of written rows"""
+		os.makedirs(folder, exist_ok=True)
+		start_time = np.datetime64(start_time, 'us')
+		written = 0
+		for campaign in range(self.campaigns):
+			file_name = os.path.join(folder, 'campaign_{:03d}.csv'.format(campaign + 1))
+			rows, start_time = self.__write_campaign(file_name, delimiter, start_time, campaign)
+			written += rows
+		return written
+
+	def __write_campaign(self, file_name, delimiter, start_time, campaign):
+		"""Returns (number of written rows, time the next campaign starts at)"""
+		random = np.random.default_rng(self.__seed + campaign)
+		campaign_rows = min(self.campaign_rows, self.rows - campaign * self.campaign_rows)
+		configurations = self.__configurations[:math.ceil(campaign_rows / self.stat_iterations)]
+		configurations_per_chunk = max(1, self.__chunk_size // self.stat_iterations)
+		written = 0
+		with open(file_name, mode='w') as results_file:
+			results_file.write(delimiter.join(RESULT_HEADERS) + '\n')
+			for first in range(0, len(configurations), configurations_per_chunk):
+				chunk = configurations[first:first + configurations_per_chunk]
+				columns = self.__columns(chunk, random, start_time)
+				rows = min(len(columns['Time']), campaign_rows - written)
+				results_file.write(format_result_rows(columns, rows, delimiter))
+				written += rows
+				start_time = np.datetime64(columns['Time'][rows - 1].replace(' ', 'T'), 'us') + np.timedelta64(1, 's')
+		return written, start_time
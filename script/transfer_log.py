@@ -0,0 +1,268 @@
+import collections
+import csv
+import datetime
+import re
+
+from campaigns import resolve_results_csv_files
+from results_table import iter_csv_columns
+
+
+"""Line of glog file: severity, [year,] month, day, time, thread id, source file and line, message"""
+GLOG_LINE = re.compile(r'^([IWEF])(\d{4})?(\d\d)(\d\d) (\d\d):(\d\d):(\d\d)\.(\d{6})\s+\d+ ([^:\]]+):\d+\] (.*)$')
+GLOG_CREATED_AT = re.compile(r'^Log file created at: (\d{4})/(\d\d)/(\d\d)')
+
+"""Messages logged by Results::countPCTime / countFPGATime mapped to fields of run record"""
+RUN_MESSAGES = {
+	'Counted PC time for single duration: ': 'pc_time_periteravg',
+	'Counted speed on PC side: ': 'pc_speed',
+	'FPGA clock counts: ': 'fpga_counts',
+	'Counted FPGA total transfer time: ': 'fpga_time_total',
+	'Counted FPGA time for single duration: ': 'fpga_time_periteravg',
+	'Counted speed on FPGA side: ': 'fpga_speed',
+	'Errors detected during transfer: ': 'errors'
+}
+
+"""Configuration logged by TransferController in debug builds (DLOG) mapped to columns of results"""
+CONFIGURATION_MESSAGES = {
+	'Current mode: ': 'Mode',
+	'Current direction transfer: ': 'Direction',
+	'Current FIFO memory: ': 'FifoMemoryType',
+	'Current FIFO depth value: ': 'FifoDepth',
+	'Current size: ': 'PatternSize',
+	'Current pattern: ': 'DataPattern',
+	'Current statistical iteration: ': 'StatisticalIter'
+}
+
+"""Columns of results joined with run records"""
+JOINED_HEADS = ['Mode', 'Direction', 'FifoMemoryType', 'FifoDepth', 'PatternSize', 'BlockSize', 'DataPattern',
+				'StatisticalIter']
+
+TIMELINE_HEADS = ['Time', 'Logged at'] + JOINED_HEADS + ['Bitfile', 'Run [s]', 'Transfer [s]', 'Overhead [s]',
+														 'Bitfile load [s]', 'Errors']
+
+
+def iter_glog_records(log_file):
+	"""Yields (timestamp, severity, source file, message) of every line of glog file, read line by line.
+
+	Lines without year (glog before 0.5) take year from 'Log file created at'
+	header, moving to the next one when month goes back. Continuation lines
+	of multi-line messages are skipped.
+	"""
+	year = None
+	last_month = 0
+	with open(log_file, mode='r', errors='replace') as glog_file:
+		for line in glog_file:
+			match = GLOG_LINE.match(line)
+			if not match:
+				created_at = GLOG_CREATED_AT.match(line)
+				if created_at:
+					year = int(created_at.group(1))
+				continue
+			severity, line_year, month, day, hour, minute, second, microsecond, source, message = match.groups()
+			month = int(month)
+			if line_year:
+				year = int(line_year)
+			elif year is None:
+				year = datetime.datetime.now().year
+			elif month < last_month:
+				year += 1
+			last_month = month
+			timestamp = datetime.datetime(year, month, int(day), int(hour), int(minute), int(second), int(microsecond))
+			yield timestamp, severity, source, message.rstrip()
+
+
+def _number(text):
+	text = text.split()[0] if text.split() else ''
+	try:
+		return int(text)
+	except ValueError:
+		return float(text)
+
+
+def iter_transfer_events(log_file):
+	"""Yields events of transfer program reconstructed from its glog file, in order.
+
+	Every event is a dict with 'event' ('session', 'bitfile' or 'run'),
+	'start' and 'end' timestamps. Event starts where the previous one ended,
+	except bitfile load that starts at 'FPGA configure file' message when it
+	is logged (debug builds). Bitfile events carry 'bitfile' and 'ok'; run
+	events carry fields of RUN_MESSAGES (times in us as logged), 'iterations'
+	recovered from FPGA times and configuration columns when they are logged.
+	"""
+	previous_end = None
+	bitfile_start = None
+	run = {}
+	configuration = {}
+	for timestamp, severity, source, message in iter_glog_records(log_file):
+		if message == 'Program started':
+			previous_end = timestamp
+			yield {'event': 'session', 'start': timestamp, 'end': timestamp, 'log_file': log_file}
+		elif message.startswith('FPGA configure file: '):
+			bitfile_start = timestamp
+		elif message.startswith('Configure status for file ') or message.startswith('FPGA configuration failed'):
+			ok = message.endswith(': all ok')
+			bitfile = message[len('Configure status for file '):-len(' : all ok')] if ok else message.rpartition(' for file ')[2]
+			start = bitfile_start if bitfile_start else previous_end
+			yield {'event': 'bitfile', 'start': start if start else timestamp, 'end': timestamp, 'bitfile': bitfile, 'ok': ok}
+			previous_end = timestamp
+			bitfile_start = None
+		elif message.startswith('All results saved to '):
+			if 'fpga_time_periteravg' in run and run['fpga_time_periteravg']:
+				run['iterations'] = max(1, int(round(run['fpga_time_total'] / run['fpga_time_periteravg'])))
+			run.update(event='run', start=previous_end if previous_end else timestamp, end=timestamp,
+					   configuration=dict(configuration))
+			yield run
+			previous_end = timestamp
+			run = {}
+		else:
+			for prefix, field in RUN_MESSAGES.items():
+				if message.startswith(prefix):
+					run[field] = _number(message[len(prefix):])
+					break
+			else:
+				for prefix, head in CONFIGURATION_MESSAGES.items():
+					if message.startswith(prefix):
+						configuration[head] = message[len(prefix):]
+						break
+
+
+def _iter_results_rows(csv_source, delimiter, block_size):
+	"""Yields dicts of results rows (Time parsed) of csv files in order; repeated header lines are skipped"""
+	heads = ['Time', 'CountsInFPGA', 'Errors', 'PC time(total) [us]'] + JOINED_HEADS
+	for csv_file in resolve_results_csv_files(csv_source, delimiter):
+		for _, columns, _ in iter_csv_columns(csv_file, delimiter, heads, block_size=block_size):
+			for values in zip(*(columns[head] for head in heads)):
+				row = dict(zip(heads, values))
+				try:
+					row['Time'] = datetime.datetime.strptime(row['Time'], '%Y-%m-%d %H:%M:%S')
+					row['CountsInFPGA'] = int(row['CountsInFPGA'])
+					row['Errors'] = int(row['Errors'])
+					row['PC time(total) [us]'] = float(row['PC time(total) [us]'])
+				except ValueError:
+					continue
+				yield row
+
+
+class TransferLog(object):
+	"""Timeline of transfer program recovered from glog files and joined with results.
+
+	Log files are read line by line and run records are joined with csv rows
+	in one pass over both (they are written in the same order): run matches
+	the first pending row with the same FPGA clock counts and errors whose
+	Time (second resolution) is within tolerance of the log timestamp, so only
+	rows within tolerance window are kept in memory. Time of every run is
+	split into transfer (PC time of iterations) and overhead (data generation,
+	checking, saving), time of bitfile loads and program startup is summed.
+
+	Attributes:
+		tolerance (datetime.timedelta): accepted difference between Time of csv row and log timestamp.
+		totals (dict): seconds spent in startup, bitfile loads, runs, transfers and overhead.
+		counts (dict): number of sessions, bitfile loads (and failed ones), runs, matched runs and unmatched csv rows.
+	"""
+	def __init__(self, tolerance_seconds=2.0):
+		self.tolerance = datetime.timedelta(seconds=tolerance_seconds)
+		self.totals = dict.fromkeys(['startup', 'bitfile', 'run', 'transfer', 'overhead'], 0.0)
+		self.counts = dict.fromkeys(['session', 'bitfile', 'failed_bitfile', 'run', 'matched', 'unmatched_rows'], 0)
+		self.__slowest_bitfiles = []
+
+	def __join(self, events, rows):
+		"""Yields events with matching csv row ('row', None when not found) attached to runs"""
+		pending = collections.deque()
+		for event in events:
+			if event['event'] == 'run' and rows is not None:
+				while not pending or pending[-1]['Time'] <= event['end'] + self.tolerance:
+					row = next(rows, None)
+					if row is None:
+						break
+					pending.append(row)
+				while pending and pending[0]['Time'] < event['end'] - self.tolerance:
+					pending.popleft()
+					self.counts['unmatched_rows'] += 1
+				event['row'] = None
+				for i, row in enumerate(pending):
+					if (row['CountsInFPGA'] == event.get('fpga_counts') and row['Errors'] == event.get('errors')
+							and abs(row['Time'] - event['end']) <= self.tolerance):
+						event['row'] = row
+						del pending[i]
+						break
+			yield event
+		if rows is not None:
+			self.counts['unmatched_rows'] += len(pending) + sum(1 for _ in rows)
+
+	def iter_timeline(self, log_files, csv_source=None, delimiter=';', block_size=16 * 1024 * 1024):
+		"""Yields dict of TIMELINE_HEADS for every run of log files (in order) and updates totals and counts"""
+		events = (event for log_file in log_files for event in iter_transfer_events(log_file))
+		rows = _iter_results_rows(csv_source, delimiter, block_size) if csv_source else None
+		bitfile = ''
+		bitfile_load = None
+		session_start = None
+		for event in self.__join(events, rows):
+			seconds = (event['end'] - event['start']).total_seconds()
+			if event['event'] == 'session':
+				self.counts['session'] += 1
+				session_start = event['start']
+				bitfile = ''
+			elif event['event'] == 'bitfile':
+				self.counts['bitfile'] += 1
+				self.counts['failed_bitfile'] += int(not event['ok'])
+				self.totals['bitfile'] += seconds
+				self.__slowest_bitfiles = sorted(self.__slowest_bitfiles + [(seconds, event['bitfile'])], reverse=True)[:5]
+				if session_start is not None:
+					# Opening device and parsing config, known only when start of configuration is logged
+					self.totals['startup'] += (event['start'] - session_start).total_seconds()
+					session_start = None
+				bitfile = event['bitfile']
+				bitfile_load = seconds
+			else:
+				yield self.__timeline_row(event, seconds, bitfile, bitfile_load)
+				bitfile_load = None
+
+	def __timeline_row(self, event, seconds, bitfile, bitfile_load):
+		row = event.get('row')
+		if row:
+			transfer = row['PC time(total) [us]'] / 1e6
+			self.counts['matched'] += 1
+		else:
+			transfer = event.get('pc_time_periteravg', 0.0) * event.get('iterations', 1) / 1e6
+		self.counts['run'] += 1
+		self.totals['run'] += seconds
+		self.totals['transfer'] += transfer
+		self.totals['overhead'] += seconds - transfer
+		timeline_row = dict.fromkeys(TIMELINE_HEADS, '')
+		timeline_row.update(event['configuration'])
+		if row:
+			timeline_row.update((head, row[head]) for head in JOINED_HEADS)
+			timeline_row['Time'] = row['Time'].strftime('%Y-%m-%d %H:%M:%S')
+		timeline_row.update({
+			'Logged at': event['end'].strftime('%Y-%m-%d %H:%M:%S.%f'),
+			'Bitfile': bitfile,
+			'Run [s]': seconds,
+			'Transfer [s]': transfer,
+			'Overhead [s]': seconds - transfer,
+			'Bitfile load [s]': bitfile_load if bitfile_load is not None else '',
+			'Errors': event.get('errors', '')
+		})
+		return timeline_row
+
+	def save_timeline(self, file_name, log_files, csv_source=None, delimiter=';'):
+		"""Write timeline of every run to csv file (row by row). Returns number of runs"""
+		with open(file_name, mode='w', newline='') as timeline_file:
+			writer = csv.DictWriter(timeline_file, fieldnames=TIMELINE_HEADS, delimiter=delimiter)
+			writer.writeheader()
+			for timeline_row in self.iter_timeline(log_files, csv_source, delimiter):
+				writer.writerow(timeline_row)
+		return self.counts['run']
+
+	def print_summary(self):
+		total = self.totals['startup'] + self.totals['bitfile'] + self.totals['run']
+		print("{} sessions, {} bitfile loads ({} failed), {} runs ({} joined with results, {} results rows not found in logs)".format(
+			self.counts['session'], self.counts['bitfile'], self.counts['failed_bitfile'], self.counts['run'],
+			self.counts['matched'], self.counts['unmatched_rows']))
+		for name, label in [('transfer', 'Transfers'), ('overhead', 'Run overhead'), ('bitfile', 'Bitfile loads'),
+							('startup', 'Program startup')]:
+			share = 100 * self.totals[name] / total if total else 0.0
+			print("{:>16}: {:10.1f} s ({:5.1f}%)".format(label, self.totals[name], share))
+		if self.counts['bitfile']:
+			print("Mean bitfile load: {:.2f} s, the slowest: {}".format(
+				self.totals['bitfile'] / self.counts['bitfile'],
+				', '.join('{} ({:.2f} s)'.format(name, seconds) for seconds, name in self.__slowest_bitfiles)))
@@ -0,0 +1,171 @@
+import csv
+
+import numpy as np
+
+
+"""Key heads that separate configurations only in duplex mode (elsewhere BlockSize equals PatternSize)"""
+DUPLEX_ONLY_HEADS = ['BlockSize']
+
+
+def model_speed(size, t0, bandwidth):
+	"""Speed of transfer of size bytes predicted by model t = t0 + size / bandwidth"""
+	return size / (t0 + size / bandwidth)
+
+
+def size_for_fraction_of_peak(t0, bandwidth, fraction):
+	"""Transfer size that reaches given fraction of asymptotic bandwidth: size = fraction / (1 - fraction) * t0 * bandwidth"""
+	return np.maximum(fraction / (1 - fraction) * t0 * bandwidth, 0)
+
+
+def fit_latency_bandwidth(size, speed, speed_uncertainty, group, groups_count):
+	"""Fit t = t0 + size / bandwidth to every group of points in one batched weighted least-squares solve.
+
+	Transfer time of each point is t = size / speed. Points are weighted with
+	1 / u(t)^2, where u(t) = t * u(speed) / speed; points without positive
+	uncertainty get the smallest relative uncertainty of all points. Groups
+	with less than two different sizes or with non-positive bandwidth are NaN.
+
+	Args:
+		size (array): transfer sizes in bytes.
+		speed (array): measured speeds (MB/s gives t0 in us and bandwidth in MB/s).
+		speed_uncertainty (array): uncertainties of speeds.
+		group (array): group index (0 ... groups_count - 1) of every point.
+		groups_count (int): number of groups.
+	Returns:
+		dict of arrays (one value per group): 't0', 'bandwidth', 'rms_residual'
+		(of speed), 'chi2_dof' (reduced chi-square of times) and 'points'.
+	"""
+	size = np.asarray(size, dtype=np.float64)
+	speed = np.asarray(speed, dtype=np.float64)
+	group = np.asarray(group, dtype=np.int64)
+	relative_uncertainty = np.asarray(speed_uncertainty, dtype=np.float64) / speed
+	valid_uncertainty = np.isfinite(relative_uncertainty) & (relative_uncertainty > 0)
+	default_uncertainty = relative_uncertainty[valid_uncertainty].min() if np.any(valid_uncertainty) else 1.0
+	relative_uncertainty = np.where(valid_uncertainty, relative_uncertainty, default_uncertainty)
+
+	time = size / speed
+	weight = 1 / np.square(time * relative_uncertainty)
+	scale = size.max() if len(size) else 1.0
+	scaled_size = size / scale
+
+	def sums(values):
+		return np.bincount(group, weights=values, minlength=groups_count)
+
+	normal_matrix = np.empty((groups_count, 2, 2))
+	normal_matrix[:, 0, 0] = sums(weight)
+	normal_matrix[:, 0, 1] = normal_matrix[:, 1, 0] = sums(weight * scaled_size)
+	normal_matrix[:, 1, 1] = sums(weight * np.square(scaled_size))
+	right_side = np.stack([sums(weight * time), sums(weight * scaled_size * time)], axis=1)
+
+	points = np.bincount(group, minlength=groups_count)
+	determinant = normal_matrix[:, 0, 0] * normal_matrix[:, 1, 1] - np.square(normal_matrix[:, 0, 1])
+	solvable = (points >= 2) & (determinant > 1e-12 * np.square(normal_matrix[:, 0, 0]))
+	solution = np.full((groups_count, 2), np.nan)
+	if np.any(solvable):
+		solution[solvable] = np.linalg.solve(normal_matrix[solvable], right_side[solvable][:, :, np.newaxis])[:, :, 0]
+	t0 = solution[:, 0]
+	inverse_bandwidth = solution[:, 1] / scale
+	with np.errstate(divide='ignore', invalid='ignore'):
+		bandwidth = np.where(inverse_bandwidth > 0, 1 / inverse_bandwidth, np.nan)
+		t0 = np.where(np.isnan(bandwidth), np.nan, t0)
+
+		fitted_time = t0[group] + size * inverse_bandwidth[group]
+		chi2 = sums(weight * np.square(time - fitted_time))
+		chi2_dof = np.where(points > 2, chi2 / (points - 2), np.nan)
+		speed_residual = speed - model_speed(size, t0[group], bandwidth[group])
+		rms_residual = np.sqrt(sums(np.square(speed_residual)) / points)
+	return {
+		't0': t0,
+		'bandwidth': bandwidth,
+		'rms_residual': rms_residual,
+		'chi2_dof': chi2_dof,
+		'points': points
+	}
+
+
+def _format_cell(value):
+	"""Integers (e.g. FifoDepth, BlockSize) and strings are printed as they are, floats with 4 significant digits"""
+	if isinstance(value, (str, int, np.integer)):
+		return str(value)
+	return '{:.4g}'.format(value)
+
+
+class TransferModel(object):
+	"""Fixed overhead plus bandwidth model (t = t0 + size / bandwidth) of every configuration.
+
+	Refactored results are grouped by key heads (e.g. Mode, Direction,
+	FifoMemoryType, FifoDepth, DataPattern, BlockSize) and all groups are
+	fitted at once. Outside duplex mode BlockSize follows PatternSize, so
+	DUPLEX_ONLY_HEADS are left out of key there (empty in table). With
+	speeds in MB/s t0 is in microseconds.
+
+	Attributes:
+		key_heads (list): names of columns that identify configuration.
+		fraction_of_peak (float): fraction of asymptotic bandwidth the transfer size is predicted for.
+		keys (list): tuple of key values of every configuration.
+		params (dict): arrays of fitted parameters (see fit_latency_bandwidth) and 'size_for_fraction'.
+	"""
+	def __init__(self, list_of_results_dicts, key_heads, fraction_of_peak=0.9, x_head='PatternSize',
+				 y_head='Average', yerr_head='u(av)'):
+		"""Args:
+			list_of_results_dicts (list): list of dicts of refactored data.
+			key_heads (list): names of columns that identify configuration (missing ones are skipped).
+			fraction_of_peak (float): fraction of asymptotic bandwidth the transfer size is predicted for.
+			x_head (string): name of column with transfer size.
+			y_head (string): name of column with speed.
+			yerr_head (string): name of column with uncertainty of speed.
+		"""
+		first_row = list_of_results_dicts[0] if list_of_results_dicts else {}
+		self.key_heads = [head for head in key_heads if head in first_row]
+		self.fraction_of_peak = fraction_of_peak
+		mapping = {}
+		group = np.fromiter((mapping.setdefault(self.__key(row), len(mapping)) for row in list_of_results_dicts),
+							dtype=np.int64, count=len(list_of_results_dicts))
+		self.keys = list(mapping)
+		self.params = fit_latency_bandwidth([row[x_head] for row in list_of_results_dicts],
+											[row[y_head] for row in list_of_results_dicts],
+											[row[yerr_head] for row in list_of_results_dicts],
+											group, len(self.keys))
+		self.params['size_for_fraction'] = size_for_fraction_of_peak(self.params['t0'], self.params['bandwidth'],
+																	 fraction_of_peak)
+
+	def __key(self, row):
+		duplex = row.get('Mode') == 'duplex'
+		return tuple(row[head] if duplex or head not in DUPLEX_ONLY_HEADS else '' for head in self.key_heads)
+
+	def fraction_head(self):
+		return 'Size for {:g}% of peak [B]'.format(100 * self.fraction_of_peak)
+
+	def list_of_fit_dicts(self):
+		"""Returns list of dicts with key heads and fitted parameters of every configuration"""
+		list_of_fit_dicts = []
+		for i, key in enumerate(self.keys):
+			fit_dict = dict(zip(self.key_heads, key))
+			fit_dict['t0 [us]'] = self.params['t0'][i].item()
+			fit_dict['Bandwidth [MB/s]'] = self.params['bandwidth'][i].item()
+			fit_dict[self.fraction_head()] = self.params['size_for_fraction'][i].item()
+			fit_dict['RMS residual [MB/s]'] = self.params['rms_residual'][i].item()
+			fit_dict['Chi2/dof'] = self.params['chi2_dof'][i].item()
+			fit_dict['Points'] = self.params['points'][i].item()
+			list_of_fit_dicts.append(fit_dict)
+		return list_of_fit_dicts
+
+	def print_table(self):
+		list_of_fit_dicts = self.list_of_fit_dicts()
+		if not list_of_fit_dicts:
+			print("No configurations to fit")
+			return
+		headers = list(list_of_fit_dicts[0])
+		rows = [[_format_cell(value) for value in fit_dict.values()] for fit_dict in list_of_fit_dicts]
+		widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+		for row in [headers] + rows:
+			print('  '.join(str(cell).rjust(width) for cell, width in zip(row, widths)))
+
+	def save_csv(self, file_name, delimiter=';'):
+		list_of_fit_dicts = self.list_of_fit_dicts()
+		headers = self.key_heads + ['t0 [us]', 'Bandwidth [MB/s]', self.fraction_head(), 'RMS residual [MB/s]',
+									'Chi2/dof', 'Points']
+		with open(file_name, mode='w', newline='') as model_file:
+			writer = csv.DictWriter(model_file, fieldnames=headers, delimiter=delimiter)
+			writer.writeheader()
+			writer.writerows(list_of_fit_dicts)